@@ -2,6 +2,9 @@
 ASGI config for octofit_tracker project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Requests served through it reach the async read endpoints of
+``octofit_tracker.async_views`` (see ``ASYNC_READ_ENDPOINTS`` in settings),
+and ``/api/leaderboard/stream/`` is served by ``octofit_tracker.streaming``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
@@ -9,8 +12,47 @@ https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIHandler
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'octofit_tracker.settings')
+# Requests run in short-lived threads under ASGI, so persistent database
+# connections would be opened per request and never reused
+os.environ.setdefault('DB_CONN_MAX_AGE', '0')
 
-application = get_asgi_application()
+
+class StreamingASGIHandler(ASGIHandler):
+    """
+    Django 4.1 iterates streaming responses on the event loop, where the
+    lazy queryset iterators behind CSV/NDJSON exports may not query the
+    database. Each part is produced in the thread the view ran in instead,
+    and sent as soon as it is ready.
+    """
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            return await super().send_response(response, send)
+        headers = [
+            (header.encode('ascii'), value.encode('latin1'))
+            for header, value in response.items()
+        ]
+        for cookie in response.cookies.values():
+            headers.append((b'Set-Cookie', cookie.output(header='').encode('ascii').strip()))
+        await send({'type': 'http.response.start', 'status': response.status_code, 'headers': headers})
+        parts = iter(response)
+        done = object()
+        while (part := await sync_to_async(next, thread_sensitive=True)(parts, done)) is not done:
+            for chunk, _ in self.chunk_bytes(part):
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body'})
+        await sync_to_async(response.close, thread_sensitive=True)()
+
+
+django.setup(set_prefix=False)
+django_application = StreamingASGIHandler()
+
+# Imported once Django is set up, as it loads models
+from .streaming import route  # noqa: E402
+
+application = route(django_application)
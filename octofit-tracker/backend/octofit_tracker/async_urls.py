@@ -0,0 +1,19 @@
+"""octofit_tracker URL configuration for ASGI requests
+
+Routes served by async views in ``octofit_tracker.async_views`` come
+first; every other route is the same as in ``octofit_tracker.urls``.
+``AsyncRoutesMiddleware`` selects this configuration.
+"""
+from django.urls import path
+
+from . import async_views
+from .urls import urlpatterns as sync_urlpatterns
+
+
+urlpatterns = [
+    path('api/leaderboard/top/', async_views.leaderboard_top),
+    path('api/leaderboard/by_team/', async_views.leaderboard_by_team),
+    path('api/activities/by_user/', async_views.activities_by_user),
+    path('api/workouts/', async_views.workout_list),
+    *sync_urlpatterns,
+]
@@ -0,0 +1,191 @@
+"""Async-native read endpoints for the busiest GET routes.
+
+Under ASGI (``octofit_tracker.asgi``) requests are resolved against
+``octofit_tracker.async_urls``, where the leaderboard ``top`` and
+``by_team`` actions, activities ``by_user`` and the workouts list are
+served by coroutines instead of a DRF viewset. Conditional GETs and
+response cache hits cost one query for the change versions and no
+serialization.
+
+Their queries run in the shared thread pool (``thread_sensitive=False``)
+rather than the single thread-sensitive executor that runs sync views,
+middleware and the async ORM of Django 4.1, so the reads of concurrent
+requests overlap instead of queueing behind each other. They are read
+only, and each pool thread's connection is handled as at a request
+boundary (``close_old_connections``).
+
+The coroutines only handle the common case: JSON GET requests with the
+parameters the route documents (plus ``?fields=``/``?exclude=``), served
+through the compiled fast-path serializers. Everything else -- writes,
+other formats, searches, orderings, cursors, invalid input -- is handed to
+the regular viewset, so both paths answer with the same bodies, status
+codes, validators and response cache entries.
+"""
+import functools
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.http import HttpResponse
+from django.urls import resolve
+from rest_framework.exceptions import NotAcceptable
+from rest_framework.request import Request
+
+from . import caching, fieldsets
+from .fastpath import compile_serializer
+from .models import Activity, LeaderBoard, Workout
+from .pagination import ActivityCursorPagination
+from .views import ActivityViewSet, LeaderBoardViewSet, WorkoutViewSet, bounded_int
+
+
+# Query params every async route understands besides its own
+COMMON_PARAMS = ('format', 'fields', 'exclude')
+
+
+class Fallback(Exception):
+    """Raised by a read coroutine to hand the request to the viewset"""
+
+
+def read_only(function):
+    """Return an awaitable running the read-only ``function`` in the thread pool"""
+    def call(*args):
+        close_old_connections()
+        try:
+            return function(*args)
+        finally:
+            close_old_connections()
+    return sync_to_async(call, thread_sensitive=False)
+
+
+async def values(queryset, compiled):
+    """Fetch ``queryset`` rows and serialize them"""
+    return compiled.to_representation(
+        await read_only(list)(queryset.values(*compiled.columns))
+    )
+
+
+class AsyncRead:
+    """
+    Serves a GET action of ``viewset`` with ``fetch(request, compiled)``,
+    which receives the DRF request and the compiled serializer (narrowed
+    to the fieldset) and returns the response data, or raises Fallback.
+    ``cached`` shares the entries of the action's ``cached_response``.
+    """
+
+    def __init__(self, viewset, action, fetch, params=(), cached=False):
+        self.viewset = viewset
+        self.action = action
+        self.fetch = fetch
+        self.allowed = set(COMMON_PARAMS) | set(params)
+        self.cached = cached
+        self.renderers = viewset().get_renderers()
+        self.negotiator = viewset().get_content_negotiator()
+
+    def as_view(self):
+        @functools.wraps(self.fetch)
+        async def view(request, *args, **kwargs):
+            match = resolve(request.path_info, urlconf=settings.ROOT_URLCONF)
+            try:
+                return await self.serve(request, match.func)
+            except Fallback:
+                return await sync_to_async(match.func)(request, *match.args, **match.kwargs)
+        # Like every DRF view; the viewset enforces CSRF for session logins
+        view.csrf_exempt = True
+        return view
+
+    async def serve(self, request, sync_view):
+        if request.method not in ('GET', 'HEAD') or not settings.FAST_LIST_SERIALIZATION:
+            raise Fallback
+        if any(name not in self.allowed for name in request.GET):
+            raise Fallback
+        compiled = compile_serializer(self.viewset.serializer_class)
+        if compiled is None:
+            raise Fallback
+        drf_request = Request(request)
+        try:
+            renderer, media_type = self.negotiator.select_renderer(drf_request, self.renderers)
+            kept, _ = fieldsets.resolve(self.viewset.serializer_class, request.GET)
+        except (NotAcceptable, fieldsets.InvalidFieldset):
+            raise Fallback
+        if renderer.format != 'json':
+            raise Fallback
+        if kept is not None:
+            compiled = compiled.subset(kept)
+
+        namespaces = sync_view.initkwargs.get('change_namespaces', self.viewset.change_namespaces)
+        current = await read_only(caching.state)(namespaces)
+        validators = caching.validators(current, request.path, request.GET, renderer.format)
+        if caching.not_modified(request.headers, validators):
+            response = HttpResponse(status=304)
+            del response['Content-Type']
+        else:
+            response = HttpResponse(
+                renderer.render(
+                    await self.data(drf_request, compiled, current[0]),
+                    media_type, {'request': drf_request},
+                ),
+                content_type=renderer.media_type,
+            )
+        caching.add_validators(response, validators)
+        methods = set(sync_view.actions) | {'head', 'options'}
+        response['Allow'] = ', '.join(
+            method.upper() for method in self.viewset.http_method_names if method in methods
+        )
+        response['Vary'] = 'Accept'
+        return response
+
+    async def data(self, request, compiled, versions):
+        if not self.cached:
+            return await self.fetch(request, compiled)
+        name = self.viewset.__name__
+        key = caching.data_key(name, self.action, request.query_params, versions)
+        data = cache.get(key)
+        caching.record(f'{name}.{self.action}', hit=data is not None)
+        if data is None:
+            data = await self.fetch(request, compiled)
+            cache.set(key, data, settings.RESPONSE_CACHE_TIMEOUT)
+        return data
+
+
+def async_read(viewset, action, params=(), cached=False):
+    """Decorator building an async view for ``viewset.action`` (see AsyncRead)"""
+    def decorator(fetch):
+        return AsyncRead(viewset, action, fetch, params, cached).as_view()
+    return decorator
+
+
+@async_read(LeaderBoardViewSet, 'top', params=('limit',), cached=True)
+async def leaderboard_top(request, compiled):
+    limit = bounded_int(request.query_params, 'limit', 10, 1, settings.LEADERBOARD_TOP_MAX_LIMIT)
+    if limit is None:
+        raise Fallback
+    return await values(LeaderBoard.objects.order_by('rank')[:limit], compiled)
+
+
+@async_read(LeaderBoardViewSet, 'by_team', params=('team',), cached=True)
+async def leaderboard_by_team(request, compiled):
+    team = request.query_params.get('team')
+    if not team:
+        raise Fallback
+    return await values(LeaderBoard.objects.filter(team=team).order_by('rank'), compiled)
+
+
+@async_read(ActivityViewSet, 'by_user', params=('email', 'page_size'))
+async def activities_by_user(request, compiled):
+    email = request.query_params.get('email')
+    if not email:
+        raise Fallback
+    paginator = ActivityCursorPagination()
+    # Cursor positions are read from the ordering columns
+    ordering = tuple(field.lstrip('-') for field in paginator.ordering)
+    rows = await read_only(paginator.paginate_first_page)(
+        Activity.objects.filter(user_email=email).values(*dict.fromkeys(compiled.columns + ordering)),
+        request,
+    )
+    return paginator.get_paginated_response(compiled.to_representation(rows)).data
+
+
+@async_read(WorkoutViewSet, 'list', cached=True)
+async def workout_list(request, compiled):
+    return await values(Workout.objects.all(), compiled)
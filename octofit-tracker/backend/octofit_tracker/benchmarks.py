@@ -0,0 +1,371 @@
+"""Endpoint benchmarks with query budgets.
+
+Every router endpoint and custom action is requested through the Django
+test client while counting database queries. Query budgets are declared
+per endpoint and do not depend on dataset size, so exceeding one means an
+N+1 pattern or a missing batch; wall time and response size are compared
+against a stored baseline to catch regressions.
+
+``compare_load`` drives the WSGI and ASGI applications in-process with
+concurrent clients to compare throughput and tail latency of the async
+read endpoints against the viewsets.
+"""
+import asyncio
+import io
+import json
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test.utils import (
+    CaptureQueriesContext, override_settings, setup_test_environment, teardown_test_environment,
+)
+from django.urls import reverse
+from django.utils.http import urlencode
+from django.utils.text import compress_string
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from .fastpath import compile_serializer
+from .models import User, Team, Activity, Workout
+from .renderers import FastJSONRenderer
+
+
+# (url name, detail route?, query params, query budget). Parameter values
+# in braces are filled from ``dataset_context``. Budgets include the change
+# version lookup behind each response's validators (see caching.state).
+ENDPOINTS = [
+    ('user-list', False, {}, 2),
+    ('user-by-team', False, {'team': '{team}'}, 2),
+    ('team-list', False, {}, 2),
+    ('team-list', False, {'expand': 'members'}, 4),
+    ('team-detail', True, {}, 2),
+    ('team-members', True, {}, 2),
+    ('team-standings', False, {}, 2),
+    ('activity-list', False, {}, 2),
+    ('activity-list', False, {'search': 'run'}, 2),
+    ('activity-by-user', False, {'email': '{email}'}, 2),
+    ('activity-by-type', False, {'type': '{activity_type}'}, 2),
+    ('leaderboard-list', False, {}, 2),
+    ('leaderboard-list', False, {'window': '7d'}, 2),
+    ('leaderboard-top', False, {'limit': '10'}, 2),
+    ('leaderboard-around', False, {'email': '{email}'}, 6),
+    ('leaderboard-percentile', False, {'email': '{email}'}, 2),
+    ('leaderboard-histogram', False, {'bins': '20'}, 2),
+    ('leaderboard-by-team', False, {'team': '{team}'}, 2),
+    ('workout-list', False, {}, 2),
+    ('workout-list', False, {'search': 'run'}, 2),
+    ('workout-recommended', False, {'email': '{email}'}, 6),
+    ('workout-by-difficulty', False, {'difficulty': '{difficulty}'}, 2),
+    ('workout-by-type', False, {'type': '{workout_type}'}, 2),
+    ('coach-list', False, {}, 2),
+]
+
+# Routes served by async views under ASGI: (url name, query params)
+ASYNC_ENDPOINTS = [
+    ('leaderboard-top', {'limit': '10'}),
+    ('leaderboard-by-team', {'team': '{team}'}),
+    ('activity-by-user', {'email': '{email}'}),
+    ('workout-list', {}),
+]
+
+# Timing regressions smaller than this are treated as noise
+MIN_REGRESSION_MS = 2.0
+
+
+@contextmanager
+def temporary_database():
+    """Run the block against a fresh test database that is destroyed afterwards"""
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def endpoint_label(url_name, params):
+    """Return a stable name for an endpoint and its non-placeholder params"""
+    fixed = [f'{key}={value}' for key, value in sorted(params.items()) if '{' not in value]
+    return url_name + (f'?{"&".join(fixed)}' if fixed else '')
+
+
+def dataset_context():
+    """Pick representative filter values from the current data"""
+    email, team = User.objects.order_by('id').values_list('email', 'team').first() or ('', '')
+    workout = Workout.objects.order_by('id').values_list('difficulty', 'activity_type').first() or ('', '')
+    return {
+        'email': email,
+        'team': team or '',
+        'team_id': Team.objects.order_by('id').values_list('id', flat=True).first() or 0,
+        'activity_type': Activity.objects.order_by().values_list('activity_type', flat=True).first() or '',
+        'difficulty': workout[0],
+        'workout_type': workout[1],
+    }
+
+
+def run(client, context, repeat=3):
+    """
+    Request every endpoint ``repeat`` times, starting from an empty
+    response cache.
+
+    Returns ``{label: {'status', 'queries', 'bytes', 'ms', 'budget'}}`` with
+    the median wall time in milliseconds and the highest query count of any
+    request, so endpoints served from the cache after the first request are
+    held to their budget on a miss.
+    """
+    results = {}
+    for url_name, detail, params, budget in ENDPOINTS:
+        url = reverse(url_name, args=[context['team_id']] if detail else None)
+        data = {key: value.format(**context) for key, value in params.items()}
+        cache.clear()
+        timings = []
+        counts = []
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = client.get(url, data, HTTP_ACCEPT='application/json')
+                timings.append((time.perf_counter() - started) * 1000)
+            counts.append(len(queries.captured_queries))
+        results[endpoint_label(url_name, params)] = {
+            'status': response.status_code,
+            'queries': max(counts),
+            'bytes': len(response.content),
+            'ms': round(statistics.median(timings), 3),
+            'budget': budget,
+        }
+    return results
+
+
+def check(results, baseline=None, tolerance=0.25):
+    """Return a list of failure messages for budget overruns and regressions"""
+    failures = []
+    for label, result in results.items():
+        if result['status'] != 200:
+            failures.append(f'{label}: HTTP {result["status"]}')
+        if result['queries'] > result['budget']:
+            failures.append(f'{label}: {result["queries"]} queries, budget {result["budget"]}')
+        previous = (baseline or {}).get(label)
+        if previous is None:
+            continue
+        if result['queries'] > previous['queries']:
+            failures.append(f'{label}: {result["queries"]} queries, baseline {previous["queries"]}')
+        limit = previous['ms'] * (1 + tolerance) + MIN_REGRESSION_MS
+        if result['ms'] > limit:
+            failures.append(f'{label}: {result["ms"]:.1f} ms, baseline {previous["ms"]:.1f} ms')
+    return failures
+
+
+def compare_serialization(serializer_class, queryset, repeat=3):
+    """
+    Time ``serializer_class(many=True)`` against the fast path over the
+    same rows, including the query. Returns ``{'rows', 'serializer_ms',
+    'fast_ms', 'speedup', 'identical'}`` with median times; ``identical``
+    compares the JSON encodings of both outputs.
+    """
+    compiled = compile_serializer(serializer_class)
+    if compiled is None:
+        raise ValueError(f'{serializer_class.__name__} cannot use the fast path')
+
+    def encode(data):
+        return json.dumps(data, cls=JSONEncoder).encode()
+
+    slow, fast = [], []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        expected = serializer_class(queryset.all(), many=True).data
+        slow.append((time.perf_counter() - started) * 1000)
+        started = time.perf_counter()
+        actual = compiled.to_representation(queryset.values(*compiled.columns))
+        fast.append((time.perf_counter() - started) * 1000)
+    serializer_ms, fast_ms = statistics.median(slow), statistics.median(fast)
+    return {
+        'rows': len(actual),
+        'serializer_ms': round(serializer_ms, 3),
+        'fast_ms': round(fast_ms, 3),
+        'speedup': round(serializer_ms / fast_ms, 2) if fast_ms else None,
+        'identical': encode(expected) == encode(actual),
+    }
+
+
+def compare_rendering(data, repeat=3):
+    """
+    Render ``data`` with DRF's ``JSONRenderer`` and ``FastJSONRenderer`` and
+    gzip the result as the compression middleware would. Returns median
+    times in milliseconds, sizes in bytes and whether both renderers
+    produced the same bytes.
+    """
+    timings = {'drf_ms': [], 'fast_ms': [], 'gzip_ms': []}
+    for _ in range(repeat):
+        started = time.perf_counter()
+        expected = JSONRenderer().render(data)
+        timings['drf_ms'].append((time.perf_counter() - started) * 1000)
+        started = time.perf_counter()
+        actual = FastJSONRenderer().render(data)
+        timings['fast_ms'].append((time.perf_counter() - started) * 1000)
+        started = time.perf_counter()
+        compressed = compress_string(actual)
+        timings['gzip_ms'].append((time.perf_counter() - started) * 1000)
+    result = {name: round(statistics.median(values), 3) for name, values in timings.items()}
+    result.update({
+        'bytes': len(actual),
+        'gzip_bytes': len(compressed),
+        'identical': expected == actual,
+    })
+    return result
+
+
+@contextmanager
+def simulated_latency(seconds):
+    """
+    Delay every query by ``seconds`` on connections opened in the block,
+    standing in for the network round trip to a remote database.
+    """
+    def delay(execute, sql, params, many, context):
+        time.sleep(seconds)
+        return execute(sql, params, many, context)
+
+    def install(sender, connection, **kwargs):
+        connection.execute_wrappers.append(delay)
+
+    if not seconds:
+        yield
+        return
+    connection_created.connect(install)
+    try:
+        yield
+    finally:
+        connection_created.disconnect(install)
+
+
+def percentile(values, fraction):
+    """Return the nearest-rank percentile of ``values``"""
+    ordered = sorted(values)
+    return ordered[max(int(round(fraction * len(ordered))) - 1, 0)]
+
+
+def _load_result(latencies, statuses, elapsed):
+    return {
+        'requests': len(latencies),
+        'errors': sum(1 for code in statuses if code != 200),
+        'rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.5) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+
+async def _run_clients(concurrency, requests, send):
+    """
+    Issue ``requests`` calls of ``send()`` (a coroutine returning the HTTP
+    status) from ``concurrency`` closed-loop clients. Returns the latencies
+    in seconds, the statuses and the elapsed time.
+    """
+    latencies, statuses = [], []
+    remaining = iter(range(requests))
+
+    async def client():
+        for _ in remaining:
+            started = time.perf_counter()
+            statuses.append(await send())
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return latencies, statuses, time.perf_counter() - started
+
+
+def load_wsgi(application, path, query, concurrency, requests, threads):
+    """Load ``application`` served by a pool of ``threads`` worker threads"""
+    def call():
+        result = {}
+
+        def start_response(status, headers, exc_info=None):
+            result['status'] = int(status.split()[0])
+
+        environ = {
+            'REQUEST_METHOD': 'GET', 'SCRIPT_NAME': '', 'PATH_INFO': path,
+            'QUERY_STRING': query, 'SERVER_NAME': 'testserver', 'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1', 'HTTP_HOST': 'testserver',
+            'HTTP_ACCEPT': 'application/json', 'wsgi.url_scheme': 'http',
+            'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr,
+        }
+        response = application(environ, start_response)
+        try:
+            for _ in response:
+                pass
+        finally:
+            response.close()
+        return result['status']
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(threads) as pool:
+            return await _run_clients(concurrency, requests, lambda: loop.run_in_executor(pool, call))
+
+    return _load_result(*asyncio.run(main()))
+
+
+def load_asgi(application, path, query, concurrency, requests):
+    """Load ``application`` served by one event loop"""
+    async def call():
+        result = {}
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                result['status'] = message['status']
+
+        await application({
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+            'method': 'GET', 'scheme': 'http', 'path': path, 'root_path': '',
+            'query_string': query.encode(), 'server': ('testserver', 80),
+            'client': ('127.0.0.1', 0),
+            'headers': [(b'host', b'testserver'), (b'accept', b'application/json')],
+        }, receive, send)
+        return result['status']
+
+    return _load_result(*asyncio.run(_run_clients(concurrency, requests, call)))
+
+
+def compare_load(wsgi_application, asgi_application, context, concurrency, requests, threads):
+    """
+    Load every ``ASYNC_ENDPOINTS`` route at each concurrency level through
+    the WSGI application, the ASGI application with the regular viewsets
+    and the ASGI application with the async views. WSGI gets ``threads``
+    worker threads, like one threaded WSGI worker process; ASGI gets one
+    event loop, like one ASGI worker process.
+
+    Returns ``{label: {concurrency: {'wsgi': result, 'asgi_sync': result,
+    'asgi': result}}}`` where each result holds ``requests``, ``errors``,
+    ``rps`` and the ``p50_ms``/``p99_ms`` latencies seen by the clients.
+    """
+    def asgi(path, query, level, count, async_views=True):
+        urlconf = settings.ASYNC_URLCONF if async_views else settings.ROOT_URLCONF
+        with override_settings(ASYNC_URLCONF=urlconf):
+            return load_asgi(asgi_application, path, query, level, count)
+
+    results = {}
+    for url_name, params in ASYNC_ENDPOINTS:
+        path = reverse(url_name)
+        query = urlencode({key: value.format(**context) for key, value in params.items()})
+        label = endpoint_label(url_name, params)
+        results[label] = {}
+        for level in concurrency:
+            # Warm the response cache and connections before measuring
+            load_wsgi(wsgi_application, path, query, 1, 1, 1)
+            asgi(path, query, 1, 1)
+            results[label][level] = {
+                'wsgi': load_wsgi(wsgi_application, path, query, level, requests, threads),
+                'asgi_sync': asgi(path, query, level, requests, async_views=False),
+                'asgi': asgi(path, query, level, requests),
+            }
+    return results
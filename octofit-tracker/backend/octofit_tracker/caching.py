@@ -0,0 +1,243 @@
+"""Change versions, response caching and conditional GET support.
+
+Every write bumps a per-namespace change version (and records when it
+happened) in the ``ChangeVersion`` table once the writing transaction
+commits, so writes from any process or management command are seen by
+every server process and survive restarts, and concurrent writers do not
+queue on the namespace's row for the length of their transactions. Cached responses are keyed on
+viewset, action, normalized query params and the versions of every
+namespace the endpoint reads, so stale entries are never served and
+simply age out of the cache (the local-memory backend evicts least
+recently used entries once ``MAX_ENTRIES`` is reached). The same versions
+yield ETag and Last-Modified validators with one small indexed query.
+"""
+import functools
+import hashlib
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+
+from .models import ChangeVersion
+
+
+KEY_PREFIX = 'response-cache'
+
+_stats_lock = threading.Lock()
+_hits = Counter()
+_misses = Counter()
+
+
+def state(namespaces):
+    """
+    Return ``(versions, last_modified)`` for the namespaces: the current
+    version of each (sorted by namespace) and the latest write time as a
+    POSIX timestamp. Namespaces never written before count as version 0,
+    unchanged since the epoch; reads never write.
+    """
+    namespaces = sorted(set(namespaces))
+    found = {
+        namespace: (version, modified)
+        for namespace, version, modified in ChangeVersion.objects.filter(namespace__in=namespaces)
+        .values_list('namespace', 'version', 'modified')
+    }
+    current = [found.get(namespace, (0, None)) for namespace in namespaces]
+    return (
+        [version for version, _ in current],
+        max((modified.timestamp() for _, modified in current if modified is not None), default=0),
+    )
+
+
+def versions(namespaces):
+    """Return the current version of each namespace, sorted by namespace"""
+    return state(namespaces)[0]
+
+
+def invalidate(*namespaces):
+    """
+    Invalidate every cached response that reads from ``namespaces``.
+
+    The bump is written in its own short statement right after the current
+    transaction commits (immediately outside one), so it never holds the
+    namespace's row lock while the write is in progress. Responses cached
+    before the write may be served until then; a rolled back write leaves
+    the version alone.
+    """
+    transaction.on_commit(functools.partial(_bump, namespaces))
+
+
+def _bump(namespaces):
+    now = timezone.now()
+    for namespace in sorted(set(namespaces)):
+        bump = ChangeVersion.objects.filter(namespace=namespace)
+        if bump.update(version=F('version') + 1, modified=now):
+            continue
+        try:
+            with transaction.atomic():
+                ChangeVersion.objects.create(namespace=namespace, version=1, modified=now)
+        except IntegrityError:
+            bump.update(version=F('version') + 1, modified=now)
+
+
+def data_key(view_name, action, query_params, versions):
+    """
+    Return the cache key of an action's response data for the query params
+    and the ``versions`` of the namespaces it reads
+    """
+    params = sorted(
+        (key, sorted(values)) for key, values in query_params.lists()
+        if key != 'format'
+    )
+    digest = hashlib.md5(repr((params, versions)).encode()).hexdigest()
+    return f'{KEY_PREFIX}:{view_name}:{action}:{digest}'
+
+
+def view_state(view, namespaces):
+    """Return ``state(namespaces)``, reusing the lookup made for the view's validators"""
+    known = getattr(view, 'change_state', None)
+    if known is not None and known[0] == tuple(sorted(set(namespaces))):
+        return known[1]
+    return state(namespaces)
+
+
+def cache_key(view, request, namespaces):
+    versions = view_state(view, namespaces)[0]
+    context = getattr(view, 'validator_context', None)
+    return data_key(
+        type(view).__name__, view.action, request.query_params,
+        versions if context is None else (versions, context),
+    )
+
+
+def record(name, hit):
+    """Count a response cache hit or miss for ``name``"""
+    with _stats_lock:
+        (_hits if hit else _misses)[name] += 1
+
+
+def cached_response(*namespaces):
+    """
+    Cache the data of successful responses from a viewset action.
+
+    Only the serialized data is stored, so content negotiation and
+    rendering still happen per request while the serializer is skipped on
+    hits. Entries are keyed on the database change versions the response's
+    validators use, so a hit costs that one lookup and writes from any
+    process make older entries unreachable.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            name = f'{type(self).__name__}.{self.action}'
+            key = cache_key(self, request, namespaces)
+            data = cache.get(key)
+            record(name, hit=data is not None)
+            if data is not None:
+                return Response(data)
+
+            response = method(self, request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, response.data, settings.RESPONSE_CACHE_TIMEOUT)
+            return response
+        return wrapper
+    return decorator
+
+
+def stats():
+    """Return hit and miss counts per cached action in this process"""
+    with _stats_lock:
+        names = sorted(_hits.keys() | _misses.keys())
+        return {
+            name: {'hits': _hits[name], 'misses': _misses[name]}
+            for name in names
+        }
+
+
+def validators(current, path, query_params, format, context=None):
+    """
+    Return ``(etag, last_modified)`` for a response from the ``state()`` of
+    the namespaces it reads, the request path and query, the rendered
+    format and any ``context`` the response depends on besides those (such
+    as dates resolved relative to today).
+    """
+    versions, modified = current
+    tag = hashlib.md5(repr((
+        versions, path, sorted(query_params.lists()), format, context,
+    )).encode()).hexdigest()
+    return quote_etag(tag), int(modified)
+
+
+def not_modified(headers, validators):
+    """Return True if the request's conditional headers match ``validators``"""
+    etag, last_modified = validators
+    if_none_match = headers.get('If-None-Match')
+    if if_none_match is not None:
+        tags = parse_etags(if_none_match)
+        return '*' in tags or etag in tags or f'W/{etag}' in tags
+    if_modified_since = parse_http_date_safe(headers.get('If-Modified-Since', ''))
+    return if_modified_since is not None and last_modified <= if_modified_since
+
+
+def add_validators(response, validators):
+    etag, last_modified = validators
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    # Let browsers keep the body but revalidate before reusing it
+    response['Cache-Control'] = 'no-cache'
+
+
+class NotModified(APIException):
+    status_code = status.HTTP_304_NOT_MODIFIED
+    default_detail = 'Not modified.'
+
+
+class ConditionalGetMixin:
+    """
+    Answers ``If-None-Match``/``If-Modified-Since`` with 304 on safe requests.
+
+    Validators come from the change versions of ``change_namespaces`` plus
+    the request path, query and negotiated format, so an unchanged poll
+    costs one query for the versions and no serialization. Viewsets whose
+    responses depend on more than that (e.g. dates resolved against today)
+    return it from ``get_validator_context``.
+    """
+    change_namespaces = ()
+
+    def get_validator_context(self):
+        return None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.validators = None
+        self.change_state = None
+        self.validator_context = None
+        if request.method not in ('GET', 'HEAD') or not self.change_namespaces:
+            return
+        # Kept for cached_response, which keys entries on the same versions
+        self.change_state = (tuple(sorted(set(self.change_namespaces))), state(self.change_namespaces))
+        self.validator_context = self.get_validator_context()
+        self.validators = validators(
+            self.change_state[1], request.path, request.query_params,
+            request.accepted_renderer.format, self.validator_context,
+        )
+        if not_modified(request.headers, self.validators):
+            raise NotModified()
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return Response(status=status.HTTP_304_NOT_MODIFIED)
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if getattr(self, 'validators', None) and response.status_code in (200, 304):
+            add_validators(response, self.validators)
+        return response
@@ -0,0 +1,78 @@
+"""Startup checks for the production settings profile.
+
+``SETTINGS_PROFILE=production`` promises a configuration without
+debug-only costs. ``profile_issues`` lists the settings that break that
+promise. They are reported by ``manage.py check``, and errors make the app
+refuse to start (``verify_profile`` runs from ``AppConfig.ready``) because
+WSGI and ASGI servers do not run system checks.
+"""
+from django.conf import settings
+from django.core import checks
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.settings import api_settings
+
+
+DJANGO_TEMPLATES = 'django.template.backends.django.DjangoTemplates'
+CACHED_LOADER = 'django.template.loaders.cached.Loader'
+
+
+def _is_cached_loader(loader):
+    return isinstance(loader, (list, tuple)) and loader[0] == CACHED_LOADER
+
+
+def profile_issues():
+    """Return check messages for debug-only costs enabled in the production profile"""
+    if settings.SETTINGS_PROFILE != 'production':
+        return []
+    issues = []
+    if settings.DEBUG:
+        issues.append(checks.Error(
+            'DEBUG is on in the production profile.',
+            hint='Every executed query is kept in connection.queries, so worker memory '
+                 'grows with each request. Unset DEBUG.',
+            id='octofit_tracker.E001',
+        ))
+    browsable = [
+        renderer.__name__ for renderer in api_settings.DEFAULT_RENDERER_CLASSES
+        if issubclass(renderer, BrowsableAPIRenderer)
+    ]
+    if browsable:
+        issues.append(checks.Error(
+            f'HTML API renderers are enabled in the production profile: {", ".join(browsable)}.',
+            hint='Render JSON only; the browsable API renders a template for every response.',
+            id='octofit_tracker.E002',
+        ))
+    for engine in settings.TEMPLATES:
+        loaders = engine.get('OPTIONS', {}).get('loaders')
+        # Without explicit loaders Django caches templates by itself
+        if engine['BACKEND'] == DJANGO_TEMPLATES and loaders is not None and not all(
+            _is_cached_loader(loader) for loader in loaders
+        ):
+            issues.append(checks.Error(
+                'Template loaders are not cached in the production profile.',
+                hint=f'Wrap the loaders in {CACHED_LOADER} so templates are compiled once per process.',
+                id='octofit_tracker.E003',
+            ))
+    if settings.REQUEST_INSTRUMENTATION:
+        issues.append(checks.Warning(
+            'REQUEST_INSTRUMENTATION is on in the production profile.',
+            hint='Every query is timed and logged; enable it only while investigating.',
+            id='octofit_tracker.W001',
+        ))
+    return issues
+
+
+@checks.register()
+def production_profile_check(app_configs, **kwargs):
+    return profile_issues()
+
+
+def verify_profile():
+    """Raise ImproperlyConfigured if the production profile has check errors"""
+    errors = [issue for issue in profile_issues() if issue.is_serious()]
+    if errors:
+        raise ImproperlyConfigured(
+            'Refusing to start the production profile: '
+            + ' '.join(f'{error.id}: {error.msg}' for error in errors)
+        )
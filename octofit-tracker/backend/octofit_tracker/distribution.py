@@ -0,0 +1,273 @@
+"""Calorie distribution of the leaderboard: percentiles and histograms.
+
+Each process keeps an order-statistics index of leaderboard calorie
+totals: entries are counted per ``LEADERBOARD_DISTRIBUTION_BUCKET`` kcal
+bucket in a Fenwick tree, so the number of users below any bucket -- and
+with it a user's percentile or the count of a histogram bin -- costs
+O(log n) instead of counting or sorting the table per request. Users in
+the same bucket count as tied. The tree holds at most
+``LEADERBOARD_DISTRIBUTION_MAX_BUCKETS`` buckets; totals beyond the last
+bucket's lower bound are counted in it, so outliers cannot grow the index.
+
+The index is built from the table on first use in a process. Committed
+leaderboard writes of this process move the affected users between
+buckets (``refresh_entries``), bulk rewrites such as ``leaderboard.rebuild``
+mark it stale, and it is rebuilt once older than
+``LEADERBOARD_DISTRIBUTION_REFRESH_SECONDS`` to pick up writes made by
+other processes. Rebuilds scan the table outside the index lock: the
+expired index keeps answering until the new one is swapped in, and users
+refreshed during the scan are read again afterwards. Queries arriving
+while the first index of a process is built wait for it instead of
+scanning the table themselves.
+"""
+import math
+import threading
+import time
+
+from django.conf import settings
+
+from .models import LeaderBoard
+
+
+# Emails per IN (...) lookup, below the bound-parameter limit of SQLite
+LOOKUP_BATCH_SIZE = 500
+
+_index_lock = threading.Lock()
+# Notified whenever a rebuild finishes, successfully or not
+_index_built = threading.Condition(_index_lock)
+_index = None
+# Rebuilds scanning the table, and the changes made to the old index while
+# they ran (emails refreshed, bulk rewrites) to replay onto the new one
+_rebuilds = 0
+_refreshed = set()
+_rewritten = False
+
+
+class FenwickTree:
+    """Counts per slot with O(log n) updates, prefix sums and rank searches"""
+
+    def __init__(self, size=1):
+        self.size = 1
+        while self.size < size:
+            self.size *= 2
+        self.tree = [0] * (self.size + 1)
+
+    def add(self, slot, delta):
+        if slot >= self.size:
+            self.grow(slot + 1)
+        index = slot + 1
+        while index <= self.size:
+            self.tree[index] += delta
+            index += index & -index
+
+    def prefix(self, slot):
+        """Return the total count of slots below ``slot``"""
+        index = min(slot, self.size)
+        total = 0
+        while index > 0:
+            total += self.tree[index]
+            index -= index & -index
+        return total
+
+    def search(self, count):
+        """Return the first slot at which the running total exceeds ``count``"""
+        index = 0
+        step = self.size
+        while step:
+            if index + step <= self.size and self.tree[index + step] <= count:
+                index += step
+                count -= self.tree[index]
+            step //= 2
+        return index
+
+    def grow(self, size):
+        """Double the capacity until ``size`` slots fit, keeping the counts"""
+        counts = [self.prefix(slot + 1) - self.prefix(slot) for slot in range(self.size)]
+        while self.size < size:
+            self.size *= 2
+        self.tree = [0] * (self.size + 1)
+        for slot, count in enumerate(counts):
+            if count:
+                self.add(slot, count)
+
+
+class Distribution:
+    """Calorie totals of leaderboard entries bucketed into a Fenwick tree"""
+
+    def __init__(self, bucket_size, rows, max_buckets):
+        self.bucket_size = bucket_size
+        self.max_buckets = max_buckets
+        self.built_at = time.monotonic()
+        self.stale = False
+        self.calories = {}
+        self.counts = FenwickTree()
+        for email, calories in rows:
+            self.set(email, calories)
+
+    def bucket(self, calories):
+        return min(max(calories, 0) // self.bucket_size, self.max_buckets - 1)
+
+    def set(self, email, calories):
+        previous = self.calories.get(email)
+        if previous is not None:
+            self.counts.add(self.bucket(previous), -1)
+        self.calories[email] = calories
+        self.counts.add(self.bucket(calories), 1)
+
+    def remove(self, email):
+        previous = self.calories.pop(email, None)
+        if previous is not None:
+            self.counts.add(self.bucket(previous), -1)
+
+    @property
+    def users(self):
+        return len(self.calories)
+
+    def percentile(self, email):
+        """
+        Return the position of a user's total among all entries, or None if
+        the user has no leaderboard entry. ``percentile`` is the share of
+        users below the user's bucket and ``top_percent`` the smallest top
+        share the user belongs to ("top 7%").
+        """
+        calories = self.calories.get(email)
+        if calories is None:
+            return None
+        bucket = self.bucket(calories)
+        below = self.counts.prefix(bucket)
+        above = self.users - self.counts.prefix(bucket + 1)
+        return {
+            'email': email,
+            'total_calories': calories,
+            'users': self.users,
+            'above': above,
+            'below': below,
+            'percentile': round(100 * below / self.users, 1),
+            'top_percent': math.ceil(100 * (above + 1) / self.users),
+        }
+
+    def histogram(self, bins):
+        """
+        Split the range from 0 to the highest total into at most ``bins``
+        bins of whole buckets and return ``[{calories_from, calories_to,
+        users}]``, each bin covering ``[calories_from, calories_to)``. The
+        bin holding the last bucket is open-ended (``calories_to`` None)
+        when totals beyond it are counted there.
+        """
+        if not self.users:
+            return []
+        highest = self.counts.search(self.users - 1)
+        width = -(-(highest + 1) // bins)
+        result = []
+        for start in range(0, highest + 1, width):
+            end = start + width
+            result.append({
+                'calories_from': start * self.bucket_size,
+                'calories_to': None if end >= self.max_buckets else end * self.bucket_size,
+                'users': self.counts.prefix(start + width) - self.counts.prefix(start),
+            })
+        return result
+
+
+def _load():
+    rows = LeaderBoard.objects.order_by().values_list('user_email', 'total_calories')
+    return Distribution(
+        settings.LEADERBOARD_DISTRIBUTION_BUCKET, rows.iterator(chunk_size=2000),
+        settings.LEADERBOARD_DISTRIBUTION_MAX_BUCKETS,
+    )
+
+
+def _expired(current):
+    age = time.monotonic() - current.built_at
+    return (
+        current.stale
+        or current.bucket_size != settings.LEADERBOARD_DISTRIBUTION_BUCKET
+        or current.max_buckets != settings.LEADERBOARD_DISTRIBUTION_MAX_BUCKETS
+        or age >= settings.LEADERBOARD_DISTRIBUTION_REFRESH_SECONDS
+    )
+
+
+def query(method, *args):
+    """
+    Call a Distribution method on the current index, building the index
+    first if this process has none or it expired
+    """
+    global _index, _rebuilds, _refreshed, _rewritten
+    with _index_lock:
+        # Only one thread scans the table for a process's first index
+        while _index is None and _rebuilds:
+            _index_built.wait()
+        # While another thread rebuilds, the expired index still answers
+        if _index is not None and (_rebuilds or not _expired(_index)):
+            return getattr(_index, method)(*args)
+        if not _rebuilds:
+            _refreshed, _rewritten = set(), False
+        _rebuilds += 1
+    # Scan the table without holding the lock, so other queries and
+    # refresh_entries are not stalled behind it
+    loaded = None
+    try:
+        loaded = _load()
+    finally:
+        with _index_lock:
+            _rebuilds -= 1
+            if loaded is not None:
+                # Writes committed during the scan may be missing from it
+                replay, loaded.stale = set(_refreshed), _rewritten
+                _index = loaded
+                result = getattr(_index, method)(*args)
+            _index_built.notify_all()
+    if replay:
+        refresh_entries(replay)
+    return result
+
+
+def percentile(email):
+    return query('percentile', email)
+
+
+def histogram(bins):
+    return query('histogram', bins)
+
+
+def refresh_entries(emails, batch_size=LOOKUP_BATCH_SIZE):
+    """
+    Re-read the totals of ``emails`` into the index, dropping users whose
+    entry is gone. Does nothing until the index has been built.
+    """
+    emails = list(dict.fromkeys(emails))
+    if (_index is None and not _rebuilds) or not emails:
+        return
+    totals = {}
+    for start in range(0, len(emails), batch_size):
+        totals.update(
+            LeaderBoard.objects.filter(user_email__in=emails[start:start + batch_size])
+            .values_list('user_email', 'total_calories')
+        )
+    with _index_lock:
+        if _rebuilds:
+            _refreshed.update(emails)
+        if _index is None:
+            return
+        for email in emails:
+            if email in totals:
+                _index.set(email, totals[email])
+            else:
+                _index.remove(email)
+
+
+def mark_stale():
+    """Have the next query rebuild the index from the table"""
+    global _rewritten
+    with _index_lock:
+        if _rebuilds:
+            _rewritten = True
+        if _index is not None:
+            _index.stale = True
+
+
+def reset():
+    """Drop this process's index"""
+    global _index
+    with _index_lock:
+        _index = None
@@ -0,0 +1,168 @@
+"""Read-only serialization fast path for list endpoints.
+
+``ModelSerializer(many=True)`` builds a model instance per row and walks
+every field's ``get_attribute``/``to_representation`` for it. For safe list
+requests the rows are instead fetched with ``.values()`` (only the columns
+the serializer reads) and converted by a per-serializer table of field
+converters compiled once per process. Fields whose representation is the
+database value itself are passed through untouched; everything else uses
+the serializer field's own conversion, so the output is identical to the
+regular serializer's.
+
+Serializers with fields that do not map to a single model column (method
+fields, nested serializers, dotted sources) are not compiled and keep
+using the regular path.
+"""
+import functools
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+
+# Fields whose representation of a database value is the value itself
+PASSTHROUGH_FIELDS = (serializers.IntegerField, serializers.CharField, serializers.EmailField)
+
+
+def source_column(model, field):
+    """
+    Return the model column a serializer field reads, or None if it is not
+    a plain column (method fields, nested serializers, dotted sources).
+    """
+    if isinstance(field, (serializers.BaseSerializer, serializers.SerializerMethodField)):
+        return None
+    if '.' in field.source or field.source == '*':
+        return None
+    try:
+        model_field = model._meta.get_field(field.source)
+    except FieldDoesNotExist:
+        return None
+    if not model_field.concrete or model_field.is_relation:
+        return None
+    return model_field.attname
+
+
+def _datetime_converter(field):
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    if output_format is None or output_format.lower() != 'iso-8601':
+        return lambda: field.to_representation
+
+    def prepare():
+        # The active timezone can differ per request, so resolve it once
+        # per response rather than once per process or per value.
+        field_timezone = getattr(field, 'timezone', None) or field.default_timezone()
+        if field_timezone is None:
+            return field.to_representation
+
+        def convert(value):
+            if value.tzinfo is None:
+                return field.to_representation(value)
+            value = value.astimezone(field_timezone).isoformat()
+            if value.endswith('+00:00'):
+                value = value[:-6] + 'Z'
+            return value
+        return convert
+    return prepare
+
+
+def _converter(field):
+    """
+    Return a callable that yields the converter for non-null column values
+    when a response is serialized, or None to pass values through.
+    """
+    if type(field) in PASSTHROUGH_FIELDS:
+        return None
+    if type(field) is serializers.JSONField and not field.binary:
+        return None
+    if type(field) is serializers.DateTimeField:
+        return _datetime_converter(field)
+    return lambda: field.to_representation
+
+
+class CompiledSerializer:
+    """Converts ``.values()`` rows the way a ModelSerializer represents instances"""
+
+    def __init__(self, fields):
+        # (output name, column, converter factory or None)
+        self.fields = fields
+        self.columns = tuple(dict.fromkeys(column for _, column, _ in fields))
+
+    def to_representation(self, rows):
+        fields = [
+            (name, column, prepare and prepare())
+            for name, column, prepare in self.fields
+        ]
+        data = []
+        for row in rows:
+            item = {}
+            for name, column, convert in fields:
+                value = row[column]
+                item[name] = value if convert is None or value is None else convert(value)
+            data.append(item)
+        return data
+
+    def subset(self, names):
+        """Return a compiled serializer producing only the ``names`` fields"""
+        names = set(names)
+        return CompiledSerializer([field for field in self.fields if field[0] in names])
+
+
+@functools.lru_cache(maxsize=None)
+def compile_serializer(serializer_class):
+    """
+    Compile a ModelSerializer class for the fast path. Returns None if any
+    readable field cannot be served from a single model column.
+    """
+    model = serializer_class.Meta.model
+    fields = []
+    for name, field in serializer_class().fields.items():
+        if field.write_only:
+            continue
+        column = source_column(model, field)
+        if column is None:
+            return None
+        fields.append((name, column, _converter(field)))
+    return CompiledSerializer(fields)
+
+
+class FastListMixin:
+    """
+    Serves GET list responses through ``compile_serializer`` when the
+    viewset sets ``fast_list = True`` and ``FAST_LIST_SERIALIZATION`` is on.
+
+    ``list_response`` is also available to custom list actions.
+    """
+    fast_list = False
+
+    def get_compiled_serializer(self):
+        if not (self.fast_list and settings.FAST_LIST_SERIALIZATION):
+            return None
+        if self.request.method not in ('GET', 'HEAD'):
+            return None
+        return compile_serializer(self.get_serializer_class())
+
+    def list_response(self, queryset):
+        """Paginate (if configured) and serialize ``queryset`` into a Response"""
+        compiled = self.get_compiled_serializer()
+        if compiled is not None:
+            # Keep the ordering columns and annotations so cursor pagination
+            # can read positions from the rows
+            ordering = [field.lstrip('-') for field in queryset.query.order_by if isinstance(field, str)]
+            queryset = queryset.values(*dict.fromkeys(
+                compiled.columns + tuple(ordering) + tuple(queryset.query.annotations)
+            ))
+
+        page = self.paginate_queryset(queryset)
+        rows = queryset if page is None else page
+        if compiled is not None:
+            data = compiled.to_representation(rows)
+        else:
+            data = self.get_serializer(rows, many=True).data
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+    def list(self, request, *args, **kwargs):
+        return self.list_response(self.filter_queryset(self.get_queryset()))
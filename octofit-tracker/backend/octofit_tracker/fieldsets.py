@@ -0,0 +1,144 @@
+"""Sparse fieldsets for read requests.
+
+``?fields=a,b`` limits a response to the listed serializer fields and
+``?exclude=c,d`` drops fields from it. The same choice narrows the
+database query: ``fields`` loads only the matching columns with
+``.only()`` and ``exclude`` skips them with ``.defer()``, so payload size
+and database transfer shrink together. Unknown names are rejected with a
+400 listing the available fields.
+
+``?expand=`` names related data to embed in a response; viewsets that
+support it validate the names with ``resolve_expansions``.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.serializers import ListSerializer
+
+from .fastpath import source_column
+
+
+class InvalidFieldset(APIException):
+    status_code = status.HTTP_400_BAD_REQUEST
+    default_detail = 'Invalid fieldset.'
+
+
+def parse_names(value):
+    return [name for name in (part.strip() for part in value.split(',')) if name]
+
+
+def resolve(serializer_class, params):
+    """
+    Return ``(kept, excluded)`` field names for the ``fields``/``exclude``
+    query params, or ``(None, ())`` when neither is given. Raises
+    InvalidFieldset for unknown names or an empty selection.
+    """
+    if not ('fields' in params or 'exclude' in params):
+        return None, ()
+
+    available = [
+        name for name, field in serializer_class().fields.items()
+        if not field.write_only
+    ]
+    requested = {}
+    for param in ('fields', 'exclude'):
+        if param not in params:
+            continue
+        names = parse_names(params[param])
+        unknown = [name for name in names if name not in available]
+        if unknown:
+            raise InvalidFieldset({
+                'error': f'Unknown field(s) in {param}: {", ".join(unknown)}. '
+                         f'Available fields: {", ".join(available)}'
+            })
+        requested[param] = set(names)
+
+    kept = [
+        name for name in available
+        if name in requested.get('fields', available)
+        and name not in requested.get('exclude', ())
+    ]
+    if not kept:
+        raise InvalidFieldset({'error': 'The fieldset leaves no fields to return'})
+    return kept, [name for name in available if name not in kept]
+
+
+def resolve_expansions(params, available):
+    """Return the names given in ``?expand=``, rejecting ones not in ``available``"""
+    if 'expand' not in params:
+        return ()
+    names = parse_names(params['expand'])
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise InvalidFieldset({
+            'error': f'Unknown expansion(s): {", ".join(unknown)}. '
+                     f'Available expansions: {", ".join(available)}'
+        })
+    return tuple(names)
+
+
+class SparseFieldsetMixin:
+    """
+    Applies ``?fields=``/``?exclude=`` to GET requests of a viewset.
+
+    ``fieldset`` holds the kept field names (or None when the response is
+    not trimmed). Responses built with ``get_serializer`` are trimmed
+    automatically; custom actions that build their own querysets pass them
+    through ``sparse_queryset`` to narrow the columns loaded as well.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.fieldset = None
+        self.excluded = ()
+        if request.method in ('GET', 'HEAD'):
+            self.fieldset, self.excluded = resolve(self.get_serializer_class(), request.query_params)
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        if getattr(self, 'fieldset', None) is not None:
+            child = serializer.child if isinstance(serializer, ListSerializer) else serializer
+            for name in list(child.fields):
+                if name not in self.fieldset:
+                    del child.fields[name]
+        return serializer
+
+    def get_compiled_serializer(self):
+        compiled = super().get_compiled_serializer()
+        if compiled is not None and getattr(self, 'fieldset', None) is not None:
+            compiled = compiled.subset(self.fieldset)
+        return compiled
+
+    def sparse_queryset(self, queryset):
+        """
+        Load only the columns the fieldset needs. Columns the ordering or
+        cursor pagination reads are always kept, and querysets are left
+        alone when a kept field is computed rather than read from a column.
+        """
+        if getattr(self, 'fieldset', None) is None:
+            return queryset
+        model = queryset.model
+        fields = self.get_serializer_class()().fields
+        kept = [source_column(model, fields[name]) for name in self.fieldset]
+        if None in kept:
+            return queryset
+
+        pagination_ordering = getattr(self.paginator, 'ordering', None) or ()
+        if isinstance(pagination_ordering, str):
+            pagination_ordering = (pagination_ordering,)
+        needed = set()
+        for name in (*queryset.query.order_by, *pagination_ordering):
+            if not isinstance(name, str):
+                continue
+            try:
+                needed.add(model._meta.get_field(name.lstrip('-')).attname)
+            except FieldDoesNotExist:
+                # pk, related lookups and expressions need no extra column
+                continue
+        if 'fields' in self.request.query_params:
+            return queryset.only(*kept, *needed)
+        excluded = [source_column(model, fields[name]) for name in self.excluded]
+        return queryset.defer(*(column for column in excluded if column and column not in needed))
+
+    def filter_queryset(self, queryset):
+        return self.sparse_queryset(super().filter_queryset(queryset))
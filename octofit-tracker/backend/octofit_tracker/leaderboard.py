@@ -0,0 +1,556 @@
+"""Leaderboard maintenance helpers.
+
+Activity writes adjust the owning user's ``LeaderBoard`` row by delta with
+atomic ``F()`` increments instead of re-summing the user's history.
+``rebuild`` recomputes the whole table from activities for consistency
+repair and seeding. A user has an entry, and counts as a member of their
+team's standing, while they have activities: the entry is created by the
+first activity and dropped with the last. Team standings and per-user
+daily rollups (behind the time-windowed standings) are maintained the same
+way; a user changing teams moves their totals between standings, and every
+team has a standing from its creation until its deletion, following its
+renames.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, time, timedelta
+from itertools import islice
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import User, Team, Activity, LeaderBoard, TeamStanding, DailyActivityRollup
+from . import caching, distribution
+
+
+# Tie policies for equal calorie totals: "competition" ranks 1, 2, 2, 4 and
+# "dense" ranks 1, 2, 2, 3.
+TIE_POLICIES = ('competition', 'dense')
+DEFAULT_TIE_POLICY = 'competition'
+
+TOTAL_FIELDS = ('total_activities', 'total_calories', 'total_duration')
+
+
+_tracking_enabled = ContextVar('leaderboard_tracking_enabled', default=True)
+
+
+def tracking_enabled():
+    """Return True when activity writes should update the leaderboard"""
+    return _tracking_enabled.get()
+
+
+@contextmanager
+def tracking_disabled():
+    """
+    Skip incremental leaderboard and search index updates, e.g. while
+    seeding data that is rebuilt in bulk afterwards.
+    """
+    token = _tracking_enabled.set(False)
+    try:
+        yield
+    finally:
+        _tracking_enabled.reset(token)
+
+
+def _increment(model, lookup, activities, calories, duration, create_fields, **extra):
+    """
+    Add deltas to the totals of the row matching ``lookup``.
+
+    The update is a single ``UPDATE ... SET total = total + delta`` so
+    concurrent writes to the same row cannot lose increments. A missing
+    row is created on the first positive delta (``create_fields`` is a
+    callable returning its other columns); if another writer creates it
+    first, the unique constraint on ``lookup`` makes us retry the increment.
+    Returns True if this call created the row.
+    """
+    increments = dict(
+        total_activities=F('total_activities') + activities,
+        total_calories=F('total_calories') + calories,
+        total_duration=F('total_duration') + duration,
+        **extra,
+    )
+    with transaction.atomic():
+        if model.objects.filter(**lookup).update(**increments) or activities <= 0:
+            return False
+        try:
+            with transaction.atomic():
+                model.objects.create(
+                    total_activities=activities,
+                    total_calories=calories,
+                    total_duration=duration,
+                    **lookup,
+                    **create_fields(),
+                )
+            return True
+        except IntegrityError:
+            model.objects.filter(**lookup).update(**increments)
+            return False
+
+
+def apply_activity_delta(user_email, user_name, activities, calories, duration):
+    """
+    Add the given deltas to a user's leaderboard totals. Returns True if
+    the user's entry was created.
+    """
+    def create_fields():
+        team = User.objects.filter(email=user_email).values_list('team', flat=True).first()
+        return {'user_name': user_name, 'team': team or ''}
+
+    return _increment(
+        LeaderBoard, {'user_email': user_email}, activities, calories, duration,
+        create_fields, last_updated=timezone.now(),
+    )
+
+
+def apply_team_delta(team, members, activities, calories, duration):
+    """Add the given deltas to a team's standing"""
+    _increment(
+        TeamStanding, {'team': team}, activities, calories, duration,
+        lambda: {'member_count': members},
+        member_count=F('member_count') + members, last_updated=timezone.now(),
+    )
+
+
+def seed_team_standings(teams):
+    """Create zero standings for ``teams`` that have none"""
+    TeamStanding.objects.bulk_create(
+        [TeamStanding(team=team) for team in teams if team], ignore_conflicts=True,
+    )
+
+
+def apply_team_change(user_email, team):
+    """
+    Move a user's leaderboard entry, and its totals and membership in the
+    team standings, to ``team`` (None or '' for no team). Returns True if
+    the user had an entry on another team.
+    """
+    team = team or ''
+    with transaction.atomic():
+        entry = (
+            LeaderBoard.objects.select_for_update().filter(user_email=user_email)
+            .values_list('team', *TOTAL_FIELDS).first()
+        )
+        if entry is None or entry[0] == team:
+            return False
+        previous, totals = entry[0], entry[1:]
+        LeaderBoard.objects.filter(user_email=user_email).update(team=team, last_updated=timezone.now())
+        if previous:
+            apply_team_delta(previous, -1, *(-value for value in totals))
+        if team:
+            seed_team_standings([team])
+            apply_team_delta(team, 1, *totals)
+    caching.invalidate('leaderboard')
+    return True
+
+
+def rename_team(previous, team):
+    """
+    Move a renamed team's members, entries and standing to its new name,
+    merging the standing into one that already exists under that name
+    """
+    with transaction.atomic():
+        User.objects.filter(team=previous).update(team=team)
+        LeaderBoard.objects.filter(team=previous).update(team=team, last_updated=timezone.now())
+        standing = (
+            TeamStanding.objects.select_for_update().filter(team=previous)
+            .values_list('member_count', *TOTAL_FIELDS).first()
+        )
+        if standing is not None:
+            TeamStanding.objects.filter(team=previous).delete()
+            seed_team_standings([team])
+            apply_team_delta(team, *standing)
+    caching.invalidate('users')
+    caching.invalidate('leaderboard')
+
+
+def remove_team(team):
+    """Drop a deleted team's standing; its members are left without a team"""
+    with transaction.atomic():
+        User.objects.filter(team=team).update(team=None)
+        LeaderBoard.objects.filter(team=team).update(team='', last_updated=timezone.now())
+        TeamStanding.objects.filter(team=team).delete()
+    caching.invalidate('users')
+    caching.invalidate('leaderboard')
+
+
+def apply_rollup_delta(user_email, day, activities, calories, duration):
+    """Add the given deltas to a user's daily rollup for ``day``"""
+    _increment(
+        DailyActivityRollup, {'user_email': user_email, 'day': day},
+        activities, calories, duration, dict,
+    )
+
+
+def contribution(activity):
+    """Return the fields of an activity that feed the leaderboard"""
+    return (
+        activity.user_email, activity.user_name, activity.date,
+        activity.calories, activity.duration,
+    )
+
+
+def apply_activity_changes(removed=(), added=()):
+    """
+    Remove and add activity contributions to the leaderboard and rollups.
+
+    Each contribution is a ``(user_email, user_name, date, calories,
+    duration)`` tuple. Deltas are merged per leaderboard row and per rollup
+    day first, so editing one activity or ingesting a batch touches each
+    affected user's row once. Returns True if any leaderboard total changed.
+    """
+    totals = {}
+    rollups = {}
+    names = {}
+    for contributions, sign in ((removed, -1), (added, 1)):
+        for email, name, date, calories, duration in contributions:
+            if sign > 0 or email not in names:
+                names[email] = name
+            for key, target in ((email, totals), ((email, timezone.localdate(date)), rollups)):
+                delta = target.setdefault(key, [0, 0, 0])
+                delta[0] += sign
+                delta[1] += sign * calories
+                delta[2] += sign * duration
+
+    changed = []
+    created = set()
+    rolled = False
+    with transaction.atomic():
+        for email, delta in totals.items():
+            if any(delta):
+                if apply_activity_delta(email, names[email], *delta):
+                    created.add(email)
+                changed.append(email)
+        for (email, day), delta in rollups.items():
+            if any(delta):
+                apply_rollup_delta(email, day, *delta)
+                rolled = True
+        if changed:
+            _apply_team_changes({email: totals[email] for email in changed}, created)
+            # Entries whose last activity is gone, as a rebuild would drop them
+            emptied = LeaderBoard.objects.filter(user_email__in=changed, total_activities__lte=0)
+            emptied.delete()
+    # Moving an activity to another day changes the rollups only
+    if rolled:
+        caching.invalidate('rollups')
+    if changed:
+        caching.invalidate('leaderboard')
+        transaction.on_commit(lambda: distribution.refresh_entries(changed))
+    return bool(changed)
+
+
+def _apply_team_changes(deltas, created):
+    """
+    Fold per-user deltas into the standings of the users' teams. Users
+    whose entry was created join their team, users left without
+    activities leave it.
+    """
+    entries = {}
+    emails = list(deltas)
+    for start in range(0, len(emails), 500):
+        entries.update(
+            (email, (team, activities))
+            for email, team, activities in LeaderBoard.objects.filter(user_email__in=emails[start:start + 500])
+            .exclude(team='')
+            .values_list('user_email', 'team', 'total_activities')
+        )
+    team_deltas = {}
+    for email, (team, activities) in entries.items():
+        delta = team_deltas.setdefault(team, [0, 0, 0, 0])
+        delta[0] += (email in created) - (activities <= 0)
+        for index, value in enumerate(deltas[email], start=1):
+            delta[index] += value
+    for team, (members, activities, calories, duration) in team_deltas.items():
+        apply_team_delta(team, members, activities, calories, duration)
+
+
+def rank_sorted(scores, ties=DEFAULT_TIE_POLICY):
+    """
+    Yield ranks for an iterable of scores already sorted best first.
+
+    Equal scores share a rank; ``ties`` selects what the next rank is.
+    """
+    if ties not in TIE_POLICIES:
+        raise ValueError(f'Unknown tie policy {ties!r}, expected one of {TIE_POLICIES}')
+    rank = 0
+    previous = object()
+    for position, score in enumerate(scores, start=1):
+        if score != previous:
+            rank = position if ties == 'competition' else rank + 1
+            previous = score
+        yield rank
+
+
+def _assign_model_ranks(model, ties):
+    entries = list(
+        model.objects.order_by('-total_calories', 'id')
+        .values_list('id', 'total_calories', 'rank')
+    )
+    ranks = rank_sorted((calories for _, calories, _ in entries), ties)
+    now = timezone.now()
+    changed = [
+        model(id=entry_id, rank=rank, last_updated=now)
+        for rank, (entry_id, _, current) in zip(ranks, entries)
+        if current != rank
+    ]
+    if changed:
+        model.objects.bulk_update(changed, ['rank', 'last_updated'], batch_size=1000)
+    return len(changed)
+
+
+def assign_ranks(ties=DEFAULT_TIE_POLICY):
+    """
+    Re-rank users and teams by total calories, writing only rows whose
+    rank changed. Returns the number of rows updated.
+    """
+    changed = _assign_model_ranks(LeaderBoard, ties) + _assign_model_ranks(TeamStanding, ties)
+    if changed:
+        caching.invalidate('leaderboard')
+    return changed
+
+
+def _value(row, field):
+    return row[field] if isinstance(row, dict) else getattr(row, field)
+
+
+def around(entries, email, radius):
+    """
+    Return the ranked entry of ``email`` with up to ``radius`` entries
+    before and after it in ``(rank, id)`` order, or None if the user has
+    no ranked entry. ``entries`` is a LeaderBoard queryset (instances or
+    ``.values()`` rows including ``rank`` and ``id``).
+
+    Each side is read by seeking the ``(rank, id)`` index: first the tied
+    entries next to the user's, then the closest other ranks, so the cost
+    does not depend on the user's position.
+    """
+    entries = entries.order_by()
+    own = entries.filter(user_email=email, rank__isnull=False).first()
+    if own is None:
+        return None
+    rank, pk = _value(own, 'rank'), _value(own, 'id')
+    if not radius:
+        return [own]
+
+    above = list(entries.filter(rank=rank, id__lt=pk).order_by('-id')[:radius])
+    if len(above) < radius:
+        above += entries.filter(rank__lt=rank).order_by('-rank', '-id')[:radius - len(above)]
+    below = list(entries.filter(rank=rank, id__gt=pk).order_by('id')[:radius])
+    if len(below) < radius:
+        below += entries.filter(rank__gt=rank).order_by('rank', 'id')[:radius - len(below)]
+    return above[::-1] + [own] + below
+
+
+def compute_entries(ties=DEFAULT_TIE_POLICY):
+    """
+    Compute the expected leaderboard from scratch.
+
+    Returns a dict of email -> field values covering every email with
+    activities, built from one grouped aggregation over activities and one
+    scan of users (for registered users' names and teams), ranked in a
+    single sorted pass.
+    """
+    totals = (
+        Activity.objects.order_by()
+        .values('user_email')
+        .annotate(
+            total_activities=Count('id'),
+            total_calories=Sum('calories'),
+            total_duration=Sum('duration'),
+            user_name=Max('user_name'),
+        )
+    )
+    users = {
+        email: (name, team or '')
+        for email, name, team in User.objects.values_list('email', 'name', 'team').iterator()
+    }
+    entries = {}
+    for row in totals.iterator():
+        name, team = users.get(row['user_email'], (row['user_name'], ''))
+        entry = entries[row['user_email']] = {'user_name': name, 'team': team}
+        for field in TOTAL_FIELDS:
+            entry[field] = row[field] or 0
+
+    ordered = sorted(entries.items(), key=lambda item: (-item[1]['total_calories'], item[0]))
+    ranks = rank_sorted((entry['total_calories'] for _, entry in ordered), ties)
+    for rank, (_, entry) in zip(ranks, ordered):
+        entry['rank'] = rank
+    return entries
+
+
+def _sync(model, key_field, expected, fields, dry_run, batch_size):
+    """
+    Write ``expected`` (key -> field values) into ``model``, touching only
+    rows that differ. Returns a dict with ``created``, ``updated`` and
+    ``deleted`` lists of ``(key, changes)`` pairs plus an ``unchanged``
+    count.
+    """
+    existing = {
+        row[1]: row
+        for row in model.objects.values_list('id', key_field, *fields).iterator()
+    }
+
+    now = timezone.now()
+    to_create, to_update, stale_ids = [], [], []
+    result = {'created': [], 'updated': [], 'deleted': [], 'unchanged': 0}
+    for key, entry in expected.items():
+        row = existing.pop(key, None)
+        if row is None:
+            to_create.append(model(**{key_field: key}, last_updated=now, **entry))
+            result['created'].append((key, entry))
+            continue
+        current = dict(zip(fields, row[2:]))
+        changes = {
+            field: (current[field], entry[field])
+            for field in fields
+            if current[field] != entry[field]
+        }
+        if changes:
+            to_update.append(model(id=row[0], last_updated=now, **entry))
+            result['updated'].append((key, changes))
+        else:
+            result['unchanged'] += 1
+    for key, row in existing.items():
+        stale_ids.append(row[0])
+        result['deleted'].append((key, dict(zip(fields, row[2:]))))
+
+    if dry_run:
+        return result
+
+    with transaction.atomic():
+        for start in range(0, len(stale_ids), batch_size):
+            model.objects.filter(id__in=stale_ids[start:start + batch_size]).delete()
+        model.objects.bulk_update(to_update, fields + ('last_updated',), batch_size=batch_size)
+        model.objects.bulk_create(to_create, batch_size=batch_size)
+        caching.invalidate('leaderboard')
+        if model is LeaderBoard:
+            transaction.on_commit(distribution.mark_stale)
+    return result
+
+
+def rebuild(ties=DEFAULT_TIE_POLICY, dry_run=False, batch_size=1000):
+    """
+    Bring the LeaderBoard table in line with the activity history, then
+    recompute team standings from it.
+
+    Only rows that differ from the computed state are written, using
+    batched ``bulk_create``/``bulk_update``/``delete`` calls. Returns the
+    user-level result of ``_sync``; with ``dry_run`` nothing is written.
+    """
+    fields = ('user_name', 'team') + TOTAL_FIELDS + ('rank',)
+    result = _sync(LeaderBoard, 'user_email', compute_entries(ties), fields, dry_run, batch_size)
+    if not dry_run:
+        rebuild_team_standings(ties, batch_size=batch_size)
+    return result
+
+
+def compute_team_standings(ties=DEFAULT_TIE_POLICY):
+    """
+    Compute team standings from the LeaderBoard table with one grouped
+    aggregation. Teams without members are included with zero totals.
+    """
+    standings = {
+        name: {'member_count': 0, 'total_activities': 0, 'total_calories': 0, 'total_duration': 0}
+        for name in Team.objects.values_list('name', flat=True).iterator()
+    }
+    totals = (
+        LeaderBoard.objects.order_by()
+        .exclude(team='')
+        .values('team')
+        .annotate(
+            member_count=Count('id'),
+            total_activities=Sum('total_activities'),
+            total_calories=Sum('total_calories'),
+            total_duration=Sum('total_duration'),
+        )
+    )
+    for row in totals.iterator():
+        team = row.pop('team')
+        standings[team] = {field: value or 0 for field, value in row.items()}
+
+    ordered = sorted(standings.items(), key=lambda item: (-item[1]['total_calories'], item[0]))
+    ranks = rank_sorted((standing['total_calories'] for _, standing in ordered), ties)
+    for rank, (_, standing) in zip(ranks, ordered):
+        standing['rank'] = rank
+    return standings
+
+
+def rebuild_team_standings(ties=DEFAULT_TIE_POLICY, dry_run=False, batch_size=1000):
+    """Bring the TeamStanding table in line with the LeaderBoard table"""
+    fields = ('member_count',) + TOTAL_FIELDS + ('rank',)
+    return _sync(TeamStanding, 'team', compute_team_standings(ties), fields, dry_run, batch_size)
+
+
+def day_start(day):
+    """Return the aware datetime at which ``day`` begins"""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def rebuild_rollups(start=None, end=None, batch_size=1000):
+    """
+    Recompute daily rollups from activities, optionally for days in
+    ``[start, end]`` only. Returns the number of rollup rows written.
+    """
+    activities = Activity.objects.order_by()
+    rollups = DailyActivityRollup.objects.all()
+    if start is not None:
+        activities = activities.filter(date__gte=day_start(start))
+        rollups = rollups.filter(day__gte=start)
+    if end is not None:
+        activities = activities.filter(date__lt=day_start(end + timedelta(days=1)))
+        rollups = rollups.filter(day__lte=end)
+
+    rows = (
+        activities.annotate(day=TruncDate('date'))
+        .values('user_email', 'day')
+        .annotate(
+            total_activities=Count('id'),
+            total_calories=Sum('calories'),
+            total_duration=Sum('duration'),
+        )
+        .iterator()
+    )
+    written = 0
+    with transaction.atomic():
+        rollups.delete()
+        while True:
+            batch = [DailyActivityRollup(**row) for row in islice(rows, batch_size)]
+            if not batch:
+                break
+            DailyActivityRollup.objects.bulk_create(batch)
+            written += len(batch)
+        caching.invalidate('rollups')
+    return written
+
+
+def window_standings(start, end, ties=DEFAULT_TIE_POLICY):
+    """
+    Rank users by calories burned on days ``start`` through ``end``.
+
+    Reads only the rollup rows inside the window (one per active user per
+    day); names and teams come from the matching leaderboard rows through
+    a correlated lookup on the unique ``user_email``, in the same query.
+    """
+    profile = LeaderBoard.objects.filter(user_email=OuterRef('user_email')).order_by()
+    totals = list(
+        DailyActivityRollup.objects.filter(day__gte=start, day__lte=end)
+        .values('user_email')
+        .annotate(
+            total_activities=Sum('total_activities'),
+            total_calories=Sum('total_calories'),
+            total_duration=Sum('total_duration'),
+        )
+        .filter(total_activities__gt=0)
+        .annotate(
+            user_name=Subquery(profile.values('user_name')[:1]),
+            team=Subquery(profile.values('team')[:1]),
+        )
+        .order_by('-total_calories', 'user_email')
+    )
+    ranks = rank_sorted((row['total_calories'] for row in totals), ties)
+    for rank, row in zip(ranks, totals):
+        row['user_name'] = row['user_name'] or ''
+        row['team'] = row['team'] or ''
+        row['rank'] = rank
+    return totals
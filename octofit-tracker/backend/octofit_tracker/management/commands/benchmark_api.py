@@ -0,0 +1,117 @@
+import json
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from octofit_tracker import benchmarks
+
+
+ACTIVITIES_PER_USER = 20
+USERS_PER_TEAM = 50
+
+
+def parse_size(value):
+    """Parse dataset sizes such as 1000, 100k or 1m"""
+    multiplier = {'k': 1000, 'm': 1000000}.get(value[-1:].lower(), 1)
+    number = value[:-1] if multiplier > 1 else value
+    if not number.isdigit() or int(number) < 1:
+        raise CommandError(f'Invalid dataset size {value!r}')
+    return int(number) * multiplier
+
+
+class Command(BaseCommand):
+    help = 'Benchmark every API endpoint against generated datasets in a test database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            default='1k,100k,1m',
+            help='Comma-separated activity counts to benchmark (default: %(default)s)',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Requests per endpoint; the median time is kept (default: %(default)s)',
+        )
+        parser.add_argument(
+            '--baseline',
+            default=str(settings.BASE_DIR / 'benchmark_baseline.json'),
+            help='Baseline file to compare against (default: %(default)s)',
+        )
+        parser.add_argument(
+            '--update-baseline',
+            action='store_true',
+            help='Write the results as the new baseline instead of comparing',
+        )
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=0.25,
+            help='Allowed slowdown relative to the baseline (default: %(default)s)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Processes used to generate each dataset (default: %(default)s)',
+        )
+
+    def handle(self, *args, **options):
+        sizes = [(label.strip(), parse_size(label.strip())) for label in options['sizes'].split(',')]
+        baseline = {}
+        if not options['update_baseline']:
+            try:
+                with open(options['baseline']) as baseline_file:
+                    baseline = json.load(baseline_file)
+            except FileNotFoundError:
+                self.stdout.write(self.style.WARNING('No baseline found; checking query budgets only'))
+
+        results = {}
+        failures = []
+        with benchmarks.temporary_database():
+            for label, size in sizes:
+                users = max(size // ACTIVITIES_PER_USER, 1)
+                self.stdout.write(f'Seeding {label} ({users} users)...')
+                call_command(
+                    'populate_db',
+                    users=users,
+                    activities_per_user=ACTIVITIES_PER_USER,
+                    teams=max(users // USERS_PER_TEAM, 1),
+                    seed=42,
+                    workers=options['workers'],
+                    stdout=StringIO(),
+                )
+                results[label] = benchmarks.run(
+                    Client(), benchmarks.dataset_context(), options['repeat']
+                )
+                self.write_table(label, results[label])
+                failures += [
+                    f'[{label}] {failure}'
+                    for failure in benchmarks.check(
+                        results[label], baseline.get(label), options['tolerance']
+                    )
+                ]
+
+        if options['update_baseline']:
+            with open(options['baseline'], 'w') as baseline_file:
+                json.dump(results, baseline_file, indent=2, sort_keys=True)
+            self.stdout.write(self.style.SUCCESS(f'Baseline written to {options["baseline"]}'))
+            return
+
+        for failure in failures:
+            self.stdout.write(self.style.ERROR(failure))
+        if failures:
+            raise CommandError(f'{len(failures)} benchmark check(s) failed')
+        self.stdout.write(self.style.SUCCESS('All endpoints within budget'))
+
+    def write_table(self, label, results):
+        self.stdout.write(f'\n{label}:')
+        self.stdout.write(f'  {"endpoint":<42} {"ms":>9} {"queries":>8} {"bytes":>10}')
+        for endpoint, result in results.items():
+            self.stdout.write(
+                f'  {endpoint:<42} {result["ms"]:>9.2f} '
+                f'{result["queries"]:>4}/{result["budget"]:<3} {result["bytes"]:>10}'
+            )
@@ -0,0 +1,88 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from octofit_tracker import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare throughput and p50/p99 latency of the async read endpoints under ASGI '
+        'against the WSGI viewsets with the same worker budget, in a test database'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users',
+            type=int,
+            default=2000,
+            help='Users to seed, with 20 activities each (default: %(default)s)',
+        )
+        parser.add_argument(
+            '--concurrency',
+            default='1,16,64',
+            help='Comma-separated numbers of concurrent clients (default: %(default)s)',
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=500,
+            help='Requests per endpoint and concurrency level (default: %(default)s)',
+        )
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=4,
+            help='Worker threads serving WSGI requests (default: %(default)s)',
+        )
+
+        parser.add_argument(
+            '--db-latency',
+            type=float,
+            default=0,
+            help='Milliseconds added to every query, simulating a remote database (default: %(default)s)',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            concurrency = [int(level) for level in options['concurrency'].split(',')]
+        except ValueError:
+            raise CommandError('--concurrency must be a comma-separated list of numbers')
+        if min(concurrency) < 1 or options['requests'] < 1 or options['threads'] < 1:
+            raise CommandError('--concurrency, --requests and --threads must be positive')
+
+        from octofit_tracker.asgi import application as asgi_application
+        from octofit_tracker.wsgi import application as wsgi_application
+
+        with benchmarks.temporary_database():
+            self.stdout.write(f'Seeding {options["users"]} users...')
+            call_command(
+                'populate_db', users=options['users'], activities_per_user=20,
+                teams=max(options['users'] // 50, 1), seed=42, stdout=StringIO(),
+            )
+            context = benchmarks.dataset_context()
+            with benchmarks.simulated_latency(options['db_latency'] / 1000):
+                results = benchmarks.compare_load(
+                    wsgi_application, asgi_application, context,
+                    concurrency, options['requests'], options['threads'],
+                )
+
+        self.stdout.write(
+            f'\nWSGI: {options["threads"]} worker threads; ASGI: one event loop, with the '
+            f'viewsets and with the async views; {options["requests"]} requests per row; '
+            f'{options["db_latency"]} ms added per query'
+        )
+        self.stdout.write(f'  {"":<34} {"":>7} ' + ''.join(
+            f'{name:>27}' for name in ('wsgi', 'asgi viewsets', 'asgi async views')
+        ))
+        self.stdout.write(f'  {"endpoint":<34} {"clients":>7} ' + f'{"rps":>9}{"p50":>9}{"p99":>9}' * 3)
+        errors = 0
+        for label, levels in results.items():
+            for level, result in levels.items():
+                row = f'  {label:<34} {level:>7} '
+                for name in ('wsgi', 'asgi_sync', 'asgi'):
+                    errors += result[name]['errors']
+                    row += f'{result[name]["rps"]:>9.1f}{result[name]["p50_ms"]:>9.2f}{result[name]["p99_ms"]:>9.2f}'
+                self.stdout.write(row)
+        if errors:
+            raise CommandError(f'{errors} request(s) did not answer 200')
@@ -0,0 +1,79 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from octofit_tracker import benchmarks
+from octofit_tracker.fastpath import compile_serializer
+from octofit_tracker.models import Activity, LeaderBoard
+from octofit_tracker.serializers import ActivitySerializer, LeaderBoardSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare list serialization (DRF serializers vs the fast path) and JSON rendering '
+        '(DRF vs FastJSONRenderer, raw vs gzip) in a test database'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows',
+            type=int,
+            default=10000,
+            help='Activities and leaderboard entries to serialize (default: %(default)s)',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Runs per path; the median time is kept (default: %(default)s)',
+        )
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        if rows < 1:
+            raise CommandError('--rows must be positive')
+
+        with benchmarks.temporary_database():
+            # One activity per user gives as many leaderboard entries as activities
+            self.stdout.write(f'Seeding {rows} users with one activity each...')
+            call_command(
+                'populate_db', users=rows, activities_per_user=1,
+                teams=max(rows // 50, 1), seed=42, stdout=StringIO(),
+            )
+            results = {
+                'activities': benchmarks.compare_serialization(
+                    ActivitySerializer, Activity.objects.order_by('-date', 'id'), options['repeat']
+                ),
+                'leaderboard': benchmarks.compare_serialization(
+                    LeaderBoardSerializer, LeaderBoard.objects.order_by('rank', 'id'), options['repeat']
+                ),
+            }
+            # The body of a single /api/activities/ page holding every row
+            compiled = compile_serializer(ActivitySerializer)
+            page = {
+                'next': None,
+                'previous': None,
+                'results': compiled.to_representation(
+                    Activity.objects.order_by('-date', 'id').values(*compiled.columns)
+                ),
+            }
+            rendering = benchmarks.compare_rendering(page, options['repeat'])
+
+        self.stdout.write(f'\n  {"list":<12} {"rows":>7} {"serializer ms":>14} {"fast ms":>9} {"speedup":>8}')
+        for name, result in results.items():
+            self.stdout.write(
+                f'  {name:<12} {result["rows"]:>7} {result["serializer_ms"]:>14.2f} '
+                f'{result["fast_ms"]:>9.2f} {result["speedup"]:>7.2f}x'
+            )
+
+        self.stdout.write(f'\n  {"renderer":<12} {"ms":>9} {"bytes":>10}')
+        self.stdout.write(f'  {"drf json":<12} {rendering["drf_ms"]:>9.2f} {rendering["bytes"]:>10}')
+        self.stdout.write(f'  {"fast json":<12} {rendering["fast_ms"]:>9.2f} {rendering["bytes"]:>10}')
+        self.stdout.write(f'  {"+ gzip":<12} {rendering["gzip_ms"]:>9.2f} {rendering["gzip_bytes"]:>10}')
+
+        different = [name for name, result in results.items() if not result['identical']]
+        if not rendering['identical']:
+            different.append('rendering')
+        if different:
+            raise CommandError(f'Fast path output differs for: {", ".join(different)}')
+        self.stdout.write(self.style.SUCCESS('Fast path output is identical'))
@@ -0,0 +1,104 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from octofit_tracker.models import (
+    User, Team, Activity, LeaderBoard, TeamStanding, Workout, Coach, DailyActivityRollup,
+    SearchToken,
+)
+from octofit_tracker.search import IndexedSearchFilter
+from octofit_tracker.urls import router
+
+
+# Query paths served by the API: (endpoint, model, equality filter columns,
+# ordering columns). A path is index-backed when some index starts with the
+# filter columns followed by the leading ordering column.
+HOT_QUERIES = [
+    ('GET /api/users/by_team/', User, ['team'], []),
+    ('GET /api/activities/', Activity, [], ['date']),
+    ('GET /api/activities/by_user/', Activity, ['user_email'], ['date']),
+    ('GET /api/activities/by_type/', Activity, ['activity_type'], ['date']),
+    ('GET /api/leaderboard/', LeaderBoard, [], ['total_calories']),
+    ('GET /api/leaderboard/top/', LeaderBoard, [], ['rank']),
+    ('GET /api/leaderboard/around/', LeaderBoard, ['rank'], ['id']),
+    ('GET /api/leaderboard/by_team/', LeaderBoard, ['team'], ['rank']),
+    ('GET /api/leaderboard/stream/', LeaderBoard, [], ['last_updated']),
+    ('GET /api/leaderboard/?window=', DailyActivityRollup, [], ['day']),
+    ('GET /api/teams/standings/', TeamStanding, [], ['rank']),
+    ('GET /api/workouts/by_difficulty/', Workout, ['difficulty'], []),
+    ('GET /api/workouts/by_type/', Workout, ['activity_type'], []),
+]
+
+
+def live_indexes(model):
+    """Return the column lists of every index on the model's table"""
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, model._meta.db_table)
+    return [
+        list(info['columns'])
+        for info in constraints.values()
+        if info['index'] or info['unique'] or info['primary_key']
+    ]
+
+
+def declared_columns(model, index):
+    """Translate a Meta index's field names into column names"""
+    return [
+        model._meta.get_field(name.lstrip('-')).column
+        for name in index.fields
+    ]
+
+
+def covers(columns, filters, ordering):
+    """Return True if an index on ``columns`` can serve the query without a scan"""
+    wanted = filters + ordering[:1]
+    if not wanted:
+        return True
+    if len(columns) < len(wanted):
+        return False
+    return set(columns[:len(filters)]) == set(filters) and columns[len(filters):len(wanted)] == ordering[:1]
+
+
+class Command(BaseCommand):
+    help = 'Verify declared indexes exist in the database and report query paths that scan'
+
+    def handle(self, *args, **options):
+        missing = []
+        live = {}
+        for model in (
+            User, Team, Activity, LeaderBoard, TeamStanding, Workout, Coach,
+            DailyActivityRollup, SearchToken,
+        ):
+            live[model] = live_indexes(model)
+            for index in model._meta.indexes:
+                columns = declared_columns(model, index)
+                if columns in live[model]:
+                    self.stdout.write(f'OK       {model._meta.db_table}.{index.name} ({", ".join(columns)})')
+                else:
+                    missing.append(index.name)
+                    self.stdout.write(self.style.ERROR(
+                        f'MISSING  {model._meta.db_table}.{index.name} ({", ".join(columns)})'
+                    ))
+
+        self.stdout.write('\nQuery paths:')
+        for endpoint, model, filters, ordering in HOT_QUERIES:
+            if any(covers(columns, filters, ordering) for columns in live[model]):
+                self.stdout.write(f'index    {endpoint}')
+            else:
+                self.stdout.write(self.style.WARNING(f'SCAN     {endpoint}'))
+
+        # SearchFilter builds OR'ed icontains lookups that no B-tree index can
+        # serve; IndexedSearchFilter uses range scans on the token index.
+        token_index = any(covers(columns, ['kind'], ['token']) for columns in live[SearchToken])
+        for prefix, viewset, basename in router.registry:
+            search_fields = getattr(viewset, 'search_fields', None)
+            if not search_fields:
+                continue
+            if IndexedSearchFilter in viewset.filter_backends and token_index:
+                self.stdout.write(f'index    GET /api/{prefix}/?search= (token index)')
+            else:
+                self.stdout.write(self.style.WARNING(
+                    f'SCAN     GET /api/{prefix}/?search= (icontains on {", ".join(search_fields)})'
+                ))
+
+        if missing:
+            raise CommandError(f'{len(missing)} declared index(es) missing: {", ".join(missing)}; run migrate')
+        self.stdout.write(self.style.SUCCESS('All declared indexes are present'))
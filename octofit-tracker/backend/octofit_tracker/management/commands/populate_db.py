@@ -1,14 +1,165 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
 from django.utils import timezone
-from octofit_tracker.models import User, Team, Activity, LeaderBoard, Workout
+from octofit_tracker.models import User, Team, Activity, LeaderBoard, Workout, DailyActivityRollup
+from octofit_tracker import caching, leaderboard, search, synthetic
 from datetime import timedelta
+import multiprocessing
 import random
+import time
 
 
 class Command(BaseCommand):
     help = 'Populate the octofit_db database with test data'
 
-    def handle(self, *args, **kwargs):
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users',
+            type=int,
+            help='Generate this many synthetic users instead of the superhero seed',
+        )
+        parser.add_argument(
+            '--activities-per-user',
+            type=int,
+            default=20,
+            help='Average activities per generated user (default: %(default)s)',
+        )
+        parser.add_argument(
+            '--teams',
+            type=int,
+            default=10,
+            help='Number of generated teams (default: %(default)s)',
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=30,
+            help='Spread generated activities over this many past days (default: %(default)s)',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            help='Random seed; the same options and seed produce the same data',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Rows per bulk insert (default: %(default)s)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Processes inserting activities in parallel; requires fork (default: %(default)s)',
+        )
+
+    def handle(self, *args, **options):
+        # Leaderboard totals and the search index are computed in bulk
+        # below, so skip the per-object incremental updates while seeding.
+        with leaderboard.tracking_disabled():
+            if options['users'] is not None:
+                self.generate(options)
+            else:
+                self.populate()
+
+    def generate(self, options):
+        users = options['users']
+        teams = options['teams']
+        activities_per_user = options['activities_per_user']
+        batch_size = options['batch_size']
+        workers = options['workers']
+        if users < 1 or teams < 1 or activities_per_user < 0 or options['days'] < 1:
+            raise CommandError('Users, teams and days must be positive and activities non-negative')
+        if workers > 1 and 'fork' not in multiprocessing.get_all_start_methods():
+            raise CommandError('--workers needs the fork start method, which this platform lacks')
+        seed = options['seed'] if options['seed'] is not None else random.randrange(2 ** 32)
+        self.stdout.write(f'Generating data with seed {seed}')
+        started = time.monotonic()
+        
+        self.stdout.write('Deleting existing data...')
+        User.objects.all().delete()
+        Team.objects.all().delete()
+        # Activities have delete signal receivers, which would make the ORM
+        # fetch every row before deleting it; totals and search tokens are
+        # rebuilt below anyway, so empty the table with one plain DELETE.
+        connection = connections[Activity.objects.db]
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {connection.ops.quote_name(Activity._meta.db_table)}')
+        LeaderBoard.objects.all().delete()
+        DailyActivityRollup.objects.all().delete()
+        Workout.objects.all().delete()
+        
+        self.stdout.write(f'Creating {teams} teams and {users} users...')
+        rng = random.Random(seed)
+        members = [[] for _ in range(teams)]
+        batch = []
+        for index in range(users):
+            team = rng.randrange(teams)
+            email = synthetic.user_email(index)
+            members[team].append(email)
+            batch.append(User(
+                email=email,
+                name=synthetic.user_name(index),
+                password='octofit123',
+                team=synthetic.team_name(team),
+            ))
+            if len(batch) >= batch_size:
+                User.objects.bulk_create(batch)
+                batch = []
+        User.objects.bulk_create(batch)
+        Team.objects.bulk_create(
+            (Team(
+                name=synthetic.team_name(index),
+                description=f'Generated team {index + 1}',
+                members=team_members,
+            ) for index, team_members in enumerate(members)),
+            batch_size=batch_size,
+        )
+        
+        self.stdout.write('Creating activities...')
+        now = timezone.now()
+        block_users = max(1, 10 * batch_size // max(activities_per_user, 1))
+        blocks = [
+            (start, min(start + block_users, users), seed, activities_per_user,
+             options['days'], now, batch_size)
+            for start in range(0, users, block_users)
+        ]
+        done_users = done_activities = 0
+        if workers > 1:
+            # Children must open their own database connections
+            connections.close_all()
+            pool = multiprocessing.get_context('fork').Pool(workers)
+            results = pool.imap_unordered(synthetic.write_activity_block, blocks)
+        else:
+            pool = None
+            results = map(synthetic.write_activity_block, blocks)
+        try:
+            for block_users_written, block_activities in results:
+                done_users += block_users_written
+                done_activities += block_activities
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f'  {done_users}/{users} users, {done_activities} activities '
+                    f'({done_activities / max(elapsed, 1e-9):,.0f}/s overall)'
+                )
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+        
+        self.stdout.write('Building leaderboard, daily rollups and search index...')
+        leaderboard.rebuild(batch_size=batch_size)
+        leaderboard.rebuild_rollups(batch_size=batch_size)
+        search.rebuild_index(Activity, batch_size=batch_size)
+        # Bulk inserts and the raw delete above send no model signals
+        caching.invalidate('users', 'teams', 'activities')
+        
+        self.create_workouts()
+        self.print_summary()
+        self.stdout.write(self.style.SUCCESS(f'Generated in {time.monotonic() - started:.1f}s'))
+
+    def populate(self):
         self.stdout.write('Deleting existing data...')
         
         # Delete existing data
@@ -16,6 +167,7 @@ class Command(BaseCommand):
         Team.objects.all().delete()
         Activity.objects.all().delete()
         LeaderBoard.objects.all().delete()
+        DailyActivityRollup.objects.all().delete()
         Workout.objects.all().delete()
         
         self.stdout.write(self.style.SUCCESS('Existing data deleted'))
@@ -153,29 +305,16 @@ class Command(BaseCommand):
         
         # Create leaderboard entries
         self.stdout.write('Creating leaderboard entries...')
-        for user in created_users:
-            user_activities = Activity.objects.filter(user_email=user.email)
-            total_activities = user_activities.count()
-            total_calories = sum(a.calories for a in user_activities)
-            total_duration = sum(a.duration for a in user_activities)
-            
-            LeaderBoard.objects.create(
-                user_email=user.email,
-                user_name=user.name,
-                team=user.team,
-                total_activities=total_activities,
-                total_calories=total_calories,
-                total_duration=total_duration
-            )
-        
-        # Update ranks
-        leaderboard_entries = LeaderBoard.objects.all().order_by('-total_calories')
-        for rank, entry in enumerate(leaderboard_entries, start=1):
-            entry.rank = rank
-            entry.save()
+        leaderboard.rebuild()
+        leaderboard.rebuild_rollups()
+        search.rebuild_index(Activity)
         
         self.stdout.write(self.style.SUCCESS(f'Created {len(created_users)} leaderboard entries'))
         
+        self.create_workouts()
+        self.print_summary()
+
+    def create_workouts(self):
         # Create workouts
         self.stdout.write('Creating workout suggestions...')
         workouts = [
@@ -299,11 +438,13 @@ class Command(BaseCommand):
             }
         ]
         
-        for workout_data in workouts:
-            Workout.objects.create(**workout_data)
+        Workout.objects.bulk_create(Workout(**workout_data) for workout_data in workouts)
+        search.rebuild_index(Workout)
+        caching.invalidate('workouts')
         
         self.stdout.write(self.style.SUCCESS(f'Created {len(workouts)} workout suggestions'))
-        
+
+    def print_summary(self):
         # Summary
         self.stdout.write(self.style.SUCCESS('\n=== Database Population Summary ==='))
         self.stdout.write(self.style.SUCCESS(f'Teams: {Team.objects.count()}'))
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from octofit_tracker import leaderboard
+
+
+class Command(BaseCommand):
+    help = 'Recompute leaderboard totals and ranks from the activity history'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ties',
+            choices=leaderboard.TIE_POLICIES,
+            default=leaderboard.DEFAULT_TIE_POLICY,
+            help='Rank policy for equal calorie totals (default: %(default)s)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Rows per bulk write (default: %(default)s)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show the differences without writing them',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        result = leaderboard.rebuild(
+            ties=options['ties'],
+            dry_run=dry_run,
+            batch_size=options['batch_size'],
+        )
+
+        if dry_run:
+            for email, entry in result['created']:
+                self.stdout.write(f'+ {email}: {entry}')
+            for email, changes in result['updated']:
+                diff = ', '.join(f'{field} {old!r} -> {new!r}' for field, (old, new) in changes.items())
+                self.stdout.write(f'~ {email}: {diff}')
+            for email, entry in result['deleted']:
+                self.stdout.write(f'- {email}: {entry}')
+
+        verb = 'Would write' if dry_run else 'Wrote'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} leaderboard: {len(result['created'])} created, "
+            f"{len(result['updated'])} updated, {len(result['deleted'])} deleted, "
+            f"{result['unchanged']} unchanged"
+        ))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from octofit_tracker import leaderboard
+
+
+class Command(BaseCommand):
+    help = 'Backfill daily activity rollups from the activity history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='start', help='First day to rebuild (YYYY-MM-DD)')
+        parser.add_argument('--to', dest='end', help='Last day to rebuild (YYYY-MM-DD)')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Rows per bulk insert (default: %(default)s)',
+        )
+
+    def handle(self, *args, **options):
+        bounds = {}
+        for name in ('start', 'end'):
+            value = options[name]
+            if value is not None:
+                try:
+                    bounds[name] = parse_date(value)
+                except ValueError:
+                    # Well formed but impossible, e.g. 2024-02-30
+                    bounds[name] = None
+                if bounds[name] is None:
+                    raise CommandError(f'Invalid date {value!r}, expected YYYY-MM-DD')
+
+        written = leaderboard.rebuild_rollups(batch_size=options['batch_size'], **bounds)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} daily rollups'))
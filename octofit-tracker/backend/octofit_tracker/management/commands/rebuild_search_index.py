@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from octofit_tracker import caching, search
+from octofit_tracker.models import Activity, Workout
+
+
+# Search index kinds and the response namespaces their results appear in
+TARGETS = {
+    'activities': (Activity, 'activities'),
+    'workouts': (Workout, 'workouts'),
+}
+
+
+class Command(BaseCommand):
+    help = 'Recompute the search token index from activities and workouts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--only',
+            choices=sorted(TARGETS),
+            help='Rebuild the index of one model only',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Rows per bulk insert (default: %(default)s)',
+        )
+
+    def handle(self, *args, **options):
+        names = [options['only']] if options['only'] else sorted(TARGETS)
+        for name in names:
+            model, namespace = TARGETS[name]
+            written = search.rebuild_index(model, batch_size=options['batch_size'])
+            caching.invalidate(namespace)
+            self.stdout.write(self.style.SUCCESS(f'Wrote {written} search tokens for {name}'))
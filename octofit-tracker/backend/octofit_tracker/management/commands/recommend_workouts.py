@@ -0,0 +1,39 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from octofit_tracker import recommendations
+
+
+class Command(BaseCommand):
+    help = (
+        'Score every user against the workout catalog and store their top '
+        'recommendations (meant to run nightly, e.g. from cron)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=settings.RECOMMENDATION_MAX_LIMIT,
+            help='Recommendations stored per user (default: %(default)s)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Users scored per matrix operation (default: %(default)s)',
+        )
+
+    def handle(self, *args, **options):
+        if not recommendations.available():
+            raise CommandError('Recommendations need numpy, which is not installed')
+        if options['limit'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--limit and --batch-size must be positive')
+        started = time.monotonic()
+        users = recommendations.rebuild_recommendations(
+            limit=options['limit'], batch_size=options['batch_size']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Stored recommendations for {users} users in {time.monotonic() - started:.1f}s'
+        ))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from octofit_tracker import members
+
+
+class Command(BaseCommand):
+    help = 'Rewrite Team.members from the teams named by User.team and report users of unknown teams'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=members.LOOKUP_BATCH_SIZE,
+            help='Teams checked per user query (default: %(default)s)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show the differences without writing them',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        result = members.reconcile(batch_size=options['batch_size'], dry_run=dry_run)
+
+        for team, added, removed in result['updated']:
+            changes = [f'+{email}' for email in added] + [f'-{email}' for email in removed]
+            self.stdout.write(f'~ {team}: {", ".join(changes) or "duplicates removed"}')
+        for team, count in sorted(result['unknown_teams'].items()):
+            self.stdout.write(self.style.WARNING(f'? {team}: {count} user(s) name a team that does not exist'))
+
+        verb = 'Would update' if dry_run else 'Updated'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {len(result['updated'])} team(s); {result['unchanged']} unchanged, "
+            f"{len(result['unknown_teams'])} unknown team name(s)"
+        ))
@@ -0,0 +1,115 @@
+"""Team membership: expanded member details and consistency with users.
+
+``Team.members`` stores member emails while ``User.team`` names the team
+of each user; the leaderboard and team standings follow ``User.team``.
+``member_details`` resolves many teams' member emails to user names and
+leaderboard totals with a fixed number of queries per batch of emails,
+and ``reconcile`` rewrites ``Team.members`` from ``User.team`` when the
+two have drifted apart.
+"""
+from django.db import transaction
+from django.db.models import Count
+
+from .models import User, Team, LeaderBoard
+from . import caching
+
+
+# Leaderboard fields included with each expanded member
+TOTAL_FIELDS = ('total_activities', 'total_calories', 'total_duration', 'rank')
+
+# Emails per IN (...) lookup, below the bound-parameter limit of SQLite
+LOOKUP_BATCH_SIZE = 500
+
+
+def member_emails(members):
+    """
+    Return the email entries of a ``Team.members`` value: the strings of a
+    list, ignoring anything else stored in the JSON field
+    """
+    if not isinstance(members, list):
+        return []
+    return [email for email in members if isinstance(email, str)]
+
+
+def member_details(emails, batch_size=LOOKUP_BATCH_SIZE):
+    """
+    Return ``{email: details}`` for ``emails``: the user's name and team
+    plus their leaderboard totals. Unknown users and users without a
+    leaderboard entry get None for the missing values. Costs two queries
+    per ``batch_size`` distinct emails.
+    """
+    emails = list(dict.fromkeys(email for email in emails if isinstance(email, str)))
+    details = {
+        email: {'email': email, 'name': None, 'team': None, **dict.fromkeys(TOTAL_FIELDS)}
+        for email in emails
+    }
+    for start in range(0, len(emails), batch_size):
+        batch = emails[start:start + batch_size]
+        for email, name, team in User.objects.filter(email__in=batch).values_list('email', 'name', 'team'):
+            details[email].update(name=name, team=team)
+        totals = LeaderBoard.objects.filter(user_email__in=batch).values_list('user_email', *TOTAL_FIELDS)
+        for email, *values in totals:
+            details[email].update(zip(TOTAL_FIELDS, values))
+    return details
+
+
+def reconcile(batch_size=LOOKUP_BATCH_SIZE, dry_run=False):
+    """
+    Make every team's ``members`` list the emails of the users whose
+    ``User.team`` names it, keeping the order of members already listed
+    and appending new ones sorted. Teams are processed ``batch_size`` at a
+    time with one user query per batch.
+
+    Returns a dict with ``updated`` (``(team, added, removed)`` triples),
+    an ``unchanged`` count and ``unknown_teams`` (``{team name: user
+    count}`` for user teams that match no Team).
+    """
+    result = {'updated': [], 'unchanged': 0, 'unknown_teams': {}}
+    known = set()
+    teams = Team.objects.order_by('id').only('id', 'name', 'members')
+    batch = []
+    for team in teams.iterator(chunk_size=batch_size):
+        batch.append(team)
+        if len(batch) >= batch_size:
+            _reconcile_batch(batch, result, dry_run)
+            known.update(team.name for team in batch)
+            batch = []
+    if batch:
+        _reconcile_batch(batch, result, dry_run)
+        known.update(team.name for team in batch)
+
+    user_teams = (
+        User.objects.order_by().exclude(team__isnull=True).exclude(team='')
+        .values_list('team').annotate(count=Count('id'))
+    )
+    result['unknown_teams'] = {name: count for name, count in user_teams.iterator() if name not in known}
+    if result['updated'] and not dry_run:
+        caching.invalidate('teams')
+    return result
+
+
+def _reconcile_batch(teams, result, dry_run):
+    expected = {team.name: [] for team in teams}
+    users = User.objects.filter(team__in=list(expected)).order_by('email').values_list('team', 'email')
+    for name, email in users.iterator():
+        expected[name].append(email)
+
+    changed = []
+    for team in teams:
+        members = expected[team.name]
+        listed = member_emails(team.members)
+        keep = set(members)
+        kept = [email for email in dict.fromkeys(listed) if email in keep]
+        already = set(kept)
+        added = [email for email in members if email not in already]
+        removed = [email for email in dict.fromkeys(listed) if email not in keep]
+        if kept + added == team.members:
+            result['unchanged'] += 1
+            continue
+        team.members = kept + added
+        changed.append(team)
+        result['updated'].append((team.name, added, removed))
+
+    if changed and not dry_run:
+        with transaction.atomic():
+            Team.objects.bulk_update(changed, ['members'])
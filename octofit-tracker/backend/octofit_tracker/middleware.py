@@ -0,0 +1,197 @@
+"""Async routing, response compression and opt-in per-request instrumentation.
+
+``AsyncRoutesMiddleware`` sends ASGI requests to the async read endpoints.
+``CompressionMiddleware`` gzips API payloads above a size threshold.
+``QueryInstrumentationMiddleware`` counts and times every database query
+through connection execute wrappers (so it works with ``DEBUG = False``),
+splits the rest of the request into view (serialization) and render time,
+and reports the result as a ``Server-Timing`` header plus one structured
+log line per request. Statements executed repeatedly with different
+parameters are flagged as N+1 suspects.
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+
+
+logger = logging.getLogger('octofit_tracker.requests')
+
+# Content types worth compressing: JSON responses and the streamed exports
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'text/csv')
+
+
+class AsyncRoutesMiddleware:
+    """
+    Resolves requests against ``ASYNC_URLCONF`` when the middleware chain
+    runs asynchronously (under ASGI), so the routes in
+    ``octofit_tracker.async_urls`` are served by coroutines. Under WSGI it
+    does nothing. It handles both modes natively, so it adds no thread
+    switch to async requests.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # Mark the instance as a coroutine function, as MiddlewareMixin does
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        request.urlconf = settings.ASYNC_URLCONF
+        return await self.get_response(request)
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    Gzips JSON, NDJSON and CSV responses of at least ``GZIP_MIN_BYTES``
+    (streamed exports always) for clients sending ``Accept-Encoding: gzip``.
+
+    Smaller bodies are not worth the CPU time; other content types are left
+    to the web server.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.min_bytes = getattr(settings, 'GZIP_MIN_BYTES', 1024)
+
+    def process_response(self, request, response):
+        content_type = response.get('Content-Type', '').split(';')[0].strip()
+        if content_type not in COMPRESSIBLE_TYPES:
+            return response
+        # Whether the body is compressed depends on its size, so caches must
+        # key every response of these types on Accept-Encoding.
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if not response.streaming and len(response.content) < self.min_bytes:
+            return response
+        return super().process_response(request, response)
+
+    async def __acall__(self, request):
+        # Compression only touches the response, so under ASGI run it on the
+        # event loop instead of switching to a worker thread per request
+        return self.process_response(request, await self.get_response(request))
+
+
+class RequestMetrics:
+    """Timings and query statistics collected for one request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.statements = Counter()
+        self.viewset = None
+        self.action = None
+        self.view_started = None
+        self.view_db_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self.render_started = None
+        self.render_seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        """Execute wrapper recording the duration of every statement"""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_seconds += time.perf_counter() - started
+            self.queries += 1
+            self.statements[sql] += 1
+
+    def repeated_statements(self, threshold):
+        return [
+            {'sql': sql, 'count': count}
+            for sql, count in self.statements.most_common()
+            if count >= threshold
+        ]
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Adds ``Server-Timing`` headers and a structured log line to responses.
+
+    Enabled by listing it in ``MIDDLEWARE`` (see ``REQUEST_INSTRUMENTATION``
+    in settings); it should come first so its totals cover the other
+    middleware too.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.repeat_threshold = getattr(settings, 'REQUEST_INSTRUMENTATION_REPEAT_THRESHOLD', 5)
+
+    def __call__(self, request):
+        metrics = request._instrumentation = RequestMetrics()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(metrics))
+            response = self.get_response(request)
+        self.report(request, response, metrics)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = request._instrumentation
+        viewset = getattr(view_func, 'cls', None)
+        if viewset is not None:
+            metrics.viewset = viewset.__name__
+            actions = getattr(view_func, 'actions', None) or {}
+            metrics.action = actions.get(request.method.lower())
+        metrics.view_started = time.perf_counter()
+        metrics.view_db_seconds = metrics.db_seconds
+
+    def process_template_response(self, request, response):
+        # Called after the view returns and just before DRF renders the
+        # response. Time spent in the view outside the database is
+        # dominated by serializer work.
+        metrics = request._instrumentation
+        now = time.perf_counter()
+        if metrics.view_started is not None:
+            view_db = metrics.db_seconds - metrics.view_db_seconds
+            metrics.serialize_seconds = max(now - metrics.view_started - view_db, 0.0)
+        metrics.render_started = now
+        response.add_post_render_callback(self.rendered(metrics))
+        return response
+
+    @staticmethod
+    def rendered(metrics):
+        def callback(response):
+            metrics.render_seconds = time.perf_counter() - metrics.render_started
+        return callback
+
+    def report(self, request, response, metrics):
+        total = time.perf_counter() - metrics.started
+        repeated = metrics.repeated_statements(self.repeat_threshold)
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={metrics.db_seconds * 1000:.2f};desc="{metrics.queries} queries"',
+            f'serialize;dur={metrics.serialize_seconds * 1000:.2f}',
+            f'render;dur={metrics.render_seconds * 1000:.2f}',
+            f'total;dur={total * 1000:.2f}',
+        ])
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'viewset': metrics.viewset,
+            'action': metrics.action,
+            'queries': metrics.queries,
+            'db_ms': round(metrics.db_seconds * 1000, 2),
+            'serialize_ms': round(metrics.serialize_seconds * 1000, 2),
+            'render_ms': round(metrics.render_seconds * 1000, 2),
+            'total_ms': round(total * 1000, 2),
+            'n_plus_one_suspects': repeated,
+        }
+        level = logging.WARNING if repeated else logging.INFO
+        logger.log(level, json.dumps(record), extra={'instrumentation': record})
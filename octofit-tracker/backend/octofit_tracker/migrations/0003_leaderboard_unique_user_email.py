@@ -0,0 +1,18 @@
+# Generated by Django 4.1.7 on 2026-10-18 18:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('octofit_tracker', '0002_coach'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='leaderboard',
+            name='user_email',
+            field=models.EmailField(max_length=254, unique=True),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.1.7 on 2026-10-18 18:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('octofit_tracker', '0004_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyActivityRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_email', models.EmailField(max_length=254)),
+                ('day', models.DateField()),
+                ('total_activities', models.IntegerField(default=0)),
+                ('total_calories', models.IntegerField(default=0)),
+                ('total_duration', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'daily_activity_rollups',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='dailyactivityrollup',
+            index=models.Index(fields=['day', 'user_email'], name='rollup_day_user_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyactivityrollup',
+            constraint=models.UniqueConstraint(fields=('user_email', 'day'), name='rollup_user_day_unique'),
+        ),
+    ]
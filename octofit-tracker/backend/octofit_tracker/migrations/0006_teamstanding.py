@@ -0,0 +1,39 @@
+# Generated by Django 4.1.7 on 2026-10-18 18:11
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('octofit_tracker', '0005_dailyactivityrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TeamStanding',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('team', models.CharField(max_length=200, unique=True)),
+                ('member_count', models.IntegerField(default=0)),
+                ('total_activities', models.IntegerField(default=0)),
+                ('total_calories', models.IntegerField(default=0)),
+                ('total_duration', models.IntegerField(default=0)),
+                ('rank', models.IntegerField(blank=True, null=True)),
+                ('last_updated', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'team_standings',
+                'ordering': ['rank'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='teamstanding',
+            index=models.Index(fields=['rank'], name='team_standing_rank_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='teamstanding',
+            index=models.Index(fields=['-total_calories', 'id'], name='team_standing_calories_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.1.7 on 2026-10-18 18:22
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('octofit_tracker', '0007_searchtoken'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkoutRecommendation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_email', models.EmailField(max_length=254)),
+                ('workout_id', models.BigIntegerField()),
+                ('rank', models.IntegerField()),
+                ('score', models.FloatField()),
+                ('computed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'workout_recommendations',
+                'ordering': ['user_email', 'rank'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='workoutrecommendation',
+            constraint=models.UniqueConstraint(fields=('user_email', 'rank'), name='recommendation_user_rank_unique'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.1.7 on 2026-10-18 18:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('octofit_tracker', '0008_workoutrecommendation'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='leaderboard',
+            name='leaderboard_rank_idx',
+        ),
+        migrations.AddIndex(
+            model_name='leaderboard',
+            index=models.Index(fields=['rank', 'id'], name='leaderboard_rank_id_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.1.7 on 2026-10-18 18:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('octofit_tracker', '0009_leaderboard_rank_id_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='leaderboard',
+            index=models.Index(fields=['last_updated'], name='leaderboard_updated_idx'),
+        ),
+    ]
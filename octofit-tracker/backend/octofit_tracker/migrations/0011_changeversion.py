@@ -0,0 +1,37 @@
+# Generated by Django 4.1.7 on 2026-10-18 18:49
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+# Namespaces read by the API; recorded as changed when the table is created
+# because earlier writes were only tracked in each process's cache
+NAMESPACES = ['activities', 'coaches', 'leaderboard', 'recommendations', 'teams', 'users', 'workouts']
+
+
+def seed_namespaces(apps, schema_editor):
+    ChangeVersion = apps.get_model('octofit_tracker', 'ChangeVersion')
+    ChangeVersion.objects.bulk_create([ChangeVersion(namespace=namespace) for namespace in NAMESPACES])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('octofit_tracker', '0010_leaderboard_updated_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('namespace', models.CharField(max_length=50, unique=True)),
+                ('version', models.BigIntegerField(default=0)),
+                ('modified', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'change_versions',
+            },
+        ),
+        migrations.RunPython(seed_namespaces, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1.7 on 2026-10-18 18:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('octofit_tracker', '0011_changeversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='workoutrecommendation',
+            name='catalog_version',
+            field=models.BigIntegerField(null=True),
+        ),
+    ]
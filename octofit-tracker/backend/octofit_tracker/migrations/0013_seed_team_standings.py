@@ -0,0 +1,41 @@
+from django.db import migrations
+from django.db.models import Count, Sum
+
+
+def seed_team_standings(apps, schema_editor):
+    # Teams without activity had no standing until standings were rebuilt.
+    # Seed them as leaderboard.compute_team_standings would, from the
+    # LeaderBoard table; they are ranked on the next re-rank
+    Team = apps.get_model('octofit_tracker', 'Team')
+    LeaderBoard = apps.get_model('octofit_tracker', 'LeaderBoard')
+    TeamStanding = apps.get_model('octofit_tracker', 'TeamStanding')
+    standings = {name: {} for name in Team.objects.values_list('name', flat=True).iterator() if name}
+    totals = (
+        LeaderBoard.objects.order_by()
+        .exclude(team='')
+        .values('team')
+        .annotate(
+            member_count=Count('id'),
+            total_activities=Sum('total_activities'),
+            total_calories=Sum('total_calories'),
+            total_duration=Sum('total_duration'),
+        )
+    )
+    for row in totals.iterator():
+        team = row.pop('team')
+        standings[team] = {field: value or 0 for field, value in row.items()}
+    TeamStanding.objects.bulk_create(
+        [TeamStanding(team=team, **fields) for team, fields in standings.items()],
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('octofit_tracker', '0012_workoutrecommendation_catalog_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_team_standings, migrations.RunPython.noop),
+    ]
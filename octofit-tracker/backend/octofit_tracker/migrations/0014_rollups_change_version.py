@@ -0,0 +1,18 @@
+from django.db import migrations
+
+
+def seed_namespace(apps, schema_editor):
+    # Windowed leaderboards are validated on the rollups' own change version
+    ChangeVersion = apps.get_model('octofit_tracker', 'ChangeVersion')
+    ChangeVersion.objects.bulk_create([ChangeVersion(namespace='rollups')], ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('octofit_tracker', '0013_seed_team_standings'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_namespace, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+from django.db import migrations
+
+from octofit_tracker import search
+
+
+BATCH_SIZE = 1000
+
+
+def backfill_search_tokens(apps, schema_editor):
+    # Objects written before the token index existed (0007) are not found
+    # by ?search= until indexed. Kinds that already have tokens were indexed
+    # by rebuild_search_index and are left alone
+    SearchToken = apps.get_model('octofit_tracker', 'SearchToken')
+    for indexed, fields in search.INDEXED_FIELDS.items():
+        kind = search.kind(indexed)
+        if SearchToken.objects.filter(kind=kind).exists():
+            continue
+        model = apps.get_model('octofit_tracker', indexed.__name__)
+        batch = []
+        for row in model.objects.order_by().values('id', *fields).iterator(chunk_size=BATCH_SIZE):
+            batch.extend(
+                SearchToken(kind=kind, object_id=row['id'], token=token, weight=weight)
+                for token, weight in search.object_tokens(indexed, row).items()
+            )
+            if len(batch) >= BATCH_SIZE:
+                SearchToken.objects.bulk_create(batch)
+                batch = []
+        SearchToken.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('octofit_tracker', '0014_rollups_change_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_search_tokens, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+from itertools import islice
+
+from django.db import migrations
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+BATCH_SIZE = 1000
+
+
+def backfill_rollups(apps, schema_editor):
+    # Activities logged before 0005 are missing from the windowed
+    # leaderboards until rolled up, as rebuild_rollups does. A table that
+    # already holds rollups was backfilled by that command and is left alone
+    Activity = apps.get_model('octofit_tracker', 'Activity')
+    DailyActivityRollup = apps.get_model('octofit_tracker', 'DailyActivityRollup')
+    if DailyActivityRollup.objects.exists():
+        return
+    rows = (
+        Activity.objects.order_by()
+        .annotate(day=TruncDate('date'))
+        .values('user_email', 'day')
+        .annotate(
+            total_activities=Count('id'),
+            total_calories=Sum('calories'),
+            total_duration=Sum('duration'),
+        )
+        .iterator()
+    )
+    while True:
+        batch = [DailyActivityRollup(**row) for row in islice(rows, BATCH_SIZE)]
+        if not batch:
+            break
+        DailyActivityRollup.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('octofit_tracker', '0015_backfill_search_tokens'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 
 
@@ -12,6 +12,9 @@ class User(models.Model):
     
     class Meta:
         db_table = 'users'
+        indexes = [
+            models.Index(fields=['team'], name='user_team_idx'),
+        ]
     
     def __str__(self):
         return self.name
@@ -45,14 +48,27 @@ class Activity(models.Model):
     class Meta:
         db_table = 'activities'
         ordering = ['-date']
+        indexes = [
+            models.Index(fields=['-date', 'id'], name='activity_date_idx'),
+            models.Index(fields=['user_email', '-date'], name='activity_user_date_idx'),
+            models.Index(fields=['activity_type', '-date'], name='activity_type_date_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user_name} - {self.activity_type}"
+    
+    def save(self, *args, **kwargs):
+        # The leaderboard receivers lock and read the stored row before the
+        # write and apply the difference after it; one transaction keeps
+        # concurrent edits of the activity from interleaving with the delta.
+        # Deletes already run their signals inside the collector's transaction.
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
 
 
 class LeaderBoard(models.Model):
     """Model for leaderboard entries"""
-    user_email = models.EmailField()
+    user_email = models.EmailField(unique=True)
     user_name = models.CharField(max_length=200)
     team = models.CharField(max_length=200)
     total_activities = models.IntegerField(default=0)
@@ -64,11 +80,62 @@ class LeaderBoard(models.Model):
     class Meta:
         db_table = 'leaderboard'
         ordering = ['-total_calories']
+        indexes = [
+            # id breaks rank ties, so neighbours of an entry are range seeks
+            models.Index(fields=['rank', 'id'], name='leaderboard_rank_id_idx'),
+            models.Index(fields=['team', 'rank'], name='leaderboard_team_rank_idx'),
+            models.Index(fields=['-total_calories', 'id'], name='leaderboard_calories_idx'),
+            # The leaderboard stream polls for entries updated since its last tick
+            models.Index(fields=['last_updated'], name='leaderboard_updated_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user_name} - {self.total_calories} calories"
 
 
+class TeamStanding(models.Model):
+    """Model for per-team leaderboard aggregates"""
+    team = models.CharField(max_length=200, unique=True)
+    member_count = models.IntegerField(default=0)
+    total_activities = models.IntegerField(default=0)
+    total_calories = models.IntegerField(default=0)
+    total_duration = models.IntegerField(default=0)  # in minutes
+    rank = models.IntegerField(null=True, blank=True)
+    last_updated = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        db_table = 'team_standings'
+        ordering = ['rank']
+        indexes = [
+            models.Index(fields=['rank'], name='team_standing_rank_idx'),
+            models.Index(fields=['-total_calories', 'id'], name='team_standing_calories_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.team} - {self.total_calories} calories"
+
+
+class DailyActivityRollup(models.Model):
+    """Model for per-user daily activity totals backing windowed leaderboards"""
+    user_email = models.EmailField()
+    day = models.DateField()
+    total_activities = models.IntegerField(default=0)
+    total_calories = models.IntegerField(default=0)
+    total_duration = models.IntegerField(default=0)  # in minutes
+    
+    class Meta:
+        db_table = 'daily_activity_rollups'
+        constraints = [
+            models.UniqueConstraint(fields=['user_email', 'day'], name='rollup_user_day_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['day', 'user_email'], name='rollup_day_user_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_email} - {self.day}"
+
+
 class Workout(models.Model):
     """Model for personalized workout suggestions"""
     title = models.CharField(max_length=200)
@@ -83,11 +150,37 @@ class Workout(models.Model):
     
     class Meta:
         db_table = 'workouts'
+        indexes = [
+            models.Index(fields=['difficulty'], name='workout_difficulty_idx'),
+            models.Index(fields=['activity_type'], name='workout_type_idx'),
+        ]
     
     def __str__(self):
         return self.title
 
 
+class WorkoutRecommendation(models.Model):
+    """Model for precomputed per-user workout recommendations"""
+    user_email = models.EmailField()
+    workout_id = models.BigIntegerField()
+    rank = models.IntegerField()
+    score = models.FloatField()
+    computed_at = models.DateTimeField(default=timezone.now)
+    # Workouts change version the score was computed against (None for rows
+    # stored before versions were recorded, which are never served)
+    catalog_version = models.BigIntegerField(null=True)
+    
+    class Meta:
+        db_table = 'workout_recommendations'
+        ordering = ['user_email', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['user_email', 'rank'], name='recommendation_user_rank_unique'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_email} - #{self.rank} workout {self.workout_id}"
+
+
 class Coach(models.Model):
     """Model for fitness coaches"""
     name = models.CharField(max_length=200)
@@ -103,3 +196,41 @@ class Coach(models.Model):
     
     def __str__(self):
         return self.name
+
+
+class SearchToken(models.Model):
+    """Model for inverted search index entries (one per object and token)"""
+    kind = models.CharField(max_length=50)  # model name of the indexed object
+    object_id = models.BigIntegerField()
+    token = models.CharField(max_length=50)
+    weight = models.IntegerField(default=1)
+    
+    class Meta:
+        db_table = 'search_tokens'
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'token', 'object_id'], name='search_token_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['kind', 'object_id'], name='search_token_object_idx'),
+            # Prefix searches; the operator classes apply on PostgreSQL only
+            models.Index(
+                fields=['kind', 'token'], name='search_token_prefix_idx',
+                opclasses=['varchar_pattern_ops', 'varchar_pattern_ops'],
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.kind} {self.object_id} - {self.token}"
+
+
+class ChangeVersion(models.Model):
+    """Model for per-namespace write counters behind response validators"""
+    namespace = models.CharField(max_length=50, unique=True)
+    version = models.BigIntegerField(default=0)
+    modified = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        db_table = 'change_versions'
+    
+    def __str__(self):
+        return f"{self.namespace} v{self.version}"
@@ -0,0 +1,47 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+from rest_framework.settings import api_settings
+
+from .search import RANK
+
+
+class ActivityCursorPagination(CursorPagination):
+    """
+    Keyset pagination for activities, newest first.
+
+    Pages are addressed by opaque cursors encoding the last seen ``date``
+    instead of an OFFSET, so deep pages cost the same as the first one.
+    ``id`` breaks ties between activities logged at the same instant.
+    """
+    ordering = ('-date', 'id')
+    page_size = settings.ACTIVITY_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.ACTIVITY_MAX_PAGE_SIZE
+
+    def get_ordering(self, request, queryset, view):
+        # Searches are listed by relevance unless an ordering is requested
+        if RANK in queryset.query.annotations and not request.query_params.get(api_settings.ORDERING_PARAM):
+            return (f'-{RANK}', 'id')
+        return super().get_ordering(request, queryset, view)
+
+    def paginate_first_page(self, queryset, request, view=None):
+        """
+        ``paginate_queryset`` for requests without a cursor, as used by the
+        async read views. ``queryset`` rows must include the ordering
+        columns.
+        """
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = None
+
+        # Fetch one extra row to learn whether a next page exists
+        results = list(queryset.order_by(*self.ordering)[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        self.has_next = len(results) > len(self.page)
+        self.has_previous = False
+        if self.has_next:
+            self.next_position = self._get_position_from_instance(results[-1], self.ordering)
+            if self.template is not None:
+                self.display_page_controls = True
+        return self.page
@@ -0,0 +1,174 @@
+"""Leaderboard rank maintenance off the request path.
+
+Activity writes update totals by delta but no longer re-rank inline:
+they call ``mark_dirty``, and with ``RANK_WORKER_MODE = 'background'`` a
+daemon thread in each process turns the dirty signals committed since its
+last run into one ``leaderboard.assign_ranks`` call (which rewrites only
+the rows whose rank changed), at most once per
+``RANK_WORKER_INTERVAL_SECONDS``. Write latency no longer grows with the
+size of the leaderboard; ranks lag totals by up to about one interval.
+
+With ``RANK_WORKER_MODE = 'sync'`` (the default outside the production
+profile, so tests and local development see ranks right after writes)
+``mark_dirty`` re-ranks immediately in the caller's transaction.
+
+Worker re-ranks lock a sentinel row first (``assign_ranks_locked``), so
+runs in different processes take turns: each reads the totals after the
+previous run committed, and a run that read older totals can never
+overwrite the ranks of a later one.
+
+``stats`` reports how stale the ranks are and how long the last run took.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from . import leaderboard
+from .models import ChangeVersion
+
+
+logger = logging.getLogger('octofit_tracker.ranking')
+
+# change_versions row whose lock serializes re-ranks across processes
+LOCK_NAMESPACE = 'leaderboard-ranks'
+
+
+def assign_ranks_locked():
+    """
+    Run ``leaderboard.assign_ranks`` in a transaction holding the re-rank
+    lock, from reading the totals until the new ranks are committed
+    """
+    with transaction.atomic():
+        ChangeVersion.objects.select_for_update().get_or_create(namespace=LOCK_NAMESPACE)
+        return leaderboard.assign_ranks()
+
+
+class RankWorker:
+    """Daemon thread coalescing dirty signals into periodic re-ranks"""
+
+    def __init__(self):
+        self.signals = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+        # Monotonic time of the oldest signal not yet covered by a run
+        self.dirty_since = None
+        self.received = 0
+        self.runs = 0
+        self.rows_updated = 0
+        self.last_run_at = None
+        self.last_duration = None
+        self.last_error = None
+
+    def signal(self):
+        """Record that ranks are dirty and wake the thread"""
+        with self.lock:
+            self.received += 1
+            if self.dirty_since is None:
+                self.dirty_since = time.monotonic()
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name='rank-worker', daemon=True)
+                self.thread.start()
+        self.signals.put(None)
+
+    def run(self):
+        last_run = 0.0
+        while True:
+            self.signals.get()
+            # Signals arriving until the interval has passed share this run
+            time.sleep(max(0.0, last_run + settings.RANK_WORKER_INTERVAL_SECONDS - time.monotonic()))
+            self.drain()
+            last_run = time.monotonic()
+            close_old_connections()
+            try:
+                self.recompute()
+            finally:
+                close_old_connections()
+
+    def drain(self):
+        while True:
+            try:
+                self.signals.get_nowait()
+            except queue.Empty:
+                return
+
+    def recompute(self):
+        """Re-rank now, covering every signal received before the call"""
+        with self.lock:
+            covered = self.received
+        started = time.monotonic()
+        try:
+            updated = assign_ranks_locked()
+        except Exception as exc:
+            logger.exception('Leaderboard re-rank failed')
+            with self.lock:
+                self.last_error = repr(exc)
+            # Retry on the next interval
+            self.signals.put(None)
+            return
+        finished = time.monotonic()
+        with self.lock:
+            self.runs += 1
+            self.rows_updated += updated
+            self.last_run_at = time.time()
+            self.last_duration = finished - started
+            self.last_error = None
+            if self.received == covered:
+                self.dirty_since = None
+            else:
+                # Signals received during the run may have missed it
+                self.dirty_since = started
+
+    def flush(self):
+        """Re-rank in the calling thread if any signal is still pending"""
+        with self.lock:
+            dirty = self.dirty_since is not None
+        if dirty:
+            self.drain()
+            self.recompute()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'mode': settings.RANK_WORKER_MODE,
+                'interval_seconds': settings.RANK_WORKER_INTERVAL_SECONDS,
+                'dirty': self.dirty_since is not None,
+                'stale_seconds': (
+                    round(time.monotonic() - self.dirty_since, 3) if self.dirty_since is not None else 0.0
+                ),
+                'signals': self.received,
+                'runs': self.runs,
+                'rows_updated': self.rows_updated,
+                'last_run_at': self.last_run_at,
+                'last_duration_ms': (
+                    round(self.last_duration * 1000, 3) if self.last_duration is not None else None
+                ),
+                'last_error': self.last_error,
+            }
+
+
+worker = RankWorker()
+
+
+def mark_dirty():
+    """
+    Re-rank the leaderboard after totals changed: queued for the worker
+    once the current transaction commits, or inline in 'sync' mode
+    """
+    if settings.RANK_WORKER_MODE == 'sync':
+        leaderboard.assign_ranks()
+    else:
+        transaction.on_commit(worker.signal)
+
+
+def stats():
+    """Staleness and timing of rank maintenance in this process"""
+    return worker.stats()
+
+
+# Don't leave ranks stale when a process exits with a run pending
+atexit.register(worker.flush)
@@ -0,0 +1,221 @@
+"""Personalized workout recommendations.
+
+Every workout in the catalog becomes a feature row: a one-hot activity
+type plus its duration (hours), calorie rate (kcal per minute) and
+difficulty (0 for beginner to 1 for advanced). A user's recent activities
+give a matching profile: the share of sessions per activity type, typical
+session length, calorie rate and a difficulty inferred from training
+frequency and intensity. A workout scores its type's share of the user's
+history minus the weighted distance between the numeric features, so one
+user is scored against the whole catalog with a single matrix expression
+and a batch of users with one broadcast.
+
+The catalog matrix is built once per workouts change version (read from
+the database, so edits made by any process are picked up) and kept in
+process memory. ``rebuild_recommendations`` (run nightly by the
+``recommend_workouts`` command) stores the top workouts of every user in
+``WorkoutRecommendation``, tagged with the catalog version they were
+scored against, for the API to serve without scoring while the catalog
+is unchanged.
+
+NumPy is required for scoring; without it ``available()`` is False and
+the API answers 503.
+"""
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .models import User, Activity, Workout, WorkoutRecommendation
+from .serializers import WorkoutSerializer
+from . import caching
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+DIFFICULTY_LEVELS = {'beginner': 0.0, 'intermediate': 0.5, 'advanced': 1.0}
+
+# Penalty per unit of distance in duration (hours), calorie rate (kcal per
+# minute) and difficulty; the activity type share contributes up to 1.
+NUMERIC_WEIGHTS = (0.5, 0.1, 0.5)
+
+# Profile of a user without recent activities: short, easy sessions
+DEFAULT_PROFILE = (0.5, 6.0, 0.0)
+
+# Sessions per week and kcal per minute treated as fully advanced
+ADVANCED_SESSIONS_PER_WEEK = 5
+ADVANCED_CALORIE_RATE = 12
+BASE_CALORIE_RATE = 4
+
+_catalog_lock = threading.Lock()
+_catalog = None
+
+
+def available():
+    return np is not None
+
+
+class Catalog:
+    """Feature matrices and serialized rows of the workout catalog"""
+
+    def __init__(self, version, workouts):
+        self.version = version
+        self.ids = [workout['id'] for workout in workouts]
+        self.rows = {workout['id']: workout for workout in workouts}
+        self.types = sorted({workout['activity_type'] for workout in workouts})
+        type_index = {name: index for index, name in enumerate(self.types)}
+        self.type_matrix = np.zeros((len(workouts), len(self.types)))
+        self.numeric = np.zeros((len(workouts), len(NUMERIC_WEIGHTS)))
+        for row, workout in enumerate(workouts):
+            self.type_matrix[row, type_index[workout['activity_type']]] = 1.0
+            duration = max(workout['duration'], 1)
+            self.numeric[row] = (
+                duration / 60,
+                workout['calories_estimate'] / duration,
+                DIFFICULTY_LEVELS.get(workout['difficulty'].lower(), 0.5),
+            )
+        self.weights = np.array(NUMERIC_WEIGHTS)
+
+    def score(self, mix, numeric):
+        """Score every workout for one profile; returns a vector"""
+        return self.type_matrix @ mix - np.abs(self.numeric - numeric) @ self.weights
+
+    def score_many(self, mixes, numerics):
+        """Score every workout for a batch of profiles; returns users x workouts"""
+        distances = np.abs(numerics[:, None, :] - self.numeric[None, :, :]) @ self.weights
+        return mixes @ self.type_matrix.T - distances
+
+    def top(self, scores, limit):
+        """Return ``(workout id, score)`` pairs of the best scores, ties by id"""
+        order = np.argsort(-scores, kind='stable')[:limit]
+        return [(self.ids[index], float(scores[index])) for index in order]
+
+
+def catalog():
+    """Return the catalog for the current workouts version, rebuilding it if needed"""
+    global _catalog
+    version = caching.versions(['workouts'])[0]
+    current = _catalog
+    if current is not None and current.version == version:
+        return current
+    with _catalog_lock:
+        if _catalog is None or _catalog.version != version:
+            workouts = WorkoutSerializer(Workout.objects.order_by('id'), many=True).data
+            _catalog = Catalog(version, [dict(workout) for workout in workouts])
+        return _catalog
+
+
+def history_since():
+    return timezone.now() - timedelta(days=settings.RECOMMENDATION_HISTORY_DAYS)
+
+
+def history(emails):
+    """
+    Return ``{email: {activity_type: (sessions, minutes, calories)}}`` for
+    the recent activities of ``emails`` with one grouped query.
+    """
+    rows = (
+        Activity.objects.order_by()
+        .filter(user_email__in=emails, date__gte=history_since())
+        .values_list('user_email', 'activity_type')
+        .annotate(Count('id'), Sum('duration'), Sum('calories'))
+    )
+    result = {}
+    for email, activity_type, sessions, minutes, calories in rows:
+        result.setdefault(email, {})[activity_type] = (sessions, minutes or 0, calories or 0)
+    return result
+
+
+def profile(catalog, by_type):
+    """Return ``(mix, numeric)`` feature vectors for one user's history"""
+    mix = np.zeros(len(catalog.types))
+    sessions = sum(values[0] for values in by_type.values())
+    if not sessions:
+        return mix, np.array(DEFAULT_PROFILE)
+    minutes = sum(values[1] for values in by_type.values())
+    calories = sum(values[2] for values in by_type.values())
+    for index, activity_type in enumerate(catalog.types):
+        mix[index] = by_type.get(activity_type, (0,))[0] / sessions
+    rate = calories / max(minutes, 1)
+    per_week = sessions / (settings.RECOMMENDATION_HISTORY_DAYS / 7)
+    difficulty = (
+        0.5 * min(per_week / ADVANCED_SESSIONS_PER_WEEK, 1)
+        + 0.5 * min(max((rate - BASE_CALORIE_RATE) / (ADVANCED_CALORIE_RATE - BASE_CALORIE_RATE), 0), 1)
+    )
+    return mix, np.array((minutes / sessions / 60, rate, difficulty))
+
+
+def recommend(email, limit):
+    """
+    Return ``(computed_at, [(workout row, score)])`` for a user, served from
+    the precomputed table when it was scored against the current catalog
+    version and holds enough rows, and scored live otherwise.
+    """
+    current = catalog()
+    stored = list(
+        WorkoutRecommendation.objects.filter(user_email=email).order_by('rank')
+        .values_list('workout_id', 'score', 'computed_at', 'catalog_version')[:limit]
+    )
+    if stored and stored[0][3] == current.version and (
+        len(stored) == limit or len(stored) == len(current.ids)
+    ) and all(workout_id in current.rows for workout_id, _, _, _ in stored):
+        return stored[0][2], [(current.rows[workout_id], score) for workout_id, score, _, _ in stored]
+
+    if not current.ids:
+        return timezone.now(), []
+    mix, numeric = profile(current, history([email]).get(email, {}))
+    ranked = current.top(current.score(mix, numeric), limit)
+    return timezone.now(), [(current.rows[workout_id], score) for workout_id, score in ranked]
+
+
+def rebuild_recommendations(limit=10, batch_size=1000):
+    """
+    Score every user against the catalog and replace the stored
+    recommendations. Returns the number of users scored.
+    """
+    current = catalog()
+    now = timezone.now()
+    scored = 0
+    with transaction.atomic():
+        WorkoutRecommendation.objects.all().delete()
+        emails = User.objects.order_by('id').values_list('email', flat=True)
+        batch = []
+        for email in emails.iterator(chunk_size=batch_size):
+            batch.append(email)
+            if len(batch) >= batch_size:
+                _write_batch(current, batch, limit, now)
+                scored += len(batch)
+                batch = []
+        if batch:
+            _write_batch(current, batch, limit, now)
+            scored += len(batch)
+        caching.invalidate('recommendations')
+    return scored
+
+
+def _write_batch(current, emails, limit, now):
+    if not current.ids:
+        return
+    recent = history(emails)
+    profiles = [profile(current, recent.get(email, {})) for email in emails]
+    scores = current.score_many(
+        np.array([mix for mix, _ in profiles]).reshape(len(emails), len(current.types)),
+        np.array([numeric for _, numeric in profiles]),
+    )
+    WorkoutRecommendation.objects.bulk_create(
+        [
+            WorkoutRecommendation(
+                user_email=email, workout_id=workout_id, rank=rank,
+                score=score, computed_at=now, catalog_version=current.version,
+            )
+            for email, user_scores in zip(emails, scores)
+            for rank, (workout_id, score) in enumerate(current.top(user_scores, limit), start=1)
+        ],
+        batch_size=1000,
+    )
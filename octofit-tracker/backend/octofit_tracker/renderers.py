@@ -0,0 +1,49 @@
+"""JSON rendering through orjson when it is installed.
+
+``FastJSONRenderer`` is a drop-in replacement for DRF's ``JSONRenderer``:
+with orjson available it encodes compact UTF-8 JSON natively and hands
+every value orjson would format differently (datetimes, dates, times,
+decimals, lazy strings, querysets) to DRF's own encoder, so the output
+matches the stock renderer's. Without orjson, or when the request asks
+for indented output or the DRF JSON settings differ from the defaults, it
+renders exactly like ``JSONRenderer``.
+
+orjson writes NaN and infinity as ``null`` where the stdlib renderer
+raises; serializers in this project never produce them.
+"""
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Characters valid in JSON but not in JavaScript source; escaped like the
+# stdlib renderer does
+LINE_SEPARATOR = '\u2028'.encode()
+PARAGRAPH_SEPARATOR = '\u2029'.encode()
+
+if orjson is not None:
+    ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer that encodes with orjson when possible"""
+
+    def uses_orjson(self, accepted_media_type, renderer_context):
+        return (
+            orjson is not None
+            and self.compact
+            and not self.ensure_ascii
+            and self.get_indent(accepted_media_type, renderer_context or {}) is None
+        )
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None or not self.uses_orjson(accepted_media_type, renderer_context):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        ret = orjson.dumps(data, default=self.encoder_class().default, option=ORJSON_OPTIONS)
+        if LINE_SEPARATOR in ret or PARAGRAPH_SEPARATOR in ret:
+            ret = ret.replace(LINE_SEPARATOR, b'\\u2028').replace(PARAGRAPH_SEPARATOR, b'\\u2029')
+        return ret
@@ -0,0 +1,173 @@
+"""Inverted token index behind ``?search=`` on activities and workouts.
+
+Text fields are split into lowercase, accent-folded tokens and stored as
+one ``SearchToken`` row per (object, token) with a weight summed from the
+fields the token appears in. A search matches objects holding, for every
+query term, a token starting with that term; the prefix lookup on
+``(kind, token)`` is served by an index instead of scanning every row (on
+PostgreSQL one with ``varchar_pattern_ops``, which ``LIKE 'term%'`` can use
+under any collation). Results are ranked by the summed weights of the matched tokens, with
+exact token matches counting double.
+
+Signal handlers keep the index current on save and delete;
+``rebuild_search_index`` recomputes it from scratch.
+"""
+import re
+import unicodedata
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Max, OuterRef, Q, Subquery, Sum, Value, When
+from rest_framework import filters
+
+from .models import Activity, Workout, SearchToken
+
+
+# Indexed models -> {field: weight}
+INDEXED_FIELDS = {
+    Activity: {'activity_type': 3, 'user_name': 2, 'user_email': 2, 'notes': 1},
+    Workout: {'title': 3, 'activity_type': 2, 'difficulty': 2, 'description': 1},
+}
+
+MAX_TOKEN_LENGTH = SearchToken._meta.get_field('token').max_length
+MAX_QUERY_TERMS = 8
+
+# Annotation holding the relevance of each search result
+RANK = 'search_rank'
+
+_TOKEN_RE = re.compile(r'[^\W_]+')
+
+
+def tokenize(text):
+    """Split text into lowercase tokens with accents removed"""
+    if not text:
+        return []
+    folded = unicodedata.normalize('NFKD', str(text).lower())
+    folded = ''.join(char for char in folded if not unicodedata.combining(char))
+    return [token[:MAX_TOKEN_LENGTH] for token in _TOKEN_RE.findall(folded)]
+
+
+def kind(model):
+    return model._meta.model_name
+
+
+def is_indexed(model):
+    return model in INDEXED_FIELDS
+
+
+def object_tokens(model, values):
+    """Return ``{token: weight}`` for one object's field values"""
+    weights = Counter()
+    for field, weight in INDEXED_FIELDS[model].items():
+        for token in tokenize(values.get(field)):
+            weights[token] += weight
+    return weights
+
+
+def _token_rows(model, rows):
+    for row in rows:
+        for token, weight in object_tokens(model, row).items():
+            yield SearchToken(kind=kind(model), object_id=row['id'], token=token, weight=weight)
+
+
+def index_objects(model, objects, batch_size=1000):
+    """Replace the index entries of saved ``objects`` of an indexed model"""
+    rows = [
+        {'id': obj.pk, **{field: getattr(obj, field) for field in INDEXED_FIELDS[model]}}
+        for obj in objects
+    ]
+    if not rows:
+        return
+    with transaction.atomic():
+        remove_objects(model, [row['id'] for row in rows], batch_size)
+        SearchToken.objects.bulk_create(_token_rows(model, rows), batch_size=batch_size)
+
+
+def remove_objects(model, ids, batch_size=1000):
+    """Delete the index entries of the given object ids"""
+    for start in range(0, len(ids), batch_size):
+        SearchToken.objects.filter(
+            kind=kind(model), object_id__in=ids[start:start + batch_size]
+        ).delete()
+
+
+def rebuild_index(model, batch_size=1000):
+    """Recompute the index of one model from its rows. Returns the token count."""
+    written = 0
+    with transaction.atomic():
+        SearchToken.objects.filter(kind=kind(model)).delete()
+        batch = []
+        rows = model.objects.order_by().values('id', *INDEXED_FIELDS[model]).iterator(chunk_size=batch_size)
+        for token in _token_rows(model, rows):
+            batch.append(token)
+            if len(batch) >= batch_size:
+                SearchToken.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        SearchToken.objects.bulk_create(batch)
+        written += len(batch)
+    return written
+
+
+def ranked_matches(model, query):
+    """
+    Return a ``values('object_id')`` queryset of objects matching every
+    term of ``query``, annotated with their relevance as ``search_rank``,
+    or None if the query holds no terms.
+    """
+    terms = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+    if not terms:
+        return None
+    conditions = [Q(token__startswith=term) for term in terms]
+    any_term = Q()
+    for condition in conditions:
+        any_term |= condition
+    matched = {
+        f'term_{index}': Max(Case(When(condition, then=Value(1)), default=Value(0)))
+        for index, condition in enumerate(conditions)
+    }
+    return (
+        SearchToken.objects.order_by()
+        .filter(any_term, kind=kind(model))
+        .values('object_id')
+        .annotate(
+            **matched,
+            **{RANK: Sum(Case(
+                When(token__in=terms, then=F('weight') * 2),
+                default=F('weight'),
+                output_field=IntegerField(),
+            ))},
+        )
+        .filter(**{name: 1 for name in matched})
+    )
+
+
+def search(queryset, query):
+    """
+    Narrow ``queryset`` of an indexed model to objects matching ``query``
+    and annotate their relevance as ``search_rank``.
+    """
+    matches = ranked_matches(queryset.model, query)
+    if matches is None:
+        return queryset
+    return queryset.filter(pk__in=matches.values('object_id')).annotate(**{
+        RANK: Subquery(matches.filter(object_id=OuterRef('pk')).values(RANK)[:1])
+    })
+
+
+class IndexedSearchFilter(filters.SearchFilter):
+    """
+    ``SearchFilter`` served from the token index for indexed models.
+
+    Results are ordered by relevance (then id) unless ``?ordering=`` is
+    given; models without an index fall back to ``SearchFilter``.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        if not is_indexed(queryset.model):
+            return super().filter_queryset(request, queryset, view)
+        query = ' '.join(self.get_search_terms(request))
+        searched = search(queryset, query)
+        if searched is queryset:
+            return queryset
+        return searched.order_by(f'-{RANK}', 'pk')
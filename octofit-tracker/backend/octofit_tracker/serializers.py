@@ -1,5 +1,8 @@
+from django.conf import settings
+from django.db import models
 from rest_framework import serializers
-from .models import User, Team, Activity, LeaderBoard, Workout, Coach
+from .models import User, Team, Activity, LeaderBoard, TeamStanding, Workout, Coach
+from . import members
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -13,12 +16,42 @@ class UserSerializer(serializers.ModelSerializer):
         }
 
 
+class TeamListSerializer(serializers.ListSerializer):
+    """Resolves the expanded members of every team in one batch"""
+    
+    def to_representation(self, data):
+        teams = list(data.all() if isinstance(data, models.Manager) else data)
+        if self.child.expands_members():
+            self.child.member_details = members.member_details(
+                email for team in teams for email in members.member_emails(team.members)
+            )
+        return super().to_representation(teams)
+
+
 class TeamSerializer(serializers.ModelSerializer):
-    """Serializer for Team model"""
+    """
+    Serializer for Team model. With ``'members'`` in the ``expand`` context
+    entry, member emails are replaced by the members' details.
+    """
+    member_details = None
     
     class Meta:
         model = Team
         fields = ['id', 'name', 'description', 'created_at', 'members']
+        list_serializer_class = TeamListSerializer
+    
+    def expands_members(self):
+        return 'members' in self.context.get('expand', ()) and 'members' in self.fields
+    
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if self.expands_members():
+            emails = members.member_emails(instance.members)
+            details = self.member_details
+            if details is None:
+                details = members.member_details(emails)
+            data['members'] = [details[email] for email in emails]
+        return data
 
 
 class ActivitySerializer(serializers.ModelSerializer):
@@ -28,6 +61,11 @@ class ActivitySerializer(serializers.ModelSerializer):
         model = Activity
         fields = ['id', 'user_email', 'user_name', 'activity_type', 'duration', 
                   'calories', 'distance', 'date', 'notes']
+        # Bounded so that leaderboard totals stay in range of the
+        # distribution index and the database column
+        extra_kwargs = {
+            'calories': {'min_value': 0, 'max_value': settings.ACTIVITY_MAX_CALORIES},
+        }
 
 
 class LeaderBoardSerializer(serializers.ModelSerializer):
@@ -39,6 +77,34 @@ class LeaderBoardSerializer(serializers.ModelSerializer):
                   'total_calories', 'total_duration', 'rank', 'last_updated']
 
 
+class TeamStandingSerializer(serializers.ModelSerializer):
+    """Serializer for TeamStanding model with per-member averages"""
+    average_activities = serializers.SerializerMethodField()
+    average_calories = serializers.SerializerMethodField()
+    average_duration = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = TeamStanding
+        fields = ['id', 'team', 'member_count', 'total_activities', 'total_calories',
+                  'total_duration', 'average_activities', 'average_calories',
+                  'average_duration', 'rank', 'last_updated']
+    
+    @staticmethod
+    def _average(standing, total):
+        if not standing.member_count:
+            return 0
+        return round(total / standing.member_count, 2)
+    
+    def get_average_activities(self, standing):
+        return self._average(standing, standing.total_activities)
+    
+    def get_average_calories(self, standing):
+        return self._average(standing, standing.total_calories)
+    
+    def get_average_duration(self, standing):
+        return self._average(standing, standing.total_duration)
+
+
 class WorkoutSerializer(serializers.ModelSerializer):
     """Serializer for Workout model"""
     
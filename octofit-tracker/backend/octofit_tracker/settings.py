@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/4.1/ref/settings/
 from pathlib import Path
 import os
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -20,14 +22,29 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/4.1/howto/deployment/checklist/
 
+# Settings profile: 'development' (the default) or 'production'. The
+# production profile turns DEBUG off, renders JSON only, keeps database
+# connections open between requests and caches compiled templates; the app
+# refuses to start in it while debug-only costs are enabled (see
+# octofit_tracker.checks).
+SETTINGS_PROFILE = os.environ.get('SETTINGS_PROFILE', 'development')
+if SETTINGS_PROFILE not in ('development', 'production'):
+    raise ImproperlyConfigured(f'Unknown SETTINGS_PROFILE {SETTINGS_PROFILE!r}')
+PRODUCTION = SETTINGS_PROFILE == 'production'
+
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = 'django-insecure-zwhww%1bae@_61$nh-3blv4b6*_ff75na2k3n*vls&cnorc-40'
+SECRET_KEY = os.environ.get(
+    'DJANGO_SECRET_KEY', 'django-insecure-zwhww%1bae@_61$nh-3blv4b6*_ff75na2k3n*vls&cnorc-40'
+)
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+# With DEBUG on, every connection keeps all executed SQL in memory.
+DEBUG = os.environ.get('DEBUG', '0' if PRODUCTION else '1') == '1'
 
-# Configure ALLOWED_HOSTS for codespace and localhost
+# Configure ALLOWED_HOSTS for codespace and localhost, plus any
+# comma-separated DJANGO_ALLOWED_HOSTS
 ALLOWED_HOSTS = ['localhost', '127.0.0.1', '0.0.0.0']
+ALLOWED_HOSTS += [host.strip() for host in os.environ.get('DJANGO_ALLOWED_HOSTS', '').split(',') if host.strip()]
 
 # Add codespace hostname if running in GitHub Codespaces
 CODESPACE_NAME = os.environ.get('CODESPACE_NAME')
@@ -61,13 +78,48 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Serve the hottest read routes from async views when running under ASGI
+# (see octofit_tracker.async_views); WSGI requests are not affected
+ASYNC_READ_ENDPOINTS = os.environ.get('ASYNC_READ_ENDPOINTS', '1') == '1'
+ASYNC_URLCONF = 'octofit_tracker.async_urls'
+if ASYNC_READ_ENDPOINTS:
+    MIDDLEWARE.append('octofit_tracker.middleware.AsyncRoutesMiddleware')
+
+# Gzip JSON/NDJSON/CSV responses of at least GZIP_MIN_BYTES
+RESPONSE_COMPRESSION = os.environ.get('RESPONSE_COMPRESSION', '1') == '1'
+GZIP_MIN_BYTES = int(os.environ.get('GZIP_MIN_BYTES', 1024))
+if RESPONSE_COMPRESSION:
+    MIDDLEWARE.insert(0, 'octofit_tracker.middleware.CompressionMiddleware')
+
+# Opt-in per-request query/serialize/render timings (Server-Timing header
+# and an "octofit_tracker.requests" log line per request)
+REQUEST_INSTRUMENTATION = os.environ.get('REQUEST_INSTRUMENTATION', '') == '1'
+REQUEST_INSTRUMENTATION_REPEAT_THRESHOLD = int(os.environ.get('REQUEST_INSTRUMENTATION_REPEAT_THRESHOLD', 5))
+if REQUEST_INSTRUMENTATION:
+    MIDDLEWARE.insert(0, 'octofit_tracker.middleware.QueryInstrumentationMiddleware')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'octofit_tracker.requests': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
 ROOT_URLCONF = 'octofit_tracker.urls'
 
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
+        'APP_DIRS': not PRODUCTION,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -79,6 +131,16 @@ TEMPLATES = [
     },
 ]
 
+# Compile each template once per process in production (APP_DIRS cannot be
+# combined with explicit loaders)
+if PRODUCTION:
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]
+
 WSGI_APPLICATION = 'octofit_tracker.wsgi.application'
 
 
@@ -93,11 +155,41 @@ DATABASES = {
         'CLIENT': {
             'host': 'localhost',
             'port': 27017,
-        }
+        },
+        # Seconds a connection is reused across requests (0 closes it after
+        # each request), checked before reuse once a request starts.
+        # octofit_tracker.asgi defaults it to 0: ASGI serves requests from
+        # short-lived threads whose connections could not be reused.
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60 if PRODUCTION else 0)),
+        'CONN_HEALTH_CHECKS': PRODUCTION,
     }
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+# The local-memory backend evicts least recently used entries once
+# MAX_ENTRIES is reached; CULL_FREQUENCY=10 drops the oldest tenth.
+# Change versions behind cached responses and ETags live here too, so
+# deployments running several server processes need a shared backend.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'octofit-tracker',
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 5000)),
+            'CULL_FREQUENCY': 10,
+        },
+    }
+}
+
+# Seconds a cached leaderboard/workout response may live. Entries are keyed
+# on the change versions in the database, so writes from any process or
+# management command invalidate them immediately regardless of this value.
+RESPONSE_CACHE_TIMEOUT = int(os.environ.get('RESPONSE_CACHE_TIMEOUT', 300))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 
@@ -166,3 +258,70 @@ CORS_ALLOW_HEADERS = [
 CSRF_TRUSTED_ORIGINS = ['http://localhost:8000', 'http://127.0.0.1:8000']
 if CODESPACE_NAME:
     CSRF_TRUSTED_ORIGINS.append(f'https://{CODESPACE_NAME}-8000.app.github.dev')
+
+# orjson-backed JSON rendering with a stdlib fallback (see
+# octofit_tracker.renderers); the browsable API is for development only
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'octofit_tracker.renderers.FastJSONRenderer',
+    ] + ([] if PRODUCTION else ['rest_framework.renderers.BrowsableAPIRenderer']),
+}
+
+# Cursor pagination for /api/activities/ (clients may pass ?page_size=)
+ACTIVITY_PAGE_SIZE = int(os.environ.get('ACTIVITY_PAGE_SIZE', 50))
+ACTIVITY_MAX_PAGE_SIZE = int(os.environ.get('ACTIVITY_MAX_PAGE_SIZE', 500))
+
+# Largest batch accepted by POST /api/activities/bulk/
+ACTIVITY_BULK_MAX_ITEMS = int(os.environ.get('ACTIVITY_BULK_MAX_ITEMS', 5000))
+
+# Serve list endpoints of viewsets with fast_list from .values() rows
+# instead of model instances (see octofit_tracker.fastpath)
+FAST_LIST_SERIALIZATION = os.environ.get('FAST_LIST_SERIALIZATION', '1') == '1'
+
+# Workout recommendations: days of activity history considered, and the
+# default/maximum results of /api/workouts/recommended/ (the nightly
+# recommend_workouts job stores RECOMMENDATION_MAX_LIMIT per user)
+RECOMMENDATION_HISTORY_DAYS = int(os.environ.get('RECOMMENDATION_HISTORY_DAYS', 28))
+RECOMMENDATION_DEFAULT_LIMIT = int(os.environ.get('RECOMMENDATION_DEFAULT_LIMIT', 5))
+RECOMMENDATION_MAX_LIMIT = int(os.environ.get('RECOMMENDATION_MAX_LIMIT', 20))
+
+# Largest ?limit= of /api/leaderboard/top/, and the default/largest
+# ?radius= of /api/leaderboard/around/
+LEADERBOARD_TOP_MAX_LIMIT = int(os.environ.get('LEADERBOARD_TOP_MAX_LIMIT', 100))
+LEADERBOARD_AROUND_DEFAULT_RADIUS = int(os.environ.get('LEADERBOARD_AROUND_DEFAULT_RADIUS', 5))
+LEADERBOARD_AROUND_MAX_RADIUS = int(os.environ.get('LEADERBOARD_AROUND_MAX_RADIUS', 25))
+
+# Calorie distribution index behind /api/leaderboard/percentile/ and
+# /histogram/: bucket width in kcal, number of buckets (totals beyond the
+# last one share it), seconds before a process rebuilds its index from the
+# table (to pick up other processes' writes), and the largest ?bins= of a
+# histogram
+LEADERBOARD_DISTRIBUTION_BUCKET = int(os.environ.get('LEADERBOARD_DISTRIBUTION_BUCKET', 50))
+LEADERBOARD_DISTRIBUTION_MAX_BUCKETS = int(os.environ.get('LEADERBOARD_DISTRIBUTION_MAX_BUCKETS', 4096))
+LEADERBOARD_DISTRIBUTION_REFRESH_SECONDS = int(os.environ.get('LEADERBOARD_DISTRIBUTION_REFRESH_SECONDS', 300))
+LEADERBOARD_HISTOGRAM_MAX_BINS = int(os.environ.get('LEADERBOARD_HISTOGRAM_MAX_BINS', 100))
+
+# Largest calories a single logged activity may report
+ACTIVITY_MAX_CALORIES = int(os.environ.get('ACTIVITY_MAX_CALORIES', 10000))
+
+# Leaderboard stream (ASGI only, see octofit_tracker.streaming): seconds
+# between polls for changed entries, how far each poll looks back for
+# late commits, seconds between keepalive comments, pending changes held
+# per client before it is told to resync, and clients per process
+LEADERBOARD_STREAM_TICK_SECONDS = float(os.environ.get('LEADERBOARD_STREAM_TICK_SECONDS', 1))
+LEADERBOARD_STREAM_LOOKBACK_SECONDS = float(os.environ.get('LEADERBOARD_STREAM_LOOKBACK_SECONDS', 5))
+LEADERBOARD_STREAM_KEEPALIVE_SECONDS = float(os.environ.get('LEADERBOARD_STREAM_KEEPALIVE_SECONDS', 15))
+LEADERBOARD_STREAM_BUFFER = int(os.environ.get('LEADERBOARD_STREAM_BUFFER', 500))
+LEADERBOARD_STREAM_MAX_CLIENTS = int(os.environ.get('LEADERBOARD_STREAM_MAX_CLIENTS', 1000))
+
+# Leaderboard re-ranking after activity writes (see octofit_tracker.ranking):
+# 'background' coalesces writes into one re-rank per interval on a worker
+# thread, 'sync' re-ranks inside every write (the default outside the
+# production profile, so ranks are current as soon as a write returns)
+RANK_WORKER_MODE = os.environ.get('RANK_WORKER_MODE', 'background' if PRODUCTION else 'sync')
+if RANK_WORKER_MODE not in ('background', 'sync'):
+    raise ImproperlyConfigured(f'Unknown RANK_WORKER_MODE {RANK_WORKER_MODE!r}')
+RANK_WORKER_INTERVAL_SECONDS = float(os.environ.get('RANK_WORKER_INTERVAL_SECONDS', 1))
+
+# Longest ?window= / ?from=&to= range served by /api/leaderboard/
+LEADERBOARD_MAX_WINDOW_DAYS = int(os.environ.get('LEADERBOARD_MAX_WINDOW_DAYS', 31))
@@ -0,0 +1,164 @@
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+
+from .models import User, Team, Activity, LeaderBoard, Workout, Coach
+from . import caching, distribution, leaderboard, ranking, search
+
+
+def stored_contribution(activity):
+    """
+    Lock the stored row of an activity and return its leaderboard
+    contribution, or None if it is gone. Called inside the transaction of
+    the write (see ``Activity.save``), so the row cannot change before the
+    delta is applied.
+    """
+    return (
+        Activity.objects.select_for_update()
+        .filter(pk=activity.pk)
+        .values_list('user_email', 'user_name', 'date', 'calories', 'duration')
+        .first()
+    )
+
+
+@receiver(pre_save, sender=Activity)
+def remember_previous_activity(sender, instance, raw=False, **kwargs):
+    """Snapshot the stored values of an activity about to be updated"""
+    instance._leaderboard_previous = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    if not leaderboard.tracking_enabled():
+        return
+    instance._leaderboard_previous = stored_contribution(instance)
+
+
+@receiver(pre_delete, sender=Activity)
+def remember_deleted_activity(sender, instance, **kwargs):
+    """Snapshot the stored values of an activity about to be deleted"""
+    instance._leaderboard_previous = None
+    if leaderboard.tracking_enabled():
+        instance._leaderboard_previous = stored_contribution(instance)
+
+
+@receiver(post_save, sender=Activity)
+def update_leaderboard_on_save(sender, instance, created, raw=False, **kwargs):
+    """Apply the activity's contribution to the leaderboard by delta"""
+    if raw or not leaderboard.tracking_enabled():
+        return
+    previous = None if created else getattr(instance, '_leaderboard_previous', None)
+    removed = [previous] if previous is not None else []
+    if leaderboard.apply_activity_changes(removed, [leaderboard.contribution(instance)]):
+        ranking.mark_dirty()
+
+
+@receiver(post_delete, sender=Activity)
+def update_leaderboard_on_delete(sender, instance, **kwargs):
+    """Remove the activity's contribution from the leaderboard"""
+    if not leaderboard.tracking_enabled():
+        return
+    # The stored values, in case the instance was loaded before a later edit
+    previous = getattr(instance, '_leaderboard_previous', None)
+    if previous is None:
+        return
+    if leaderboard.apply_activity_changes(removed=[previous]):
+        ranking.mark_dirty()
+
+
+@receiver(post_save, sender=User)
+def update_leaderboard_on_team_change(sender, instance, raw=False, **kwargs):
+    """Move the user's totals to the standing of their new team"""
+    if raw or not leaderboard.tracking_enabled():
+        return
+    if leaderboard.apply_team_change(instance.email, instance.team):
+        ranking.mark_dirty()
+
+
+@receiver(pre_save, sender=Team)
+def remember_previous_team_name(sender, instance, raw=False, **kwargs):
+    """Snapshot the stored name of a team about to be updated"""
+    instance._leaderboard_previous = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    if not leaderboard.tracking_enabled():
+        return
+    instance._leaderboard_previous = Team.objects.filter(pk=instance.pk).values_list('name', flat=True).first()
+
+
+@receiver(post_save, sender=Team)
+def seed_team_standing(sender, instance, created, raw=False, **kwargs):
+    """Rank a new team from the start, ahead of its first activity"""
+    if raw or not created or not leaderboard.tracking_enabled():
+        return
+    leaderboard.seed_team_standings([instance.name])
+    ranking.mark_dirty()
+
+
+@receiver(post_save, sender=Team)
+def rename_team_standing(sender, instance, created, raw=False, **kwargs):
+    """Carry a renamed team's members and standing over to the new name"""
+    if raw or created or not leaderboard.tracking_enabled():
+        return
+    previous = getattr(instance, '_leaderboard_previous', None)
+    if previous is None or previous == instance.name:
+        return
+    leaderboard.rename_team(previous, instance.name)
+    ranking.mark_dirty()
+
+
+@receiver(post_delete, sender=Team)
+def remove_team_standing(sender, instance, **kwargs):
+    """Drop the standing of a deleted team"""
+    if not leaderboard.tracking_enabled():
+        return
+    leaderboard.remove_team(instance.name)
+    ranking.mark_dirty()
+
+
+@receiver(post_save, sender=Activity)
+@receiver(post_save, sender=Workout)
+def update_search_index_on_save(sender, instance, raw=False, **kwargs):
+    """Re-tokenize the saved object's searchable fields"""
+    if raw or not leaderboard.tracking_enabled():
+        return
+    search.index_objects(sender, [instance])
+
+
+@receiver(post_delete, sender=Activity)
+@receiver(post_delete, sender=Workout)
+def update_search_index_on_delete(sender, instance, **kwargs):
+    """Drop the deleted object's search tokens"""
+    if not leaderboard.tracking_enabled():
+        return
+    search.remove_objects(sender, [instance.pk])
+
+
+@receiver([post_save, post_delete], sender=LeaderBoard)
+def update_distribution(sender, instance, **kwargs):
+    """Move the written entry between calorie buckets once committed"""
+    email = instance.user_email
+    transaction.on_commit(lambda: distribution.refresh_entries([email]))
+
+
+# Change-version namespaces bumped by writes to each model; cached
+# responses and ETags of viewsets reading a namespace follow its version.
+RESPONSE_NAMESPACES = {
+    User: 'users',
+    Team: 'teams',
+    Activity: 'activities',
+    LeaderBoard: 'leaderboard',
+    Workout: 'workouts',
+    Coach: 'coaches',
+}
+
+
+def invalidate_responses(sender, **kwargs):
+    """Bump the change version of the written model's namespace"""
+    caching.invalidate(RESPONSE_NAMESPACES[sender])
+
+
+# Connected per model: a receiver for every sender would keep the ORM from
+# deleting rows of any model (search tokens, stored recommendations) with
+# a single DELETE
+for model in RESPONSE_NAMESPACES:
+    post_save.connect(invalidate_responses, sender=model)
+    post_delete.connect(invalidate_responses, sender=model)
@@ -0,0 +1,269 @@
+"""Server-Sent Events stream of leaderboard rank changes.
+
+``GET /api/leaderboard/stream/`` (optionally ``?team=``) is served by the
+ASGI application only: ``octofit_tracker.asgi`` routes it to ``stream``
+ahead of Django, which cannot stream from a coroutine or notice a client
+disconnecting before 4.2.
+
+Every ``LEADERBOARD_STREAM_TICK_SECONDS`` one poller per process reads the
+leaderboard entries updated since its previous tick (a range seek on
+``last_updated``) and compares them with the ranks and totals it last saw,
+so writes from any process are picked up and a burst of activities yields
+one change per user per tick. The poller only runs while clients are
+connected.
+
+Each client holds at most ``LEADERBOARD_STREAM_BUFFER`` pending changes,
+merged per user until the client reads them. A client falling further
+behind has its buffer dropped and receives a ``resync`` event telling it
+to fetch the leaderboard again.
+
+Requests are checked against ``ALLOWED_HOSTS`` and answered with the CORS
+headers ``corsheaders`` would add under the configured ``CORS_*``
+settings, as the Django middleware never sees them.
+"""
+import asyncio
+import io
+import json
+import logging
+from datetime import timedelta
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from corsheaders.middleware import CorsMiddleware
+from django.conf import settings
+from django.core.exceptions import DisallowedHost
+from django.core.handlers.asgi import ASGIRequest
+from django.db import close_old_connections
+from django.http import HttpResponse
+
+from .models import LeaderBoard
+
+
+logger = logging.getLogger('octofit_tracker.streaming')
+
+STREAM_PATH = '/api/leaderboard/stream/'
+
+TOTAL_FIELDS = ('total_activities', 'total_calories', 'total_duration')
+ENTRY_FIELDS = ('user_email', 'user_name', 'team', 'rank') + TOTAL_FIELDS
+
+
+class RankTracker:
+    """
+    Remembers the rank and totals of every leaderboard entry and reports
+    the entries that changed since the previous poll
+    """
+
+    def __init__(self):
+        self.entries = None
+        self.since = None
+
+    def poll(self):
+        """Return the changed entries as dicts with their ``old_rank``"""
+        rows = LeaderBoard.objects.order_by()
+        baseline = self.entries is None
+        if baseline:
+            self.entries = {}
+        elif self.since is not None:
+            # Look back a little so rows committed late with an earlier
+            # last_updated are not missed; unchanged rows are skipped below.
+            lookback = timedelta(seconds=settings.LEADERBOARD_STREAM_LOOKBACK_SECONDS)
+            rows = rows.filter(last_updated__gte=self.since - lookback)
+        changes = []
+        for row in rows.values(*ENTRY_FIELDS, 'last_updated').iterator(chunk_size=2000):
+            updated = row.pop('last_updated')
+            self.since = updated if self.since is None else max(self.since, updated)
+            state = tuple(row[field] for field in ('rank',) + TOTAL_FIELDS)
+            previous = self.entries.get(row['user_email'])
+            self.entries[row['user_email']] = state
+            if not baseline and state != previous:
+                changes.append({**row, 'old_rank': previous[0] if previous else None})
+        return changes
+
+
+def _poll(tracker):
+    close_old_connections()
+    try:
+        return tracker.poll()
+    finally:
+        close_old_connections()
+
+
+class Subscriber:
+    """A connected client: its team filter and the changes it has not read"""
+
+    def __init__(self, team=None):
+        self.team = team
+        self.pending = {}
+        self.overflowed = False
+        self.ready = asyncio.Event()
+
+    def offer(self, changes):
+        """Queue the changes matching the team filter, merged per user"""
+        for change in changes:
+            if self.team is not None and change['team'] != self.team:
+                continue
+            email = change['user_email']
+            queued = self.pending.get(email)
+            if queued is not None:
+                change = {**change, 'old_rank': queued['old_rank']}
+            self.pending[email] = change
+            if len(self.pending) > settings.LEADERBOARD_STREAM_BUFFER:
+                self.pending.clear()
+                self.overflowed = True
+                break
+        if self.pending or self.overflowed:
+            self.ready.set()
+
+    def take(self):
+        """Return ``(changes, overflowed)`` and empty the buffer"""
+        changes, overflowed = list(self.pending.values()), self.overflowed
+        self.pending = {}
+        self.overflowed = False
+        self.ready.clear()
+        return changes, overflowed
+
+
+class Broker:
+    """Fans the changes found by one poller out to the connected clients"""
+
+    def __init__(self):
+        self.subscribers = set()
+        self.tracker = None
+        self.poller = None
+
+    def subscribe(self, team=None):
+        """Register a client, or return None if the process is at capacity"""
+        if len(self.subscribers) >= settings.LEADERBOARD_STREAM_MAX_CLIENTS:
+            return None
+        subscriber = Subscriber(team)
+        self.subscribers.add(subscriber)
+        if self.poller is None or self.poller.done():
+            self.poller = asyncio.ensure_future(self.run())
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.discard(subscriber)
+        if not self.subscribers and self.poller is not None:
+            self.poller.cancel()
+            self.poller = None
+            self.tracker = None
+
+    def publish(self, changes):
+        if changes:
+            for subscriber in self.subscribers:
+                subscriber.offer(changes)
+
+    async def run(self):
+        self.tracker = RankTracker()
+        tracker = self.tracker
+        while True:
+            try:
+                self.publish(await sync_to_async(_poll)(tracker))
+            except Exception:
+                # Keep clients connected through database hiccups
+                logger.exception('Leaderboard stream poll failed')
+            await asyncio.sleep(settings.LEADERBOARD_STREAM_TICK_SECONDS)
+
+
+broker = Broker()
+
+
+def event(name, data):
+    return f'event: {name}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'.encode()
+
+
+_cors = CorsMiddleware(lambda request: None)
+
+
+def cors_headers(request):
+    """Return the CORS headers of a response to ``request`` as ASGI pairs"""
+    response = _cors.add_response_headers(request, HttpResponse())
+    return [
+        (name.lower().encode('latin-1'), value.encode('latin-1'))
+        for name, value in response.items()
+        if name.lower().startswith('access-control-') or name.lower() == 'vary'
+    ]
+
+
+async def _respond(send, status, body, headers=()):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'), *headers],
+    })
+    await send({'type': 'http.response.body', 'body': json.dumps(body).encode()})
+
+
+async def stream(scope, receive, send):
+    """ASGI application streaming rank changes as Server-Sent Events"""
+    request = ASGIRequest(scope, io.BytesIO())
+    try:
+        request.get_host()
+    except DisallowedHost:
+        await _respond(send, 400, {'error': 'Invalid host'})
+        return
+    cors = cors_headers(request)
+    if _cors.check_preflight(request) is not None:
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [(b'content-length', b'0'), *cors]})
+        await send({'type': 'http.response.body', 'body': b''})
+        return
+    if scope['method'] != 'GET':
+        await _respond(
+            send, 405, {'detail': f'Method "{scope["method"]}" not allowed.'}, [(b'allow', b'GET'), *cors]
+        )
+        return
+    params = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    team = params.get('team', [None])[-1] or None
+    subscriber = broker.subscribe(team)
+    if subscriber is None:
+        await _respond(send, 503, {'error': 'Too many leaderboard stream clients'}, [(b'retry-after', b'30'), *cors])
+        return
+
+    async def wait_for_disconnect():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    disconnected = asyncio.ensure_future(wait_for_disconnect())
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                # Keep reverse proxies from buffering the stream
+                (b'x-accel-buffering', b'no'),
+                *cors,
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': b'retry: 5000\n\n', 'more_body': True})
+        while not disconnected.done():
+            ready = asyncio.ensure_future(subscriber.ready.wait())
+            await asyncio.wait(
+                [ready, disconnected],
+                timeout=settings.LEADERBOARD_STREAM_KEEPALIVE_SECONDS,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            ready.cancel()
+            if disconnected.done():
+                break
+            changes, overflowed = subscriber.take()
+            if overflowed:
+                body = event('resync', {'team': team})
+            elif changes:
+                body = event('ranks', changes)
+            else:
+                body = b': keepalive\n\n'
+            await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+    finally:
+        disconnected.cancel()
+        broker.unsubscribe(subscriber)
+
+
+def route(application):
+    """Wrap an ASGI application so the stream path is served by ``stream``"""
+    async def router(scope, receive, send):
+        if scope['type'] == 'http' and scope['path'] == STREAM_PATH:
+            return await stream(scope, receive, send)
+        return await application(scope, receive, send)
+    return router
@@ -0,0 +1,97 @@
+"""Reproducible synthetic users and activities for capacity testing.
+
+Every user's activities come from a random generator seeded with the run
+seed and the user's index, so the data set depends only on the command
+options, not on how users are split into blocks or worker processes.
+"""
+import random
+from datetime import timedelta
+
+from .models import Activity
+
+
+FIRST_NAMES = [
+    'Ada', 'Bruno', 'Carla', 'Diego', 'Elena', 'Filipa', 'Goncalo', 'Helena',
+    'Ines', 'Joao', 'Karina', 'Luis', 'Marta', 'Nuno', 'Olga', 'Pedro',
+    'Quinn', 'Rita', 'Sofia', 'Tiago', 'Ursula', 'Vasco', 'Wanda', 'Xavier',
+    'Yara', 'Zeca',
+]
+
+LAST_NAMES = [
+    'Almeida', 'Barros', 'Costa', 'Duarte', 'Esteves', 'Ferreira', 'Gomes',
+    'Henriques', 'Izidro', 'Jesus', 'Lopes', 'Marques', 'Nunes', 'Oliveira',
+    'Pereira', 'Queiroz', 'Ribeiro', 'Santos', 'Teixeira', 'Vieira',
+]
+
+# activity type -> (duration range in minutes, calories per minute range,
+# km per minute or None when distance does not apply)
+ACTIVITY_PROFILES = {
+    'Running': ((20, 90), (9, 13), 0.18),
+    'Cycling': ((30, 180), (7, 11), 0.40),
+    'Swimming': ((20, 75), (8, 12), 0.04),
+    'Weightlifting': ((30, 90), (5, 8), None),
+    'Yoga': ((20, 75), (3, 5), None),
+    'Boxing': ((20, 60), (9, 13), None),
+    'HIIT': ((15, 45), (10, 14), None),
+}
+
+ACTIVITY_TYPES = list(ACTIVITY_PROFILES)
+
+
+def user_email(index):
+    return f'athlete{index:07d}@octofit.test'
+
+
+def user_name(index):
+    first = FIRST_NAMES[index % len(FIRST_NAMES)]
+    last = LAST_NAMES[(index // len(FIRST_NAMES)) % len(LAST_NAMES)]
+    return f'{first} {last}'
+
+
+def team_name(index):
+    return f'Team {index + 1:04d}'
+
+
+def user_activities(index, seed, activities_per_user, days, now):
+    """Yield unsaved activities for one user"""
+    rng = random.Random(f'{seed}:{index}')
+    email, name = user_email(index), user_name(index)
+    favourites = rng.sample(ACTIVITY_TYPES, rng.randint(1, 3))
+    low, high = activities_per_user // 2, activities_per_user + activities_per_user // 2
+    for _ in range(rng.randint(low, high) if activities_per_user > 1 else activities_per_user):
+        activity_type = rng.choice(favourites) if rng.random() < 0.8 else rng.choice(ACTIVITY_TYPES)
+        (min_minutes, max_minutes), (min_rate, max_rate), speed = ACTIVITY_PROFILES[activity_type]
+        duration = rng.randint(min_minutes, max_minutes)
+        yield Activity(
+            user_email=email,
+            user_name=name,
+            activity_type=activity_type,
+            duration=duration,
+            calories=duration * rng.randint(min_rate, max_rate),
+            distance=round(duration * speed * rng.uniform(0.8, 1.2), 2) if speed else None,
+            date=now - timedelta(seconds=rng.randrange(days * 86400)),
+            notes=f'{activity_type} session completed by {name}',
+        )
+
+
+def write_activity_block(block):
+    """
+    Insert the activities of users ``start`` to ``stop`` in batches.
+
+    Takes a single tuple so it can be mapped over a process pool; returns
+    ``(users, activities)`` written.
+    """
+    start, stop, seed, activities_per_user, days, now, batch_size = block
+    batch = []
+    written = 0
+    for index in range(start, stop):
+        for activity in user_activities(index, seed, activities_per_user, days, now):
+            batch.append(activity)
+            if len(batch) >= batch_size:
+                Activity.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+    if batch:
+        Activity.objects.bulk_create(batch)
+        written += len(batch)
+    return stop - start, written
@@ -1,9 +1,42 @@
-from django.test import TestCase
-from rest_framework.test import APITestCase
+from asgiref.sync import async_to_sync, sync_to_async
+from django.test import TestCase, TransactionTestCase, modify_settings, override_settings, skipUnlessDBFeature
+from unittest import skipUnless
+from rest_framework.test import APITestCase, APITransactionTestCase
 from rest_framework import status
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from .models import User, Team, Activity, LeaderBoard, Workout
-from datetime import datetime
+from django.core.exceptions import ImproperlyConfigured
+from io import StringIO
+from unittest import mock
+import asyncio
+import csv
+import gzip
+import importlib
+import importlib.util
+import json
+import os
+import threading
+import time
+try:
+    import numpy
+except ImportError:
+    numpy = None
+from .models import (
+    User, Team, Activity, LeaderBoard, TeamStanding, Workout, DailyActivityRollup, SearchToken,
+    WorkoutRecommendation, ChangeVersion,
+)
+from .serializers import TeamSerializer
+from .views import LeaderBoardViewSet, WorkoutViewSet
+from . import (
+    benchmarks, caching, checks, distribution, leaderboard, members, recommendations, search,
+    ranking, streaming,
+)
+from django.utils import timezone
+from datetime import datetime, timedelta
 
 
 class UserModelTest(TestCase):
@@ -189,7 +222,49 @@ class ActivityAPITest(APITestCase):
         url = reverse('activity-list')
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data['results']), 1)
+    
+    def test_cursor_pagination(self):
+        """Test activities are paged newest first with opaque cursors"""
+        now = timezone.now()
+        Activity.objects.all().delete()
+        for days_ago in range(5):
+            Activity.objects.create(
+                user_email='test@example.com',
+                user_name='Test User',
+                activity_type='Running',
+                duration=30,
+                calories=300 + days_ago,
+                date=now - timedelta(days=days_ago)
+            )
+        url = reverse('activity-list')
+        response = self.client.get(url, {'page_size': 2})
+        seen = [a['calories'] for a in response.data['results']]
+        self.assertIsNone(response.data['previous'])
+        while response.data['next']:
+            self.assertIn('cursor=', response.data['next'])
+            response = self.client.get(response.data['next'])
+            seen += [a['calories'] for a in response.data['results']]
+        self.assertEqual(seen, [300, 301, 302, 303, 304])
+    
+    def test_by_user_is_paginated(self):
+        """Test the by_user action honors the cursor page size"""
+        url = reverse('activity-by-user')
+        response = self.client.get(url, {'email': 'test@example.com', 'page_size': 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIsNone(response.data['next'])
+    
+    def test_calories_are_bounded(self):
+        """Test negative and implausibly large calories are rejected"""
+        url = reverse('activity-list')
+        payload = {'user_email': 'test@example.com', 'user_name': 'Test User', 'activity_type': 'Running',
+                   'duration': 30}
+        for calories in (-1, 2_000_000_000):
+            response = self.client.post(url, {**payload, 'calories': calories}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, calories)
+            self.assertIn('calories', response.data)
+        self.assertEqual(Activity.objects.count(), 1)
 
 
 class LeaderBoardAPITest(APITestCase):
@@ -214,6 +289,226 @@ class LeaderBoardAPITest(APITestCase):
         self.assertEqual(len(response.data), 1)
 
 
+class LeaderBoardAroundTest(APITestCase):
+    """Tests for /api/leaderboard/around/ and the bounded top limit"""
+    
+    def setUp(self):
+        cache.clear()
+        # Ranks 1..12 with a three-way tie at rank 5 (competition ranking)
+        calories = [1200, 1100, 1000, 900, 800, 800, 800, 500, 400, 300, 200, 100]
+        LeaderBoard.objects.bulk_create([
+            LeaderBoard(user_email=f'user{index}@example.com', user_name=f'User {index}', team='T',
+                        total_calories=value)
+            for index, value in enumerate(calories)
+        ])
+        leaderboard.assign_ranks()
+        self.url = reverse('leaderboard-around')
+    
+    def emails(self, response):
+        return [entry['user_email'] for entry in response.data['results']]
+    
+    def test_neighbourhood(self):
+        """Test the user's entry comes with the entries ranked around it"""
+        response = self.client.get(self.url, {'email': 'user5@example.com', 'radius': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.emails(response), [f'user{index}@example.com' for index in range(3, 8)])
+        self.assertEqual([entry['rank'] for entry in response.data['results']], [4, 5, 5, 5, 8])
+        
+        top = self.client.get(self.url, {'email': 'user0@example.com'})
+        self.assertEqual(self.emails(top), [f'user{index}@example.com' for index in range(0, 6)])
+        bottom = self.client.get(self.url, {'email': 'user11@example.com', 'radius': 3})
+        self.assertEqual(self.emails(bottom), [f'user{index}@example.com' for index in range(8, 12)])
+        alone = self.client.get(self.url, {'email': 'user6@example.com', 'radius': 0})
+        self.assertEqual(self.emails(alone), ['user6@example.com'])
+    
+    def test_matches_slow_path_and_fieldsets(self):
+        """Test both serialization paths and ?fields= give the same entries"""
+        params = {'email': 'user6@example.com', 'radius': 3, 'fields': 'user_email,rank'}
+        fast = self.client.get(self.url, params)
+        cache.clear()
+        with override_settings(FAST_LIST_SERIALIZATION=False):
+            slow = self.client.get(self.url, params)
+        self.assertEqual(fast.content, slow.content)
+        self.assertEqual(set(fast.data['results'][0]), {'user_email', 'rank'})
+    
+    def test_query_count_does_not_depend_on_position(self):
+        """Test the lookup costs the same for the first and the last user"""
+        counts = []
+        for email in ('user1@example.com', 'user10@example.com'):
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(self.url, {'email': email, 'radius': 1})
+            counts.append(len(queries.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+        # The change version lookup plus at most five index seeks
+        self.assertLessEqual(counts[0], 6)
+    
+    def test_invalid_requests(self):
+        """Test missing emails, unranked users and bad radii and limits are rejected"""
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(self.url, {'email': 'nobody@example.com'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        for radius in ('-1', '26', 'wide'):
+            response = self.client.get(self.url, {'email': 'user1@example.com', 'radius': radius})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, radius)
+        top = reverse('leaderboard-top')
+        for limit in ('0', '101', 'all'):
+            self.assertEqual(self.client.get(top, {'limit': limit}).status_code, status.HTTP_400_BAD_REQUEST, limit)
+        self.assertEqual(len(self.client.get(top, {'limit': 100}).data), 12)
+
+
+@override_settings(LEADERBOARD_DISTRIBUTION_BUCKET=100)
+class LeaderBoardDistributionTest(APITestCase):
+    """Tests for the calorie distribution index and its endpoints"""
+    
+    def setUp(self):
+        cache.clear()
+        distribution.reset()
+        self.addCleanup(distribution.reset)
+        # Buckets of 100 kcal: 0-99 x2, 100-199 x1, 200-299 x3, 900-999 x1
+        calories = [0, 50, 150, 200, 250, 299, 950]
+        LeaderBoard.objects.bulk_create([
+            LeaderBoard(user_email=f'user{index}@example.com', user_name=f'User {index}', team='T',
+                        total_calories=value)
+            for index, value in enumerate(calories)
+        ])
+    
+    def test_fenwick_tree(self):
+        """Test prefix sums and searches survive growing the tree"""
+        tree = distribution.FenwickTree()
+        counts = {0: 2, 3: 1, 17: 4, 40: 1}
+        for slot, count in counts.items():
+            tree.add(slot, count)
+        for slot in range(45):
+            self.assertEqual(tree.prefix(slot), sum(c for s, c in counts.items() if s < slot), slot)
+        self.assertEqual([tree.search(count) for count in range(8)], [0, 0, 3, 17, 17, 17, 17, 40])
+        tree.add(17, -4)
+        self.assertEqual(tree.search(3), 40)
+    
+    def test_percentile(self):
+        """Test a user's percentile counts users in the same bucket as tied"""
+        response = self.client.get(reverse('leaderboard-percentile'), {'email': 'user4@example.com'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['users'], 7)
+        self.assertEqual((response.data['above'], response.data['below']), (1, 3))
+        self.assertEqual(response.data['percentile'], 42.9)
+        self.assertEqual(response.data['top_percent'], 29)
+        top = distribution.percentile('user6@example.com')
+        self.assertEqual((top['above'], top['top_percent']), (0, 15))
+    
+    def test_histogram(self):
+        """Test bins are whole buckets up to the highest total"""
+        response = self.client.get(reverse('leaderboard-histogram'), {'bins': 4})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['bucket_size'], 100)
+        self.assertEqual(
+            [(row['calories_from'], row['calories_to'], row['users']) for row in response.data['results']],
+            [(0, 300, 6), (300, 600, 0), (600, 900, 0), (900, 1200, 1)],
+        )
+        fine = self.client.get(reverse('leaderboard-histogram'), {'bins': 100}).data['results']
+        self.assertEqual(len(fine), 10)
+        self.assertEqual(sum(row['users'] for row in fine), 7)
+    
+    def test_queries_do_not_read_the_table(self):
+        """Test the index is built once and then answers without queries"""
+        distribution.percentile('user0@example.com')
+        with CaptureQueriesContext(connection) as queries:
+            distribution.percentile('user3@example.com')
+            distribution.histogram(10)
+        self.assertEqual(len(queries.captured_queries), 0)
+    
+    def test_follows_leaderboard_writes(self):
+        """Test committed activity and leaderboard writes move users between buckets"""
+        self.assertEqual(distribution.percentile('user0@example.com')['below'], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            Activity.objects.create(
+                user_email='user0@example.com', user_name='User 0', activity_type='Running',
+                duration=60, calories=1000, date=timezone.now(),
+            )
+        self.assertEqual(distribution.percentile('user0@example.com')['above'], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            LeaderBoard.objects.get(user_email='user6@example.com').delete()
+        self.assertEqual(distribution.percentile('user0@example.com')['users'], 6)
+        self.assertIsNone(distribution.percentile('user6@example.com'))
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            leaderboard.rebuild()
+        self.assertTrue(distribution._index.stale)
+        # Rebuilt from the activity history: only users with activities remain
+        self.assertEqual(distribution.percentile('user0@example.com')['users'], 1)
+    
+    @override_settings(LEADERBOARD_DISTRIBUTION_REFRESH_SECONDS=0)
+    def test_rebuilds_when_expired(self):
+        """Test writes from elsewhere are picked up once the index expires"""
+        distribution.histogram(10)
+        LeaderBoard.objects.filter(user_email='user0@example.com').update(total_calories=5000)
+        self.assertEqual(distribution.percentile('user0@example.com')['above'], 0)
+    
+    def test_rebuild_does_not_hold_the_lock(self):
+        """Test the old index answers during a rebuild and writes made meanwhile are kept"""
+        self.assertEqual(distribution.percentile('user0@example.com')['below'], 0)
+        distribution.mark_stale()
+        load = distribution._load
+        
+        def load_then_write():
+            loaded = load()
+            self.assertTrue(distribution._index_lock.acquire(blocking=False))
+            distribution._index_lock.release()
+            self.assertEqual(distribution.percentile('user0@example.com')['below'], 0)
+            # Committed after the scan read the row
+            LeaderBoard.objects.filter(user_email='user0@example.com').update(total_calories=5000)
+            distribution.refresh_entries(['user0@example.com'])
+            return loaded
+        
+        with mock.patch.object(distribution, '_load', load_then_write):
+            distribution.histogram(10)
+        self.assertFalse(distribution._index.stale)
+        self.assertEqual(distribution.percentile('user0@example.com')['above'], 0)
+    
+    @override_settings(LEADERBOARD_DISTRIBUTION_MAX_BUCKETS=8)
+    def test_outliers_share_the_last_bucket(self):
+        """Test totals beyond the last bucket neither grow the tree nor get lost"""
+        LeaderBoard.objects.filter(user_email='user6@example.com').update(total_calories=2_000_000_000)
+        self.assertEqual(distribution.percentile('user6@example.com')['above'], 0)
+        self.assertEqual(distribution._index.counts.size, 8)
+        self.assertEqual(
+            [(row['calories_from'], row['calories_to'], row['users']) for row in distribution.histogram(4)],
+            [(0, 200, 3), (200, 400, 3), (400, 600, 0), (600, None, 1)],
+        )
+    
+    def test_first_build_scans_once(self):
+        """Test concurrent queries wait for the first index instead of scanning too"""
+        loads = []
+        started = threading.Event()
+        
+        def slow_load():
+            loads.append(1)
+            started.set()
+            time.sleep(0.2)
+            return distribution.Distribution(100, [('user0@example.com', 0)], 4096)
+        
+        results = []
+        with mock.patch.object(distribution, '_load', slow_load):
+            first = threading.Thread(target=lambda: results.append(distribution.percentile('user0@example.com')))
+            first.start()
+            started.wait(timeout=5)
+            others = [threading.Thread(target=lambda: results.append(distribution.histogram(4))) for _ in range(3)]
+            for thread in others:
+                thread.start()
+            for thread in [first, *others]:
+                thread.join(timeout=5)
+        self.assertEqual(len(loads), 1)
+        self.assertEqual(len(results), 4)
+    
+    def test_invalid_requests(self):
+        """Test missing emails, unknown users and bad bin counts are rejected"""
+        url = reverse('leaderboard-percentile')
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(url, {'email': 'nobody@example.com'}).status_code, status.HTTP_404_NOT_FOUND)
+        for bins in ('0', '101', 'many'):
+            response = self.client.get(reverse('leaderboard-histogram'), {'bins': bins})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, bins)
+
+
 class WorkoutAPITest(APITestCase):
     """API tests for Workout endpoints"""
     
@@ -235,3 +530,1816 @@ class WorkoutAPITest(APITestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data), 1)
+
+
+class LeaderBoardMaintenanceTest(APITestCase):
+    """Tests for incremental leaderboard updates on activity writes"""
+    
+    def setUp(self):
+        User.objects.create(
+            email='runner@example.com',
+            name='Runner',
+            password='runpass123',
+            team='Team Fast'
+        )
+    
+    def create_activity(self, **kwargs):
+        data = {
+            'user_email': 'runner@example.com',
+            'user_name': 'Runner',
+            'activity_type': 'Running',
+            'duration': 30,
+            'calories': 300,
+        }
+        data.update(kwargs)
+        return Activity.objects.create(**data)
+    
+    def test_create_adds_to_totals(self):
+        """Test creating activities increments the user's entry"""
+        self.create_activity()
+        self.create_activity(duration=15, calories=100)
+        entry = LeaderBoard.objects.get(user_email='runner@example.com')
+        self.assertEqual(entry.total_activities, 2)
+        self.assertEqual(entry.total_calories, 400)
+        self.assertEqual(entry.total_duration, 45)
+        self.assertEqual(entry.team, 'Team Fast')
+        self.assertEqual(entry.rank, 1)
+    
+    def test_update_applies_delta(self):
+        """Test updating an activity applies only the difference"""
+        activity = self.create_activity()
+        activity.calories = 250
+        activity.duration = 40
+        activity.save()
+        entry = LeaderBoard.objects.get(user_email='runner@example.com')
+        self.assertEqual(entry.total_activities, 1)
+        self.assertEqual(entry.total_calories, 250)
+        self.assertEqual(entry.total_duration, 40)
+    
+    def test_update_moves_activity_between_users(self):
+        """Test reassigning an activity moves its totals to the new user"""
+        activity = self.create_activity()
+        activity.user_email = 'other@example.com'
+        activity.user_name = 'Other'
+        activity.save()
+        # The entry is dropped with the user's last activity
+        self.assertFalse(LeaderBoard.objects.filter(user_email='runner@example.com').exists())
+        new_entry = LeaderBoard.objects.get(user_email='other@example.com')
+        self.assertEqual(new_entry.total_calories, 300)
+        self.assertEqual(new_entry.rank, 1)
+    
+    def test_delete_subtracts_from_totals(self):
+        """Test deleting an activity through the API removes its totals"""
+        self.create_activity()
+        activity = self.create_activity(calories=500)
+        url = reverse('activity-detail', args=[activity.id])
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        entry = LeaderBoard.objects.get(user_email='runner@example.com')
+        self.assertEqual(entry.total_activities, 1)
+        self.assertEqual(entry.total_calories, 300)
+    
+    def test_stale_instances_apply_stored_values(self):
+        """Test saves and deletes diff against the locked stored row, not the loaded copy"""
+        activity = self.create_activity()
+        stale = Activity.objects.get(pk=activity.pk)
+        activity.calories = 500
+        activity.save()
+        stale.duration = 45
+        with CaptureQueriesContext(connection) as queries:
+            stale.save()
+        # The snapshot, write and delta share one transaction
+        self.assertTrue(queries.captured_queries[0]['sql'].startswith('SAVEPOINT'))
+        entry = LeaderBoard.objects.get(user_email='runner@example.com')
+        self.assertEqual((entry.total_calories, entry.total_duration), (300, 45))
+        
+        stale = Activity.objects.get(pk=activity.pk)
+        activity.calories = 800
+        activity.save()
+        stale.delete()
+        self.assertFalse(LeaderBoard.objects.filter(user_email='runner@example.com').exists())
+    
+    def test_ranks_follow_calories(self):
+        """Test ranks are reassigned when totals change"""
+        self.create_activity()
+        self.create_activity(user_email='other@example.com', user_name='Other', calories=900)
+        ranks = dict(LeaderBoard.objects.values_list('user_email', 'rank'))
+        self.assertEqual(ranks, {'other@example.com': 1, 'runner@example.com': 2})
+
+
+class RebuildLeaderBoardTest(TestCase):
+    """Tests for the rebuild_leaderboard command"""
+    
+    def setUp(self):
+        User.objects.create(email='a@example.com', name='A', password='pass', team='Red')
+        User.objects.create(email='b@example.com', name='B', password='pass', team='Blue')
+        User.objects.create(email='c@example.com', name='C', password='pass', team='Red')
+        with leaderboard.tracking_disabled():
+            for email, calories in [('a@example.com', 500), ('b@example.com', 300),
+                                    ('b@example.com', 200), ('c@example.com', 100)]:
+                Activity.objects.create(
+                    user_email=email, user_name=email[0].upper(),
+                    activity_type='Running', duration=10, calories=calories
+                )
+        LeaderBoard.objects.create(user_email='gone@example.com', user_name='Gone', team='Red')
+    
+    def test_rank_policies(self):
+        """Test competition and dense ranking of tied totals"""
+        self.assertEqual(list(leaderboard.rank_sorted([9, 5, 5, 1])), [1, 2, 2, 4])
+        self.assertEqual(list(leaderboard.rank_sorted([9, 5, 5, 1], 'dense')), [1, 2, 2, 3])
+    
+    def test_rebuild_writes_totals_and_ranks(self):
+        """Test rebuild creates, updates and deletes rows to match activities"""
+        call_command('rebuild_leaderboard', stdout=StringIO())
+        rows = {
+            e.user_email: (e.total_activities, e.total_calories, e.rank, e.team)
+            for e in LeaderBoard.objects.all()
+        }
+        self.assertEqual(rows, {
+            'a@example.com': (1, 500, 1, 'Red'),
+            'b@example.com': (2, 500, 1, 'Blue'),
+            'c@example.com': (1, 100, 3, 'Red'),
+        })
+    
+    def test_rebuild_dense_ties(self):
+        """Test the dense tie policy"""
+        call_command('rebuild_leaderboard', ties='dense', stdout=StringIO())
+        self.assertEqual(LeaderBoard.objects.get(user_email='c@example.com').rank, 2)
+    
+    def test_dry_run_reports_without_writing(self):
+        """Test dry run prints a diff and leaves the table untouched"""
+        out = StringIO()
+        call_command('rebuild_leaderboard', dry_run=True, stdout=out)
+        self.assertIn('+ a@example.com', out.getvalue())
+        self.assertIn('- gone@example.com', out.getvalue())
+        self.assertEqual(LeaderBoard.objects.count(), 1)
+    
+    def test_rebuild_is_idempotent(self):
+        """Test a second rebuild finds nothing to change"""
+        call_command('rebuild_leaderboard', stdout=StringIO())
+        result = leaderboard.rebuild()
+        self.assertEqual((result['created'], result['updated'], result['deleted']), ([], [], []))
+        self.assertEqual(result['unchanged'], 3)
+
+
+class CheckIndexesCommandTest(TestCase):
+    """Tests for the check_indexes command"""
+    
+    def test_declared_indexes_present(self):
+        """Test the migrated database has every declared index"""
+        out = StringIO()
+        call_command('check_indexes', stdout=out)
+        self.assertIn('All declared indexes are present', out.getvalue())
+        self.assertIn('index    GET /api/leaderboard/by_team/', out.getvalue())
+    
+    def test_covers(self):
+        """Test index prefix matching for filter and ordering columns"""
+        from .management.commands.check_indexes import covers
+        self.assertTrue(covers(['team', 'rank'], ['team'], ['rank']))
+        self.assertTrue(covers(['user_email', 'date'], ['user_email'], []))
+        self.assertFalse(covers(['rank'], ['team'], ['rank']))
+        self.assertFalse(covers(['date', 'id'], ['activity_type'], ['date']))
+
+
+class WindowedLeaderBoardTest(APITestCase):
+    """Tests for daily rollups and time-windowed standings"""
+    
+    def setUp(self):
+        now = timezone.now()
+        for email, calories, days_ago in [('a@example.com', 400, 0), ('a@example.com', 100, 20),
+                                          ('b@example.com', 300, 1), ('b@example.com', 900, 40)]:
+            Activity.objects.create(
+                user_email=email, user_name=email[0].upper(), activity_type='Running',
+                duration=10, calories=calories, date=now - timedelta(days=days_ago)
+            )
+    
+    def test_rollups_follow_activity_writes(self):
+        """Test rollups are incremented, moved and decremented with activities"""
+        activity = Activity.objects.get(calories=400)
+        today = timezone.localdate()
+        rollup = DailyActivityRollup.objects.get(user_email='a@example.com', day=today)
+        self.assertEqual((rollup.total_activities, rollup.total_calories), (1, 400))
+        
+        activity.date = activity.date - timedelta(days=2)
+        activity.save()
+        self.assertEqual(
+            DailyActivityRollup.objects.get(user_email='a@example.com', day=today).total_activities, 0
+        )
+        moved = DailyActivityRollup.objects.get(
+            user_email='a@example.com', day=today - timedelta(days=2)
+        )
+        self.assertEqual(moved.total_calories, 400)
+        
+        activity.delete()
+        moved.refresh_from_db()
+        self.assertEqual((moved.total_activities, moved.total_calories), (0, 0))
+    
+    def test_rebuild_rollups_matches_incremental(self):
+        """Test the backfill reproduces the incrementally maintained rollups"""
+        incremental = set(DailyActivityRollup.objects.values_list(
+            'user_email', 'day', 'total_activities', 'total_calories', 'total_duration'
+        ))
+        call_command('rebuild_rollups', stdout=StringIO())
+        rebuilt = set(DailyActivityRollup.objects.values_list(
+            'user_email', 'day', 'total_activities', 'total_calories', 'total_duration'
+        ))
+        self.assertEqual(rebuilt, incremental)
+    
+    def test_rebuild_rollups_rejects_invalid_dates(self):
+        """Test malformed and impossible --from/--to dates raise a CommandError"""
+        from django.core.management.base import CommandError
+        for options in ({'start': 'yesterday'}, {'start': '2024-02-30'}, {'end': '2024-13-01'}):
+            with self.assertRaisesMessage(CommandError, 'Invalid date'):
+                call_command('rebuild_rollups', stdout=StringIO(), **options)
+    
+    def test_migration_backfills_empty_rollups(self):
+        """Test migration 0016 rolls up activities logged before rollups existed"""
+        from django.apps import apps
+        migration = importlib.import_module('octofit_tracker.migrations.0016_backfill_daily_rollups')
+        fields = ('user_email', 'day', 'total_activities', 'total_calories', 'total_duration')
+        incremental = set(DailyActivityRollup.objects.values_list(*fields))
+        DailyActivityRollup.objects.all().delete()
+        migration.backfill_rollups(apps, None)
+        self.assertEqual(set(DailyActivityRollup.objects.values_list(*fields)), incremental)
+    
+    def test_window_standings(self):
+        """Test ?window= ranks only activity inside the window"""
+        url = reverse('leaderboard-list')
+        response = self.client.get(url, {'window': '7d'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        ranked = [(r['user_email'], r['total_calories'], r['rank']) for r in response.data['results']]
+        self.assertEqual(ranked, [('a@example.com', 400, 1), ('b@example.com', 300, 2)])
+        
+        response = self.client.get(url, {'window': '30d'})
+        ranked = [(r['user_email'], r['total_calories']) for r in response.data['results']]
+        self.assertEqual(ranked, [('a@example.com', 500), ('b@example.com', 300)])
+    
+    def test_custom_range(self):
+        """Test ?from=&to= selects an explicit range of days"""
+        today = timezone.localdate()
+        url = reverse('leaderboard-list')
+        response = self.client.get(url, {
+            'from': (today - timedelta(days=25)).isoformat(),
+            'to': (today - timedelta(days=10)).isoformat(),
+        })
+        ranked = [(r['user_email'], r['total_calories']) for r in response.data['results']]
+        self.assertEqual(ranked, [('a@example.com', 100)])
+    
+    def test_window_validators_follow_rollups_and_date(self):
+        """Test moving an activity's day and the date rolling over make windows stale"""
+        url = reverse('leaderboard-list')
+        today = timezone.localdate().isoformat()
+        day = self.client.get(url, {'from': today, 'to': today})
+        self.assertEqual(len(day.data['results']), 1)
+        activity = Activity.objects.get(calories=400)
+        activity.date = activity.date - timedelta(days=5)
+        with self.captureOnCommitCallbacks(execute=True):
+            activity.save()
+        response = self.client.get(url, {'from': today, 'to': today}, HTTP_IF_NONE_MATCH=day['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], [])
+        
+        week = self.client.get(url, {'window': '7d'})
+        self.assertEqual(self.client.get(url, {'window': '7d'}, HTTP_IF_NONE_MATCH=week['ETag']).status_code, 304)
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        with mock.patch('django.utils.timezone.localdate', return_value=tomorrow):
+            response = self.client.get(url, {'window': '7d'}, HTTP_IF_NONE_MATCH=week['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['to'], tomorrow)
+    
+    def test_window_fieldsets(self):
+        """Test ?fields= and ?exclude= trim windowed rows"""
+        url = reverse('leaderboard-list')
+        response = self.client.get(url, {'window': '7d', 'fields': 'rank,user_email,last_updated'})
+        self.assertEqual(response.data['results'], [
+            {'user_email': 'a@example.com', 'rank': 1}, {'user_email': 'b@example.com', 'rank': 2},
+        ])
+        response = self.client.get(url, {'window': '7d', 'exclude': 'team,user_name'})
+        self.assertEqual(list(response.data['results'][0]),
+                         ['user_email', 'total_activities', 'total_calories', 'total_duration', 'rank'])
+        for params in ({'fields': 'id,last_updated'}, {'fields': 'bogus'}):
+            response = self.client.get(url, {'window': '7d', **params})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+    
+    def test_invalid_windows(self):
+        """Test malformed and oversized windows are rejected"""
+        url = reverse('leaderboard-list')
+        for params in ({'window': 'week'}, {'window': '0d'}, {'window': '365d'},
+                       {'from': '2024-01-10', 'to': '2024-01-01'}, {'from': 'yesterday', 'to': '2024-01-01'},
+                       {'from': '2024-02-30', 'to': '2024-03-01'}, {'from': '2024-01-01', 'to': '2024-13-01'}):
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+
+class TeamStandingsTest(APITestCase):
+    """Tests for incrementally maintained team standings"""
+    
+    def setUp(self):
+        Team.objects.create(name='Team Fast')
+        Team.objects.create(name='Team Strong')
+        Team.objects.create(name='Team Idle')
+        for email, team in [
+            ('fast1@example.com', 'Team Fast'),
+            ('fast2@example.com', 'Team Fast'),
+            ('strong@example.com', 'Team Strong'),
+        ]:
+            User.objects.create(email=email, name=email.split('@')[0], password='pass12345', team=team)
+    
+    def create_activity(self, email, calories, duration=30):
+        return Activity.objects.create(
+            user_email=email,
+            user_name=email.split('@')[0],
+            activity_type='Running',
+            duration=duration,
+            calories=calories,
+        )
+    
+    def standings(self):
+        return {
+            standing.team: standing
+            for standing in TeamStanding.objects.all()
+        }
+    
+    def test_activity_writes_update_team_totals(self):
+        """Test team totals, member counts and ranks follow activity writes"""
+        self.create_activity('fast1@example.com', 300)
+        self.create_activity('fast1@example.com', 200)
+        activity = self.create_activity('fast2@example.com', 100)
+        self.create_activity('strong@example.com', 700)
+        standings = self.standings()
+        self.assertEqual(standings['Team Fast'].member_count, 2)
+        self.assertEqual(standings['Team Fast'].total_activities, 3)
+        self.assertEqual(standings['Team Fast'].total_calories, 600)
+        self.assertEqual(standings['Team Fast'].rank, 2)
+        self.assertEqual(standings['Team Strong'].rank, 1)
+        
+        activity.delete()
+        standings = self.standings()
+        self.assertEqual(standings['Team Fast'].total_calories, 500)
+        # Members are the users with activities
+        self.assertEqual(standings['Team Fast'].member_count, 1)
+    
+    def test_rebuild_matches_incremental(self):
+        """Test rebuilding standings reproduces the incremental state"""
+        User.objects.create(email='idle@example.com', name='idle', password='pass12345', team='Team Idle')
+        self.create_activity('fast1@example.com', 300)
+        self.create_activity('fast2@example.com', 100, duration=10)
+        self.create_activity('strong@example.com', 700)
+        self.create_activity('strong@example.com', 50).delete()
+        fields = ('team', 'member_count', 'total_activities', 'total_calories', 'total_duration', 'rank')
+        incremental = set(TeamStanding.objects.values_list(*fields))
+        self.assertIn(('Team Idle', 0, 0, 0, 0, 3), incremental)
+        result = leaderboard.rebuild(dry_run=True)
+        self.assertEqual((result['created'], result['updated'], result['deleted']), ([], [], []))
+        result = leaderboard.rebuild_team_standings()
+        self.assertEqual((result['created'], result['updated']), ([], []))
+        rebuilt = set(TeamStanding.objects.values_list(*fields))
+        self.assertEqual(rebuilt, incremental)
+    
+    def test_team_change_moves_totals(self):
+        """Test a user changing teams moves their totals and membership"""
+        self.create_activity('fast1@example.com', 300)
+        self.create_activity('fast2@example.com', 100, duration=10)
+        self.create_activity('strong@example.com', 350)
+        user = User.objects.get(email='fast1@example.com')
+        user.team = 'Team Idle'
+        user.save()
+        self.assertEqual(LeaderBoard.objects.get(user_email='fast1@example.com').team, 'Team Idle')
+        standings = self.standings()
+        self.assertEqual((standings['Team Fast'].member_count, standings['Team Fast'].total_calories), (1, 100))
+        self.assertEqual((standings['Team Idle'].member_count, standings['Team Idle'].total_calories), (1, 300))
+        self.assertEqual(
+            [(team, standings[team].rank) for team in ('Team Strong', 'Team Idle', 'Team Fast')],
+            [('Team Strong', 1), ('Team Idle', 2), ('Team Fast', 3)],
+        )
+        
+        user.team = None
+        user.save()
+        self.assertEqual(self.standings()['Team Idle'].member_count, 0)
+        user.team = 'Team New'
+        user.save()
+        fields = ('team', 'member_count', 'total_activities', 'total_calories', 'total_duration', 'rank')
+        incremental = set(TeamStanding.objects.values_list(*fields))
+        self.assertIn(('Team New', 1, 1, 300, 30, 2), incremental)
+        result = leaderboard.rebuild_team_standings()
+        self.assertEqual((result['created'], result['updated']), ([], []))
+    
+    def test_migration_seeds_aggregated_standings(self):
+        """Test the standings seeded by migration 0013 match a rebuild"""
+        from django.apps import apps
+        migration = importlib.import_module('octofit_tracker.migrations.0013_seed_team_standings')
+        self.create_activity('fast1@example.com', 300)
+        self.create_activity('fast2@example.com', 100, duration=10)
+        TeamStanding.objects.all().delete()
+        migration.seed_team_standings(apps, None)
+        fields = ('member_count', 'total_activities', 'total_calories', 'total_duration')
+        expected = {
+            team: tuple(standing[field] for field in fields)
+            for team, standing in leaderboard.compute_team_standings().items()
+        }
+        self.assertEqual({team: tuple(getattr(row, field) for field in fields)
+                          for team, row in self.standings().items()}, expected)
+        self.assertEqual(expected['Team Fast'], (2, 2, 400, 40))
+    
+    def test_team_rename_and_delete(self):
+        """Test renaming a team moves its standing and deleting it drops the standing"""
+        self.create_activity('fast1@example.com', 300)
+        self.create_activity('strong@example.com', 200)
+        fast = Team.objects.get(name='Team Fast')
+        fast.name = 'Team Faster'
+        fast.save()
+        standings = self.standings()
+        self.assertNotIn('Team Fast', standings)
+        self.assertEqual((standings['Team Faster'].member_count, standings['Team Faster'].total_calories), (1, 300))
+        self.assertEqual(LeaderBoard.objects.get(user_email='fast1@example.com').team, 'Team Faster')
+        self.assertEqual(User.objects.filter(team='Team Faster').count(), 2)
+        
+        Team.objects.get(name='Team Strong').delete()
+        self.assertNotIn('Team Strong', self.standings())
+        self.assertEqual(LeaderBoard.objects.get(user_email='strong@example.com').team, '')
+        self.assertIsNone(User.objects.get(email='strong@example.com').team)
+        result = leaderboard.rebuild(dry_run=True)
+        self.assertEqual((result['created'], result['updated'], result['deleted']), ([], [], []))
+        result = leaderboard.rebuild_team_standings(dry_run=True)
+        self.assertEqual((result['created'], result['deleted']), ([], []))
+    
+    def test_standings_endpoint(self):
+        """Test the standings endpoint reports averages in rank order"""
+        self.create_activity('fast1@example.com', 300, duration=20)
+        self.create_activity('fast2@example.com', 100, duration=25)
+        self.create_activity('strong@example.com', 250)
+        leaderboard.rebuild_team_standings()
+        response = self.client.get(reverse('team-standings'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['team'] for row in response.data], ['Team Fast', 'Team Strong', 'Team Idle'])
+        fast = response.data[0]
+        self.assertEqual(fast['rank'], 1)
+        self.assertEqual(fast['average_calories'], 200)
+        self.assertEqual(fast['average_duration'], 22.5)
+        self.assertEqual(response.data[2]['average_calories'], 0)
+    
+    def test_team_deltas_batched(self):
+        """Test team maintenance does not grow with the number of members"""
+        url = reverse('activity-bulk')
+        item = {'user_name': 'x', 'activity_type': 'Running', 'duration': 10, 'calories': 50}
+        emails = ['fast1@example.com', 'fast2@example.com']
+        self.client.post(url, [dict(item, user_email=email) for email in emails], format='json')
+        with CaptureQueriesContext(connection) as small:
+            self.client.post(url, [dict(item, user_email=emails[0])], format='json')
+        with CaptureQueriesContext(connection) as large:
+            self.client.post(url, [dict(item, user_email=email) for email in emails * 10], format='json')
+        count = lambda queries: sum('team_standings' in q['sql'] for q in queries.captured_queries)
+        self.assertEqual(count(small), count(large))
+
+
+class TeamMembersTest(APITestCase):
+    """Tests for ?expand=members on teams and membership reconciliation"""
+    
+    def setUp(self):
+        cache.clear()
+        for email, team in [('ann@example.com', 'Alpha'), ('bob@example.com', 'Alpha'), ('cy@example.com', 'Beta')]:
+            User.objects.create(email=email, name=email.split('@')[0].title(), password='pass12345', team=team)
+        Activity.objects.create(
+            user_email='ann@example.com', user_name='Ann', activity_type='Running', duration=30, calories=300,
+        )
+        self.alpha = Team.objects.create(name='Alpha', members=['ann@example.com', 'bob@example.com', 'ghost@example.com'])
+        Team.objects.create(name='Beta', members=['cy@example.com'])
+    
+    def test_expand_members(self):
+        """Test members are replaced by user details and leaderboard totals"""
+        response = self.client.get(reverse('team-detail', args=[self.alpha.id]), {'expand': 'members'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        ann, bob, ghost = response.data['members']
+        self.assertEqual((ann['email'], ann['name'], ann['team']), ('ann@example.com', 'Ann', 'Alpha'))
+        self.assertEqual((ann['total_activities'], ann['total_calories'], ann['rank']), (1, 300, 1))
+        self.assertEqual(bob['name'], 'Bob')
+        self.assertIsNone(bob['total_calories'])
+        self.assertEqual(ghost, {'email': 'ghost@example.com', 'name': None, 'team': None,
+                                 'total_activities': None, 'total_calories': None,
+                                 'total_duration': None, 'rank': None})
+        plain = self.client.get(reverse('team-detail', args=[self.alpha.id]))
+        self.assertEqual(plain.data['members'], self.alpha.members)
+    
+    def test_expand_ignores_malformed_members(self):
+        """Test non-list members and non-string entries expand to nothing"""
+        Team.objects.create(name='Gamma', members='cy@example.com')
+        Team.objects.create(name='Delta', members=[{'email': 'ann@example.com'}, 'cy@example.com', 7])
+        response = self.client.get(reverse('team-list'), {'expand': 'members'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        expanded = {team['name']: [member['email'] for member in team['members']] for team in response.data}
+        self.assertEqual(expanded['Gamma'], [])
+        self.assertEqual(expanded['Delta'], ['cy@example.com'])
+        gamma = Team.objects.get(name='Gamma')
+        response = self.client.get(reverse('team-detail', args=[gamma.id]), {'expand': 'members'})
+        self.assertEqual(response.data['members'], [])
+    
+    def test_list_expansion_uses_constant_queries(self):
+        """Test expanding every team's members costs the same with more teams"""
+        url = reverse('team-list')
+        with CaptureQueriesContext(connection) as few:
+            response = self.client.get(url, {'expand': 'members'})
+        self.assertEqual([len(team['members']) for team in response.data], [3, 1])
+        for index in range(10):
+            email = f'member{index}@example.com'
+            User.objects.create(email=email, name=f'Member {index}', password='pass12345', team=f'Team {index}')
+            Team.objects.create(name=f'Team {index}', members=[email, 'ann@example.com'])
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(url, {'expand': 'members'})
+        self.assertEqual(len(response.data), 12)
+        self.assertEqual(len(many.captured_queries), len(few.captured_queries))
+        # Change versions, teams, then users and leaderboard entries
+        self.assertEqual(len(few.captured_queries), 4)
+    
+    def test_expansion_options(self):
+        """Test unknown expansions are rejected and fieldsets skip the lookup"""
+        url = reverse('team-list')
+        response = self.client.get(url, {'expand': 'coaches'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('Available expansions: members', response.data['error'])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'expand': 'members', 'fields': 'name'})
+        self.assertEqual(response.data[0], {'name': 'Alpha'})
+        # Change versions and teams only
+        self.assertEqual(len(queries.captured_queries), 2)
+    
+    def test_expanded_validators_follow_users(self):
+        """Test user writes make expanded team responses stale"""
+        url = reverse('team-list')
+        expanded = self.client.get(url, {'expand': 'members'})['ETag']
+        plain = self.client.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.filter(email='bob@example.com').get().save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=plain).status_code, status.HTTP_304_NOT_MODIFIED)
+        response = self.client.get(url, {'expand': 'members'}, HTTP_IF_NONE_MATCH=expanded)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+    
+    def test_reconcile_team_members(self):
+        """Test Team.members is rewritten from User.team in batches"""
+        User.objects.create(email='dee@example.com', name='Dee', password='pass12345', team='Alpha')
+        User.objects.create(email='eve@example.com', name='Eve', password='pass12345', team='Gamma')
+        out = StringIO()
+        call_command('reconcile_team_members', '--dry-run', stdout=out)
+        self.assertIn('~ Alpha: +dee@example.com, -ghost@example.com', out.getvalue())
+        self.assertIn('? Gamma: 1 user(s)', out.getvalue())
+        self.alpha.refresh_from_db()
+        self.assertIn('ghost@example.com', self.alpha.members)
+        
+        out = StringIO()
+        call_command('reconcile_team_members', '--batch-size', '1', stdout=out)
+        self.assertIn('Updated 1 team(s); 1 unchanged, 1 unknown team name(s)', out.getvalue())
+        self.alpha.refresh_from_db()
+        self.assertEqual(self.alpha.members, ['ann@example.com', 'bob@example.com', 'dee@example.com'])
+        self.assertEqual(Team.objects.get(name='Beta').members, ['cy@example.com'])
+        self.assertEqual(members.reconcile()['updated'], [])
+
+
+class SearchIndexTest(APITestCase):
+    """Tests for the token index behind ?search="""
+    
+    def setUp(self):
+        self.morning = Activity.objects.create(
+            user_email='ana@example.com', user_name='Ana Sousa', activity_type='Running',
+            duration=30, calories=300, notes='Morning run by the river',
+        )
+        self.evening = Activity.objects.create(
+            user_email='rui@example.com', user_name='Rui Costa', activity_type='Cycling',
+            duration=60, calories=500, notes='Évening ride after running errands',
+        )
+        self.yoga = Activity.objects.create(
+            user_email='ines@example.com', user_name='Inês Run', activity_type='Yoga',
+            duration=45, calories=150, notes='Stretching',
+        )
+        Workout.objects.create(
+            title='Hill Sprints', description='Short uphill runs', difficulty='Advanced',
+            duration=30, calories_estimate=400, activity_type='Running',
+        )
+    
+    def search_ids(self, query, **params):
+        response = self.client.get(reverse('activity-list'), {'search': query, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['id'] for item in response.data['results']]
+    
+    def test_tokenize(self):
+        """Test tokens are lowercase and accent-folded"""
+        self.assertEqual(search.tokenize('Évening RIDE, São-Paulo_2'), ['evening', 'ride', 'sao', 'paulo', '2'])
+    
+    def test_prefix_matching_and_ranking(self):
+        """Test every term must prefix-match and stronger fields rank first"""
+        # "running" is the activity type of one (weight 3) and a note word of
+        # another (weight 1); "run" prefixes both plus the name "Run"
+        self.assertEqual(self.search_ids('running'), [self.morning.id, self.evening.id])
+        self.assertEqual(set(self.search_ids('run')), {self.morning.id, self.evening.id, self.yoga.id})
+        self.assertEqual(self.search_ids('ines run'), [self.yoga.id])
+        self.assertEqual(self.search_ids('evening'), [self.evening.id])
+        self.assertEqual(self.search_ids('nothing'), [])
+        # A LIKE prefix, not a range bound whose order depends on the collation
+        self.assertIn('LIKE', str(search.ranked_matches(Activity, 'run').query))
+    
+    def test_explicit_ordering_and_pages(self):
+        """Test ?ordering= overrides relevance and cursor pages follow ranks"""
+        self.assertEqual(self.search_ids('run', ordering='calories'), [self.yoga.id, self.morning.id, self.evening.id])
+        response = self.client.get(reverse('activity-list'), {'search': 'run', 'page_size': 1})
+        seen = [item['id'] for item in response.data['results']]
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            seen += [item['id'] for item in response.data['results']]
+        self.assertEqual(seen, self.search_ids('run'))
+    
+    def test_index_follows_writes(self):
+        """Test saves and deletes update the index"""
+        self.yoga.notes = 'Sunset meditation'
+        self.yoga.save()
+        self.assertEqual(self.search_ids('sunset'), [self.yoga.id])
+        self.assertEqual(self.search_ids('stretching'), [])
+        self.yoga.delete()
+        self.assertEqual(self.search_ids('sunset'), [])
+        self.assertFalse(SearchToken.objects.filter(kind='activity', object_id=self.yoga.id).exists())
+    
+    def test_token_deletes_are_single_statements(self):
+        """Test removing tokens deletes without loading the rows first"""
+        with CaptureQueriesContext(connection) as queries:
+            search.remove_objects(Activity, [self.morning.id, self.evening.id])
+        self.assertEqual(len(queries.captured_queries), 1)
+        self.assertTrue(queries.captured_queries[0]['sql'].startswith('DELETE'))
+        self.assertFalse(SearchToken.objects.filter(kind='activity', object_id=self.morning.id).exists())
+    
+    def test_bulk_and_rebuild(self):
+        """Test bulk inserts are indexed and the rebuild command reproduces the index"""
+        self.client.post(reverse('activity-bulk'), [{
+            'user_email': 'bulk@example.com', 'user_name': 'Bulk', 'activity_type': 'Rowing',
+            'duration': 20, 'calories': 200,
+        }], format='json')
+        self.assertEqual(len(self.search_ids('rowing')), 1)
+        incremental = set(SearchToken.objects.values_list('kind', 'object_id', 'token', 'weight'))
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('search tokens for workouts', out.getvalue())
+        self.assertEqual(set(SearchToken.objects.values_list('kind', 'object_id', 'token', 'weight')), incremental)
+    
+    def test_migration_backfills_empty_index(self):
+        """Test migration 0015 indexes objects written before the index existed"""
+        from django.apps import apps
+        migration = importlib.import_module('octofit_tracker.migrations.0015_backfill_search_tokens')
+        fields = ('kind', 'object_id', 'token', 'weight')
+        incremental = set(SearchToken.objects.values_list(*fields))
+        SearchToken.objects.filter(kind='activity').delete()
+        migration.backfill_search_tokens(apps, None)
+        self.assertEqual(set(SearchToken.objects.values_list(*fields)), incremental)
+        self.assertEqual(self.search_ids('river'), [self.morning.id])
+    
+    def test_workout_search(self):
+        """Test workouts are searched through the index"""
+        response = self.client.get(reverse('workout-list'), {'search': 'uphill'})
+        self.assertEqual([item['title'] for item in response.data], ['Hill Sprints'])
+        response = self.client.get(reverse('workout-list'), {'search': 'hill beginner'})
+        self.assertEqual(response.data, [])
+
+
+@skipUnless(recommendations.available(), 'numpy is not installed')
+class WorkoutRecommendationTest(APITestCase):
+    """Tests for personalized workout recommendations"""
+    
+    def setUp(self):
+        User.objects.create(email='runner@example.com', name='Runner', password='runpass123')
+        User.objects.create(email='new@example.com', name='New', password='newpass123')
+        # Bump the workouts version, so no catalog of an earlier test is reused
+        with self.captureOnCommitCallbacks(execute=True):
+            self.run = Workout.objects.create(
+                title='Tempo Run', description='Steady run', difficulty='Intermediate',
+                duration=45, calories_estimate=450, activity_type='Running',
+            )
+            self.yoga = Workout.objects.create(
+                title='Gentle Yoga', description='Easy flow', difficulty='Beginner',
+                duration=30, calories_estimate=100, activity_type='Yoga',
+            )
+            self.lift = Workout.objects.create(
+                title='Heavy Lifting', description='Strength', difficulty='Advanced',
+                duration=75, calories_estimate=500, activity_type='Weightlifting',
+            )
+        for days_ago in range(6):
+            Activity.objects.create(
+                user_email='runner@example.com', user_name='Runner', activity_type='Running',
+                duration=45, calories=470, date=timezone.now() - timedelta(days=days_ago),
+            )
+        self.url = reverse('workout-recommended')
+    
+    def titles(self, response):
+        return [item['title'] for item in response.data['results']]
+    
+    def test_scores_follow_history(self):
+        """Test running history favours running and new users get easy workouts"""
+        response = self.client.get(self.url, {'email': 'runner@example.com'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.titles(response)[0], 'Tempo Run')
+        scores = [item['score'] for item in response.data['results']]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        response = self.client.get(self.url, {'email': 'new@example.com', 'limit': 1})
+        self.assertEqual(self.titles(response), ['Gentle Yoga'])
+    
+    def test_batch_scores_match_single(self):
+        """Test batch scoring ranks every user like the live path"""
+        current = recommendations.catalog()
+        recent = recommendations.history(['runner@example.com', 'new@example.com'])
+        profiles = [recommendations.profile(current, recent.get(email, {})) for email in ['runner@example.com', 'new@example.com']]
+        batch = current.score_many(
+            numpy.array([mix for mix, _ in profiles]), numpy.array([numeric for _, numeric in profiles])
+        )
+        for row, (mix, numeric) in zip(batch, profiles):
+            numpy.testing.assert_allclose(row, current.score(mix, numeric))
+    
+    def test_precomputed_table(self):
+        """Test nightly results are served until the catalog changes"""
+        out = StringIO()
+        call_command('recommend_workouts', stdout=out)
+        self.assertIn('for 2 users', out.getvalue())
+        self.assertEqual(WorkoutRecommendation.objects.filter(user_email='runner@example.com').count(), 3)
+        stored = WorkoutRecommendation.objects.filter(user_email='runner@example.com', rank=1).get()
+        response = self.client.get(self.url, {'email': 'runner@example.com'})
+        self.assertEqual(response.data['computed_at'], stored.computed_at)
+        self.assertEqual(response.data['results'][0]['id'], stored.workout_id)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.run.delete()
+        response = self.client.get(self.url, {'email': 'runner@example.com'})
+        self.assertNotEqual(response.data['computed_at'], stored.computed_at)
+        self.assertNotIn('Tempo Run', self.titles(response))
+    
+    def test_precomputed_table_survives_restart(self):
+        """Test stored results are checked against the database, not the local cache"""
+        call_command('recommend_workouts', stdout=StringIO())
+        stored = WorkoutRecommendation.objects.filter(user_email='runner@example.com', rank=1).get()
+        # A fresh process starts with an empty cache
+        cache.clear()
+        response = self.client.get(self.url, {'email': 'runner@example.com'})
+        self.assertEqual(response.data['computed_at'], stored.computed_at)
+        
+        # A workout write made by another process
+        ChangeVersion.objects.filter(namespace='workouts').update(version=F('version') + 1)
+        response = self.client.get(self.url, {'email': 'runner@example.com'})
+        self.assertNotEqual(response.data['computed_at'], stored.computed_at)
+    
+    def test_validation(self):
+        """Test missing emails, unknown users and bad limits are rejected"""
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(self.url, {'email': 'nobody@example.com'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(self.url, {'email': 'runner@example.com', 'limit': 'many'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(self.url, {'email': 'runner@example.com', 'limit': 1000})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ActivityBulkAPITest(APITestCase):
+    """API tests for bulk activity ingest"""
+    
+    def item(self, email='bulk@example.com', calories=100, **kwargs):
+        data = {
+            'user_email': email,
+            'user_name': 'Bulk User',
+            'activity_type': 'Cycling',
+            'duration': 20,
+            'calories': calories,
+        }
+        data.update(kwargs)
+        return data
+    
+    def test_bulk_json_with_item_errors(self):
+        """Test valid items are inserted and invalid ones reported by index"""
+        url = reverse('activity-bulk')
+        items = [self.item(), self.item(calories='lots'), self.item(calories=200),
+                 self.item(email='other@example.com', calories=50)]
+        response = self.client.post(url, items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([c['index'] for c in response.data['created']], [0, 2, 3])
+        self.assertEqual(response.data['errors'][0]['index'], 1)
+        self.assertIn('calories', response.data['errors'][0]['errors'])
+        self.assertEqual(Activity.objects.count(), 3)
+        
+        entry = LeaderBoard.objects.get(user_email='bulk@example.com')
+        self.assertEqual((entry.total_activities, entry.total_calories, entry.rank), (2, 300, 1))
+        self.assertEqual(LeaderBoard.objects.get(user_email='other@example.com').rank, 2)
+    
+    def test_bulk_ndjson(self):
+        """Test an NDJSON body is accepted"""
+        url = reverse('activity-bulk')
+        body = '\n'.join(json.dumps(self.item(calories=c)) for c in (10, 20, 30)) + '\n'
+        response = self.client.post(url, body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data['created']), 3)
+        self.assertEqual(LeaderBoard.objects.get(user_email='bulk@example.com').total_calories, 60)
+    
+    def test_bulk_ndjson_invalid_encoding(self):
+        """Test bytes that are not valid in the charset are a 400"""
+        url = reverse('activity-bulk')
+        body = json.dumps(self.item()).encode() + b'\n\xff\xfe\n'
+        response = self.client.post(url, body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('line 2', response.data['detail'])
+        self.assertEqual(Activity.objects.count(), 0)
+    
+    def test_bulk_rejects_non_list(self):
+        """Test a single object is rejected"""
+        url = reverse('activity-bulk')
+        response = self.client.post(url, self.item(), format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_bulk_leaderboard_queries_per_user(self):
+        """Test leaderboard work does not grow with the number of activities"""
+        url = reverse('activity-bulk')
+        self.client.post(url, [self.item()], format='json')
+        with CaptureQueriesContext(connection) as small:
+            self.client.post(url, [self.item()], format='json')
+        with CaptureQueriesContext(connection) as large:
+            self.client.post(url, [self.item() for _ in range(50)], format='json')
+        # Search tokens are inserted in batches bounded by the database's
+        # parameter limit, so only the leaderboard side is constant
+        count = lambda queries: sum(
+            not q['sql'].startswith('INSERT INTO "search_tokens"') for q in queries.captured_queries
+        )
+        self.assertEqual(count(small), count(large))
+
+
+class FastListSerializationTest(APITestCase):
+    """Tests for the read-only list serialization fast path"""
+    
+    def setUp(self):
+        User.objects.create(email='fast@example.com', name='Fast', password='pass12345', team='Team Fast')
+        now = timezone.now().replace(microsecond=123456)
+        for index in range(5):
+            Activity.objects.create(
+                user_email='fast@example.com' if index % 2 else f'user{index}@example.com',
+                user_name=f'User {index}',
+                activity_type='Running' if index % 2 else 'Yoga',
+                duration=30 + index,
+                calories=200 + 50 * index,
+                distance=5.25 if index % 2 else None,
+                date=now - timedelta(hours=index),
+                notes='' if index else 'First',
+            )
+    
+    def get_both(self, url, data=None):
+        """Return the response bodies with and without the fast path"""
+        cache.clear()
+        fast = self.client.get(url, data)
+        cache.clear()
+        with override_settings(FAST_LIST_SERIALIZATION=False):
+            slow = self.client.get(url, data)
+        self.assertEqual(fast.status_code, status.HTTP_200_OK)
+        return fast.content, slow.content
+    
+    def test_output_is_identical(self):
+        """Test list endpoints render the same bytes through both paths"""
+        for url, data in [
+            (reverse('activity-list'), None),
+            (reverse('activity-list'), {'page_size': 2, 'ordering': '-calories'}),
+            (reverse('activity-by-user'), {'email': 'fast@example.com'}),
+            (reverse('activity-by-type'), {'type': 'Yoga'}),
+            (reverse('leaderboard-list'), None),
+            (reverse('leaderboard-list'), {'search': 'fast'}),
+            (reverse('leaderboard-top'), {'limit': 3}),
+            (reverse('leaderboard-by-team'), {'team': 'Team Fast'}),
+        ]:
+            fast, slow = self.get_both(url, data)
+            self.assertEqual(fast, slow, url)
+    
+    def test_cursor_pages_follow(self):
+        """Test cursor pagination works on rows fetched as dicts"""
+        url = reverse('activity-list')
+        response = self.client.get(url, {'page_size': 2})
+        seen = [item['id'] for item in response.data['results']]
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            seen += [item['id'] for item in response.data['results']]
+        self.assertEqual(sorted(seen), sorted(Activity.objects.values_list('id', flat=True)))
+    
+    def test_unsupported_serializers_fall_back(self):
+        """Test serializers with computed fields are not compiled"""
+        from .fastpath import compile_serializer
+        from .serializers import ActivitySerializer, TeamStandingSerializer, UserSerializer
+        self.assertIsNone(compile_serializer(TeamStandingSerializer))
+        self.assertNotIn('password', compile_serializer(UserSerializer).columns)
+        result = benchmarks.compare_serialization(ActivitySerializer, Activity.objects.order_by('id'), repeat=1)
+        self.assertEqual(result['rows'], 5)
+        self.assertTrue(result['identical'])
+
+
+class AsyncReadEndpointTest(APITransactionTestCase):
+    """
+    Tests for the async read endpoints served under ASGI. Their queries
+    run on pool threads with connections of their own, which only see
+    committed data.
+    """
+    
+    def setUp(self):
+        cache.clear()
+        User.objects.create(email='async@example.com', name='Async', password='pass12345', team='Team Async')
+        now = timezone.now().replace(microsecond=654321)
+        for index in range(5):
+            Activity.objects.create(
+                user_email='async@example.com', user_name='Async',
+                activity_type='Running' if index % 2 else 'Yoga',
+                duration=30 + index, calories=200 + 50 * index,
+                date=now - timedelta(hours=index),
+            )
+        Workout.objects.create(
+            title='Tempo Run', description='Steady', activity_type='Running',
+            duration=40, difficulty='Intermediate', calories_estimate=400,
+        )
+    
+    def request_async(self, method, *args, **kwargs):
+        async def send():
+            return await getattr(self.async_client, method)(*args, **kwargs)
+        return async_to_sync(send)()
+    
+    def get_async(self, url, data=None, **headers):
+        return self.request_async('get', url, data, **headers)
+    
+    def test_responses_match_sync_views(self):
+        """Test async endpoints answer with the bytes and headers of the viewsets"""
+        for url, data in [
+            (reverse('leaderboard-top'), {'limit': 3}),
+            (reverse('leaderboard-top'), {'fields': 'rank,user_name'}),
+            (reverse('leaderboard-by-team'), {'team': 'Team Async'}),
+            (reverse('activity-by-user'), {'email': 'async@example.com'}),
+            (reverse('activity-by-user'), {'email': 'async@example.com', 'page_size': 2, 'exclude': 'notes'}),
+            (reverse('workout-list'), None),
+            (reverse('workout-list'), {'fields': 'title'}),
+        ]:
+            # Keep the change versions but store no response data
+            with override_settings(RESPONSE_CACHE_TIMEOUT=0):
+                expected = self.client.get(url, data)
+                actual = self.get_async(url, data)
+            self.assertEqual(actual.status_code, status.HTTP_200_OK, url)
+            self.assertEqual(actual.content, expected.content, url)
+            for header in ('Content-Type', 'ETag', 'Last-Modified', 'Cache-Control', 'Allow'):
+                self.assertEqual(actual[header], expected[header], (url, header))
+            # The viewsets also vary on Cookie because authentication reads
+            # the session; these responses do not depend on it
+            self.assertIn('Accept', actual['Vary'])
+    
+    def test_common_requests_skip_the_viewset(self):
+        """Test supported requests are answered without the sync view"""
+        with mock.patch.object(LeaderBoardViewSet, 'top', side_effect=AssertionError), \
+                mock.patch.object(WorkoutViewSet, 'list', side_effect=AssertionError):
+            self.assertEqual(self.get_async(reverse('leaderboard-top')).status_code, status.HTTP_200_OK)
+            self.assertEqual(self.get_async(reverse('workout-list')).status_code, status.HTTP_200_OK)
+    
+    def test_reads_leave_the_thread_sensitive_executor(self):
+        """Test version lookups and row fetches run on pool threads, not the sync views' thread"""
+        threads = []
+        state = caching.state
+        
+        def recording_state(namespaces):
+            threads.append(threading.current_thread())
+            return state(namespaces)
+        
+        with mock.patch.object(caching, 'state', recording_state):
+            for url, data in [(reverse('leaderboard-top'), None),
+                              (reverse('activity-by-user'), {'email': 'async@example.com'})]:
+                self.assertEqual(self.get_async(url, data).status_code, status.HTTP_200_OK)
+        self.assertEqual(len(threads), 2)
+        # Sync views and the async ORM run on this thread under async_to_sync
+        self.assertNotIn(threading.current_thread(), threads)
+    
+    def test_other_requests_fall_back(self):
+        """Test invalid input, other formats and writes reach the viewset"""
+        response = self.get_async(reverse('leaderboard-by-team'))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.content, self.client.get(reverse('leaderboard-by-team')).content)
+        response = self.get_async(reverse('workout-list'), {'fields': 'bogus'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.get_async(reverse('workout-list'), {'ordering': '-duration'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.get_async(reverse('activity-by-user'), {'email': 'async@example.com'}, accept='text/html')
+        self.assertIn('text/html', response['Content-Type'])
+        response = self.request_async('post', reverse('workout-list'), {
+            'title': 'Flow', 'description': 'Calm', 'activity_type': 'Yoga',
+            'duration': 30, 'difficulty': 'Beginner', 'calories_estimate': 120,
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+    
+    def test_next_page_follows_cursor(self):
+        """Test the first page's cursor link continues through the viewset"""
+        response = self.get_async(reverse('activity-by-user'), {'email': 'async@example.com', 'page_size': 2})
+        page = json.loads(response.content)
+        seen = [item['id'] for item in page['results']]
+        while page['next']:
+            page = json.loads(self.get_async(page['next']).content)
+            seen += [item['id'] for item in page['results']]
+        self.assertEqual(sorted(seen), sorted(Activity.objects.values_list('id', flat=True)))
+    
+    def test_conditional_get_and_shared_cache(self):
+        """Test async endpoints honor validators and share cached responses"""
+        url = reverse('leaderboard-top')
+        etag = self.client.get(url)['ETag']
+        response = self.get_async(url, **{'If-None-Match': etag})
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+        self.assertNotIn('Content-Type', response)
+        before = caching.stats()['LeaderBoardViewSet.top']['hits']
+        self.get_async(url)
+        self.assertEqual(caching.stats()['LeaderBoardViewSet.top']['hits'], before + 1)
+    
+    def test_benchmarked_routes_are_async_only_under_asgi(self):
+        """Test the async routes only apply to ASGI requests"""
+        from django.urls import resolve
+        import asyncio
+        for url_name, _ in benchmarks.ASYNC_ENDPOINTS:
+            view = resolve(reverse(url_name), urlconf='octofit_tracker.async_urls').func
+            self.assertTrue(asyncio.iscoroutinefunction(view), url_name)
+            self.assertFalse(asyncio.iscoroutinefunction(resolve(reverse(url_name)).func), url_name)
+        self.assertEqual(benchmarks.percentile([5, 1, 4, 2, 3], 0.99), 5)
+
+
+class RankWorkerTest(APITestCase):
+    """Tests for leaderboard re-ranking off the request path"""
+    
+    def wait_for(self, condition, timeout=5):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            self.assertLess(time.monotonic(), deadline, 'Timed out waiting for the rank worker')
+            time.sleep(0.01)
+    
+    def add_activity(self, email='ranked@example.com', calories=300):
+        Activity.objects.create(
+            user_email=email, user_name='Ranked', activity_type='Running',
+            duration=30, calories=calories, date=timezone.now(),
+        )
+    
+    def test_sync_mode_ranks_inside_the_write(self):
+        """Test the fallback mode re-ranks before the write returns"""
+        self.add_activity()
+        self.assertEqual(LeaderBoard.objects.get(user_email='ranked@example.com').rank, 1)
+        self.assertEqual(self.client.get(reverse('rank-stats')).data['mode'], 'sync')
+    
+    @override_settings(RANK_WORKER_MODE='background')
+    def test_background_mode_signals_after_commit(self):
+        """Test writes only queue a re-rank, once their transaction commits"""
+        with mock.patch.object(ranking.worker, 'signal') as signal:
+            with self.captureOnCommitCallbacks() as callbacks:
+                self.add_activity()
+                self.add_activity(calories=100)
+            signal.assert_not_called()
+            for callback in callbacks:
+                callback()
+        self.assertEqual(signal.call_count, 2)
+        self.assertIsNone(LeaderBoard.objects.get(user_email='ranked@example.com').rank)
+        
+        worker = ranking.RankWorker()
+        worker.received = 2
+        worker.dirty_since = time.monotonic()
+        worker.flush()
+        self.assertEqual(LeaderBoard.objects.get(user_email='ranked@example.com').rank, 1)
+        stats = worker.stats()
+        self.assertEqual((stats['dirty'], stats['runs'], stats['rows_updated']), (False, 1, 1))
+        self.assertIsNotNone(stats['last_duration_ms'])
+    
+    @override_settings(RANK_WORKER_INTERVAL_SECONDS=0.2)
+    def test_worker_coalesces_signals(self):
+        """Test a burst of signals becomes one re-rank per interval"""
+        worker = ranking.RankWorker()
+        with mock.patch.object(ranking, 'assign_ranks_locked', return_value=4) as assign_ranks:
+            for _ in range(5):
+                worker.signal()
+            self.assertTrue(worker.stats()['dirty'])
+            self.wait_for(lambda: worker.stats()['runs'] == 1)
+            self.assertEqual(assign_ranks.call_count, 1)
+            self.assertFalse(worker.stats()['dirty'])
+            worker.signal()
+            self.wait_for(lambda: worker.stats()['runs'] == 2)
+        stats = worker.stats()
+        self.assertEqual((stats['signals'], stats['rows_updated'], stats['stale_seconds']), (6, 8, 0.0))
+    
+    @override_settings(RANK_WORKER_INTERVAL_SECONDS=0.01)
+    def test_worker_retries_failed_runs(self):
+        """Test a failing re-rank is reported and retried"""
+        worker = ranking.RankWorker()
+        with mock.patch.object(ranking, 'assign_ranks_locked', side_effect=[RuntimeError('locked'), 0]):
+            with self.assertLogs('octofit_tracker.ranking', 'ERROR'):
+                worker.signal()
+                self.wait_for(lambda: worker.stats()['runs'] == 1)
+        self.assertIsNone(worker.stats()['last_error'])
+        self.assertFalse(worker.stats()['dirty'])
+
+
+class RankLockTest(TransactionTestCase):
+    """Tests for serializing worker re-ranks across processes"""
+    
+    def setUp(self):
+        # Unranked entries, so the first re-rank writes both rows
+        for email, calories in [('a@example.com', 300), ('b@example.com', 200)]:
+            LeaderBoard.objects.create(user_email=email, user_name=email, team='Red', total_calories=calories)
+    
+    def ranks(self):
+        return dict(LeaderBoard.objects.values_list('user_email', 'rank'))
+    
+    def test_recompute_reads_and_writes_under_the_lock(self):
+        """Test the sentinel row is locked before the totals are read"""
+        with CaptureQueriesContext(connection) as queries:
+            ranking.RankWorker().recompute()
+        sql = [query['sql'] for query in queries.captured_queries]
+        lock = next(index for index, query in enumerate(sql) if ranking.LOCK_NAMESPACE in query)
+        read = next(index for index, query in enumerate(sql) if 'FROM "leaderboard"' in query)
+        self.assertLess(lock, read)
+        self.assertTrue(ChangeVersion.objects.filter(namespace=ranking.LOCK_NAMESPACE).exists())
+        self.assertEqual(self.ranks(), {'a@example.com': 1, 'b@example.com': 2})
+    
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_concurrent_recomputes_keep_the_newest_ranks(self):
+        """Test a re-rank that read older totals cannot overwrite a later one"""
+        read, resume = threading.Event(), threading.Event()
+        rank_sorted = leaderboard.rank_sorted
+        
+        def pause_after_read(*args, **kwargs):
+            if threading.current_thread().name == 'first-rank':
+                read.set()
+                resume.wait(5)
+            return rank_sorted(*args, **kwargs)
+        
+        def recompute():
+            try:
+                ranking.RankWorker().recompute()
+            finally:
+                connection.close()
+        
+        with mock.patch.object(leaderboard, 'rank_sorted', pause_after_read):
+            older = threading.Thread(target=recompute, name='first-rank')
+            older.start()
+            self.assertTrue(read.wait(5))
+            # Committed after the first run read the totals
+            LeaderBoard.objects.filter(user_email='b@example.com').update(total_calories=900)
+            newer = threading.Thread(target=recompute, name='second-rank')
+            newer.start()
+            newer.join(0.5)
+            self.assertTrue(newer.is_alive(), 'the second re-rank did not wait for the lock')
+            resume.set()
+            older.join(5)
+            newer.join(5)
+        self.assertEqual(self.ranks(), {'a@example.com': 2, 'b@example.com': 1})
+
+
+@override_settings(LEADERBOARD_STREAM_TICK_SECONDS=0.01)
+class LeaderBoardStreamTest(TestCase):
+    """Tests for the Server-Sent Events stream of rank changes"""
+    
+    def setUp(self):
+        for index, (team, calories) in enumerate([('Red', 300), ('Blue', 200), ('Red', 100)]):
+            LeaderBoard.objects.create(
+                user_email=f'user{index}@example.com', user_name=f'User {index}', team=team,
+                total_activities=1, total_calories=calories, total_duration=30,
+            )
+        leaderboard.assign_ranks()
+    
+    def add_activity(self, email, calories):
+        Activity.objects.create(
+            user_email=email, user_name='User', activity_type='Running',
+            duration=10, calories=calories, date=timezone.now(),
+        )
+    
+    def test_tracker_reports_changed_entries(self):
+        """Test polls report each changed entry once with its previous rank"""
+        tracker = streaming.RankTracker()
+        self.assertEqual(tracker.poll(), [])
+        self.add_activity('user2@example.com', 500)
+        self.add_activity('user2@example.com', 100)
+        changes = {change['user_email']: change for change in tracker.poll()}
+        self.assertEqual(set(changes), {'user0@example.com', 'user1@example.com', 'user2@example.com'})
+        self.assertEqual((changes['user2@example.com']['old_rank'], changes['user2@example.com']['rank']), (3, 1))
+        self.assertEqual(changes['user2@example.com']['total_calories'], 700)
+        self.assertEqual((changes['user0@example.com']['old_rank'], changes['user0@example.com']['rank']), (1, 2))
+        self.assertEqual(tracker.poll(), [])
+    
+    def test_subscriber_filters_and_coalesces(self):
+        """Test team filtering, merging per user and the bounded buffer"""
+        def change(email, team, old_rank, rank):
+            return {'user_email': email, 'team': team, 'old_rank': old_rank, 'rank': rank}
+        
+        subscriber = streaming.Subscriber(team='Red')
+        subscriber.offer([change('a@example.com', 'Red', 5, 4), change('b@example.com', 'Blue', 3, 2)])
+        subscriber.offer([change('a@example.com', 'Red', 4, 2)])
+        self.assertTrue(subscriber.ready.is_set())
+        self.assertEqual(subscriber.take(), ([change('a@example.com', 'Red', 5, 2)], False))
+        self.assertFalse(subscriber.ready.is_set())
+        
+        with override_settings(LEADERBOARD_STREAM_BUFFER=2):
+            subscriber.offer([change(f'{index}@example.com', 'Red', None, index) for index in range(3)])
+        self.assertEqual(subscriber.take(), ([], True))
+    
+    def run_stream(self, query_string=b'', method='GET', until=None, write=None, headers=()):
+        """Run the stream app until a body containing ``until`` arrives, then disconnect"""
+        async def run():
+            nonlocal write
+            received = asyncio.Queue()
+            sent = []
+            arrived = asyncio.Event()
+            
+            async def send(message):
+                sent.append(message)
+                arrived.set()
+            
+            app = streaming.route(None)
+            scope = {
+                'type': 'http', 'method': method, 'path': streaming.STREAM_PATH, 'query_string': query_string,
+                'headers': [(b'host', b'testserver'), *headers],
+            }
+            task = asyncio.ensure_future(app(scope, received.get, send))
+            while until is not None:
+                await asyncio.wait_for(arrived.wait(), timeout=5)
+                arrived.clear()
+                bodies = b''.join(message.get('body', b'') for message in sent)
+                if write is not None and b'retry:' in bodies:
+                    # The first poll has taken its baseline once the stream is open
+                    while streaming.broker.tracker is None or streaming.broker.tracker.entries is None:
+                        await asyncio.sleep(0.01)
+                    await sync_to_async(write)()
+                    write = None
+                if until in bodies:
+                    break
+            await received.put({'type': 'http.disconnect'})
+            await asyncio.wait_for(task, timeout=5)
+            return sent
+        return async_to_sync(run)()
+    
+    def test_streams_rank_changes(self):
+        """Test rank changes of the requested team reach the client as events"""
+        sent = self.run_stream(
+            b'team=Red', until=b'event: ranks',
+            write=lambda: self.add_activity('user2@example.com', 500),
+        )
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream'), sent[0]['headers'])
+        body = b''.join(message.get('body', b'') for message in sent).decode()
+        data = json.loads(body.split('event: ranks\ndata: ')[1].split('\n')[0])
+        self.assertEqual(
+            {(change['user_email'], change['old_rank'], change['rank']) for change in data},
+            {('user2@example.com', 3, 1), ('user0@example.com', 1, 2)},
+        )
+        self.assertEqual(streaming.broker.subscribers, set())
+        self.assertIsNone(streaming.broker.poller)
+    
+    def test_rejects_other_methods_and_excess_clients(self):
+        """Test non-GET requests get a 405 and clients over the limit a 503"""
+        self.assertEqual(self.run_stream(method='POST')[0]['status'], 405)
+        with override_settings(LEADERBOARD_STREAM_MAX_CLIENTS=0):
+            self.assertEqual(self.run_stream()[0]['status'], 503)
+    
+    def test_cors_and_allowed_hosts(self):
+        """Test the stream sends the configured CORS headers and rejects unknown hosts"""
+        origin = [(b'origin', b'https://app.example.com')]
+        sent = self.run_stream(until=b'retry:', headers=origin)
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertIn((b'access-control-allow-origin', b'https://app.example.com'), sent[0]['headers'])
+        self.assertIn((b'access-control-allow-credentials', b'true'), sent[0]['headers'])
+        
+        with override_settings(CORS_ALLOW_ALL_ORIGINS=False, CORS_ALLOWED_ORIGINS=['https://other.example.com']):
+            headers = dict(self.run_stream(until=b'retry:', headers=origin)[0]['headers'])
+        self.assertNotIn(b'access-control-allow-origin', headers)
+        
+        preflight = origin + [(b'access-control-request-method', b'GET')]
+        headers = dict(self.run_stream(method='OPTIONS', headers=preflight)[0]['headers'])
+        self.assertEqual(headers[b'access-control-allow-origin'], b'https://app.example.com')
+        self.assertIn(b'GET', headers[b'access-control-allow-methods'])
+        
+        sent = self.run_stream(headers=[(b'host', b'evil.example.com')])
+        self.assertEqual(sent[0]['status'], 400)
+        self.assertEqual(streaming.broker.subscribers, set())
+
+
+class SparseFieldsetTest(APITestCase):
+    """Tests for ?fields= and ?exclude= on API endpoints"""
+    
+    def setUp(self):
+        for index in range(3):
+            Activity.objects.create(
+                user_email=f'user{index}@example.com',
+                user_name=f'User {index}',
+                activity_type='Running',
+                duration=30,
+                calories=100 * (index + 1),
+                notes='Long notes ' * 20,
+                date=timezone.now() - timedelta(days=index),
+            )
+        Workout.objects.create(
+            title='Plank', description='Core', difficulty='Easy', duration=10,
+            calories_estimate=50, activity_type='Core',
+            equipment_needed=['Mat'], instructions=['Hold'],
+        )
+    
+    def test_fields_trims_response_and_query(self):
+        """Test ?fields= returns and loads only the requested columns"""
+        url = reverse('activity-list')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'fields': 'user_name,activity_type,calories'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [list(item) for item in response.data['results']],
+            [['user_name', 'activity_type', 'calories']] * 3,
+        )
+        sql = queries.captured_queries[-1]['sql']
+        self.assertNotIn('"notes"', sql)
+        self.assertNotIn('"duration"', sql)
+    
+    def test_fields_follow_cursor_pages(self):
+        """Test sparse pages still link to the next page"""
+        url = reverse('activity-list')
+        response = self.client.get(url, {'fields': 'calories', 'page_size': 2})
+        response = self.client.get(response.data['next'])
+        self.assertEqual(response.data['results'], [{'calories': 300}])
+    
+    def test_exclude_defers_columns(self):
+        """Test ?exclude= drops fields without extra queries"""
+        url = reverse('workout-list')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'exclude': 'instructions,equipment_needed'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('instructions', response.data[0])
+        self.assertIn('title', response.data[0])
+        # Change versions and workouts
+        self.assertEqual(len(queries.captured_queries), 2)
+        self.assertNotIn('"instructions"', queries.captured_queries[-1]['sql'])
+    
+    def test_detail_and_actions(self):
+        """Test fieldsets apply to detail routes and custom actions"""
+        activity = Activity.objects.order_by('id').first()
+        response = self.client.get(reverse('activity-detail', args=[activity.id]), {'fields': 'id,calories'})
+        self.assertEqual(response.data, {'id': activity.id, 'calories': 100})
+        response = self.client.get(reverse('activity-by-user'), {'email': 'user1@example.com', 'fields': 'calories'})
+        self.assertEqual(response.data['results'], [{'calories': 200}])
+        response = self.client.get(reverse('leaderboard-top'), {'fields': 'user_email,rank', 'limit': 1})
+        self.assertEqual(response.data, [{'user_email': 'user2@example.com', 'rank': 1}])
+    
+    def test_unknown_fields_rejected(self):
+        """Test unknown or write-only field names return 400"""
+        response = self.client.get(reverse('activity-list'), {'fields': 'calories,colour'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('colour', response.data['error'])
+        response = self.client.get(reverse('user-list'), {'exclude': 'password'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(reverse('activity-list'), {'fields': 'calories', 'exclude': 'calories'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RenderingTest(APITestCase):
+    """Tests for the orjson-backed renderer and gzip compression"""
+    
+    def test_renderer_matches_drf(self):
+        """Test FastJSONRenderer produces the same bytes as JSONRenderer"""
+        from decimal import Decimal
+        from django.utils.translation import gettext_lazy
+        from rest_framework.renderers import JSONRenderer
+        from .renderers import FastJSONRenderer
+        data = {
+            'when': datetime(2024, 1, 2, 3, 4, 5, 678901, tzinfo=timezone.utc),
+            'naive': datetime(2024, 1, 2, 3, 4, 5),
+            'day': datetime(2024, 1, 2).date(),
+            'amount': Decimal('12.50'),
+            'label': gettext_lazy('Running'),
+            'text': 'caf\u00e9 \u2028 line',
+            'nested': [{'a': 1, 'b': None, 'c': 2.5, 'd': True}],
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(
+            FastJSONRenderer().render(data, 'application/json; indent=2'),
+            JSONRenderer().render(data, 'application/json; indent=2'),
+        )
+        with mock.patch('octofit_tracker.renderers.orjson', None):
+            self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+    
+    def create_activities(self, count):
+        Activity.objects.bulk_create([
+            Activity(
+                user_email=f'user{index}@example.com', user_name=f'User {index}',
+                activity_type='Running', duration=30, calories=300,
+            )
+            for index in range(count)
+        ])
+    
+    def test_large_json_responses_are_gzipped(self):
+        """Test JSON bodies above the threshold are compressed"""
+        self.create_activities(50)
+        url = reverse('activity-list')
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertTrue(response['ETag'].startswith('W/'))
+        body = json.loads(gzip.decompress(response.content))
+        self.assertEqual(len(body['results']), 50)
+        
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+    
+    @override_settings(GZIP_MIN_BYTES=100000)
+    def test_small_responses_are_not_gzipped(self):
+        """Test bodies below the threshold are sent as is"""
+        self.create_activities(2)
+        response = self.client.get(reverse('activity-list'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(len(response.data['results']), 2)
+
+
+class ExportAPITest(APITestCase):
+    """API tests for streaming exports"""
+    
+    def setUp(self):
+        now = timezone.now()
+        for email, activity_type, days_ago in [('a@example.com', 'Running', 0),
+                                               ('a@example.com', 'Yoga', 3),
+                                               ('b@example.com', 'Running', 10)]:
+            Activity.objects.create(
+                user_email=email, user_name=email[0].upper(), activity_type=activity_type,
+                duration=30, calories=200, notes='said "hi", then ran',
+                date=now - timedelta(days=days_ago)
+            )
+    
+    def read(self, response):
+        return b''.join(response.streaming_content).decode()
+    
+    def test_csv_export(self):
+        """Test activities stream as CSV matching the serializer fields"""
+        url = reverse('activity-export')
+        response = self.client.get(url, {'format': 'csv'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/csv'))
+        rows = list(csv.DictReader(StringIO(self.read(response))))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0]['notes'], 'said "hi", then ran')
+        api_row = self.client.get(reverse('activity-list')).data['results'][0]
+        self.assertEqual(rows[0]['date'], api_row['date'])
+    
+    def test_ndjson_export_with_filters(self):
+        """Test NDJSON export honors email, type and date filters"""
+        url = reverse('activity-export')
+        since = (timezone.localdate() - timedelta(days=5)).isoformat()
+        response = self.client.get(url, {'format': 'ndjson', 'email': 'a@example.com', 'from': since})
+        rows = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual([r['activity_type'] for r in rows], ['Running', 'Yoga'])
+        
+        response = self.client.get(url, {'format': 'ndjson', 'type': 'Running'})
+        self.assertEqual(len(self.read(response).splitlines()), 2)
+    
+    def test_invalid_date_is_rejected(self):
+        """Test a malformed date returns a 400 in the requested format"""
+        url = reverse('activity-export')
+        for params in ({'to': 'soon'}, {'from': '2024-02-30'}):
+            response = self.client.get(url, {'format': 'ndjson', **params})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+            self.assertIn('error', json.loads(response.content))
+    
+    def test_leaderboard_export(self):
+        """Test the leaderboard streams in rank order"""
+        url = reverse('leaderboard-export')
+        response = self.client.get(url, {'format': 'csv'})
+        rows = list(csv.DictReader(StringIO(self.read(response))))
+        self.assertEqual([r['user_email'] for r in rows], ['a@example.com', 'b@example.com'])
+        self.assertEqual(rows[0]['rank'], '1')
+    
+    def test_export_streams_under_asgi(self):
+        """Test the export body is produced from the view's thread under ASGI"""
+        from django.core.signals import request_finished, request_started
+        from django.db import close_old_connections
+        from .asgi import application
+        
+        async def run():
+            sent = []
+            
+            async def receive():
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            
+            async def send(message):
+                sent.append(message)
+            
+            scope = {
+                'type': 'http', 'method': 'GET', 'path': reverse('activity-export'), 'query_string': b'format=csv',
+                'headers': [(b'host', b'testserver')],
+            }
+            await application(scope, receive, send)
+            return sent
+        
+        # As the test client does, keep the test transaction's connection open
+        request_started.disconnect(close_old_connections)
+        request_finished.disconnect(close_old_connections)
+        try:
+            sent = async_to_sync(run)()
+        finally:
+            request_started.connect(close_old_connections)
+            request_finished.connect(close_old_connections)
+        self.assertEqual(sent[0]['status'], 200)
+        body = b''.join(message.get('body', b'') for message in sent[1:]).decode()
+        rows = list(csv.DictReader(StringIO(body)))
+        self.assertEqual(len(rows), 3)
+        self.assertFalse(sent[-1].get('more_body', False))
+
+
+class PopulateDBGeneratorTest(TestCase):
+    """Tests for the synthetic data mode of populate_db"""
+    
+    def generate(self, **options):
+        defaults = {'users': 30, 'activities_per_user': 6, 'teams': 4, 'seed': 42, 'batch_size': 50}
+        defaults.update(options)
+        call_command('populate_db', stdout=StringIO(), **defaults)
+        return set(Activity.objects.values_list('user_email', 'activity_type', 'duration', 'calories'))
+    
+    def test_generated_counts_and_consistency(self):
+        """Test the generator creates users, teams and a consistent leaderboard"""
+        self.generate()
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Team.objects.count(), 4)
+        self.assertEqual(sum(len(t.members) for t in Team.objects.all()), 30)
+        self.assertGreater(Activity.objects.count(), 30)
+        self.assertEqual(LeaderBoard.objects.count(), 30)
+        result = leaderboard.rebuild(dry_run=True)
+        self.assertEqual((result['created'], result['updated'], result['deleted']), ([], [], []))
+    
+    def test_same_seed_is_reproducible(self):
+        """Test identical options produce identical activities regardless of batching"""
+        first = self.generate()
+        second = self.generate(batch_size=7)
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, self.generate(seed=43))
+
+
+class BenchmarkBudgetTest(APITestCase):
+    """Tests that every endpoint stays within its declared query budget"""
+    
+    def test_endpoints_within_query_budget(self):
+        """Test the benchmark suite passes on a small generated dataset"""
+        call_command('populate_db', users=25, activities_per_user=4, teams=3, seed=1, stdout=StringIO())
+        context = benchmarks.dataset_context()
+        results = benchmarks.run(self.client, context, repeat=2)
+        self.assertEqual(len(results), len(benchmarks.ENDPOINTS))
+        self.assertEqual(benchmarks.check(results), [])
+        # Cached endpoints are counted on their first, uncached request
+        url = reverse('leaderboard-by-team')
+        self.client.get(url, {'team': context['team']}, HTTP_ACCEPT='application/json')
+        with CaptureQueriesContext(connection) as hit:
+            self.client.get(url, {'team': context['team']}, HTTP_ACCEPT='application/json')
+        self.assertGreater(results['leaderboard-by-team']['queries'], len(hit.captured_queries))
+    
+    def test_regression_against_baseline(self):
+        """Test slower timings and extra queries are reported against a baseline"""
+        results = {'x': {'status': 200, 'queries': 2, 'bytes': 10, 'ms': 50.0, 'budget': 3}}
+        baseline = {'x': {'status': 200, 'queries': 1, 'bytes': 10, 'ms': 10.0, 'budget': 3}}
+        self.assertEqual(len(benchmarks.check(results, baseline)), 2)
+        self.assertEqual(benchmarks.check(results, {'x': dict(baseline['x'], queries=2, ms=45.0)}), [])
+
+
+@modify_settings(MIDDLEWARE={'prepend': 'octofit_tracker.middleware.QueryInstrumentationMiddleware'})
+@override_settings(REQUEST_INSTRUMENTATION_REPEAT_THRESHOLD=3)
+class QueryInstrumentationTest(APITestCase):
+    """Tests for the request instrumentation middleware"""
+    
+    def setUp(self):
+        for index in range(3):
+            Team.objects.create(name=f'Team {index}', members=[])
+    
+    def test_server_timing_and_log(self):
+        """Test timings are reported in a header and tagged log line"""
+        with self.assertLogs('octofit_tracker.requests', level='INFO') as logs:
+            response = self.client.get(reverse('team-list'))
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('desc="2 queries"', response['Server-Timing'])
+        self.assertIn('render;dur=', response['Server-Timing'])
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual((record['viewset'], record['action']), ('TeamViewSet', 'list'))
+        self.assertEqual(record['queries'], 2)
+        self.assertEqual(record['n_plus_one_suspects'], [])
+    
+    def test_repeated_queries_flagged(self):
+        """Test repeated identical statements are flagged as N+1 suspects"""
+        original = TeamSerializer.to_representation
+        
+        def lookup_each(serializer, instance):
+            Team.objects.filter(pk=instance.pk).exists()
+            return original(serializer, instance)
+        
+        with mock.patch.object(TeamSerializer, 'to_representation', lookup_each):
+            with self.assertLogs('octofit_tracker.requests', level='WARNING') as logs:
+                self.client.get(reverse('team-list'))
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['queries'], 5)
+        self.assertEqual(record['n_plus_one_suspects'][0]['count'], 3)
+
+
+class ResponseCacheTest(APITestCase):
+    """Tests for the versioned leaderboard and workout response cache"""
+    
+    def setUp(self):
+        cache.clear()
+        for email, calories in [('a@example.com', 500), ('b@example.com', 300)]:
+            Activity.objects.create(
+                user_email=email, user_name=email[0].upper(), activity_type='Running',
+                duration=30, calories=calories
+            )
+    
+    def test_top_is_served_from_cache_until_a_write(self):
+        """Test repeated reads only look up versions and activity writes invalidate"""
+        url = reverse('leaderboard-top')
+        before = caching.stats().get('LeaderBoardViewSet.top', {'hits': 0, 'misses': 0})
+        first = self.client.get(url, {'limit': 5})
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get(url, {'limit': '5'})
+        self.assertEqual(len(queries.captured_queries), 1)
+        self.assertIn('change_versions', queries.captured_queries[0]['sql'])
+        self.assertEqual(first.data, second.data)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            Activity.objects.create(
+                user_email='b@example.com', user_name='B', activity_type='Running',
+                duration=30, calories=900
+            )
+        third = self.client.get(url, {'limit': 5})
+        self.assertEqual(third.data[0]['user_email'], 'b@example.com')
+        after = caching.stats()['LeaderBoardViewSet.top']
+        self.assertEqual(after['hits'] - before['hits'], 1)
+        self.assertEqual(after['misses'] - before['misses'], 2)
+    
+    def test_writes_from_other_processes_invalidate(self):
+        """Test entries follow versions bumped outside this process's cache"""
+        url = reverse('leaderboard-top')
+        self.client.get(url)
+        # Written by a management command, without signals or cache bumps
+        LeaderBoard.objects.filter(user_email='b@example.com').update(rank=0)
+        self.assertEqual(self.client.get(url).data[0]['user_email'], 'a@example.com')
+        ChangeVersion.objects.filter(namespace='leaderboard').update(version=F('version') + 1)
+        self.assertEqual(self.client.get(url).data[0]['user_email'], 'b@example.com')
+    
+    def test_params_are_part_of_the_key(self):
+        """Test different query params are cached separately"""
+        url = reverse('leaderboard-top')
+        self.assertEqual(len(self.client.get(url, {'limit': 1}).data), 1)
+        self.assertEqual(len(self.client.get(url, {'limit': 2}).data), 2)
+    
+    def test_versions_are_bumped_after_commit_and_read_without_writes(self):
+        """Test bumps wait for the writing transaction and reads never write"""
+        ChangeVersion.objects.filter(namespace='coaches').delete()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('coach-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse([q for q in queries.captured_queries if not q['sql'].startswith('SELECT')])
+        self.assertEqual(caching.state(['coaches']), ([0], 0))
+        
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            caching.invalidate('coaches')
+            self.assertEqual(caching.versions(['coaches']), [0])
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(caching.versions(['coaches']), [1])
+    
+    def test_workout_list_invalidated_by_workout_write(self):
+        """Test workout writes invalidate the cached catalog"""
+        url = reverse('workout-list')
+        self.assertEqual(len(self.client.get(url).data), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            Workout.objects.create(
+                title='Cached', description='d', difficulty='Beginner', duration=10,
+                calories_estimate=50, activity_type='Yoga'
+            )
+        self.assertEqual(len(self.client.get(url).data), 1)
+    
+    def test_stats_endpoint(self):
+        """Test hit/miss counters are exposed"""
+        self.client.get(reverse('workout-list'))
+        response = self.client.get(reverse('cache-stats'))
+        self.assertIn('WorkoutViewSet.list', response.data)
+
+
+class ConditionalGetTest(APITestCase):
+    """Tests for ETag and Last-Modified validators"""
+    
+    def setUp(self):
+        cache.clear()
+        self.team = Team.objects.create(name='Etag Team', members=[])
+    
+    def test_if_none_match_returns_304_with_one_query(self):
+        """Test an unchanged list answers 304 with no body after one version lookup"""
+        url = reverse('team-list')
+        response = self.client.get(url)
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        etag = response['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(len(queries.captured_queries), 1)
+        self.assertIn('change_versions', queries.captured_queries[0]['sql'])
+    
+    def test_write_changes_etag(self):
+        """Test a write makes the old validator stale"""
+        url = reverse('team-detail', args=[self.team.id])
+        etag = self.client.get(url)['ETag']
+        self.team.description = 'Changed'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.team.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+    
+    def test_query_params_change_etag(self):
+        """Test different queries of the same data get different validators"""
+        url = reverse('team-list')
+        self.assertNotEqual(self.client.get(url)['ETag'], self.client.get(url, {'search': 'x'})['ETag'])
+    
+    def test_if_modified_since(self):
+        """Test If-Modified-Since is honored"""
+        url = reverse('leaderboard-list')
+        last_modified = self.client.get(url)['Last-Modified']
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE='Mon, 01 Jan 2001 00:00:00 GMT')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+    
+    def test_validators_follow_writes_from_other_processes(self):
+        """Test versions live in the database, not in this process's cache"""
+        url = reverse('team-list')
+        response = self.client.get(url)
+        etag, last_modified = response['ETag'], response['Last-Modified']
+        # A restarted process starts with an empty cache
+        cache.clear()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, status.HTTP_304_NOT_MODIFIED
+        )
+        # A write recorded by another process or a management command
+        ChangeVersion.objects.filter(namespace='teams').update(
+            version=F('version') + 1, modified=timezone.now() + timedelta(seconds=5)
+        )
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, status.HTTP_200_OK)
+    
+    def test_activity_write_invalidates_leaderboard(self):
+        """Test activity writes make cached leaderboard validators stale"""
+        url = reverse('leaderboard-list')
+        etag = self.client.get(url)['ETag']
+        # Versions are bumped once the write commits
+        with self.captureOnCommitCallbacks(execute=True):
+            Activity.objects.create(
+                user_email='e@example.com', user_name='E', activity_type='Yoga', duration=10, calories=50
+            )
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+
+class SettingsProfileTest(TestCase):
+    """Tests for the production settings profile and its startup check"""
+    
+    def load_settings(self, **environ):
+        with mock.patch.dict(os.environ, environ):
+            for name in ('DEBUG', 'DB_CONN_MAX_AGE', 'RANK_WORKER_MODE'):
+                os.environ.pop(name, None)
+            # Executed as a fresh module, leaving the loaded settings alone
+            origin = importlib.util.find_spec('octofit_tracker.settings').origin
+            spec = importlib.util.spec_from_file_location('octofit_tracker_settings_profile', origin)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            return vars(module)
+    
+    def test_production_profile(self):
+        """Test the production profile drops debug-only costs"""
+        production = self.load_settings(SETTINGS_PROFILE='production')
+        self.assertFalse(production['DEBUG'])
+        self.assertEqual(
+            production['REST_FRAMEWORK']['DEFAULT_RENDERER_CLASSES'],
+            ['octofit_tracker.renderers.FastJSONRenderer'],
+        )
+        database = production['DATABASES']['default']
+        self.assertEqual(database['CONN_MAX_AGE'], 60)
+        self.assertTrue(database['CONN_HEALTH_CHECKS'])
+        template_options = production['TEMPLATES'][0]['OPTIONS']
+        self.assertFalse(production['TEMPLATES'][0]['APP_DIRS'])
+        self.assertEqual(template_options['loaders'][0][0], checks.CACHED_LOADER)
+        self.assertEqual(production['RANK_WORKER_MODE'], 'background')
+        
+        development = self.load_settings(SETTINGS_PROFILE='development')
+        self.assertTrue(development['DEBUG'])
+        self.assertEqual(development['DATABASES']['default']['CONN_MAX_AGE'], 0)
+        self.assertEqual(development['RANK_WORKER_MODE'], 'sync')
+        with self.assertRaises(ImproperlyConfigured):
+            self.load_settings(SETTINGS_PROFILE='staging')
+    
+    def test_production_profile_passes_its_check(self):
+        """Test the production settings themselves raise no check errors"""
+        production = self.load_settings(SETTINGS_PROFILE='production')
+        with override_settings(
+            SETTINGS_PROFILE='production', DEBUG=production['DEBUG'],
+            REST_FRAMEWORK=production['REST_FRAMEWORK'], TEMPLATES=production['TEMPLATES'],
+        ):
+            self.assertEqual(checks.profile_issues(), [])
+            checks.verify_profile()
+    
+    @override_settings(
+        SETTINGS_PROFILE='production', DEBUG=True, REQUEST_INSTRUMENTATION=True,
+        TEMPLATES=[{
+            'BACKEND': 'django.template.backends.django.DjangoTemplates',
+            'OPTIONS': {'loaders': ['django.template.loaders.app_directories.Loader']},
+        }],
+    )
+    def test_debug_costs_refuse_to_start(self):
+        """Test debug-only costs are errors in the production profile"""
+        issues = checks.profile_issues()
+        self.assertEqual(
+            [issue.id for issue in issues],
+            ['octofit_tracker.E001', 'octofit_tracker.E002', 'octofit_tracker.E003', 'octofit_tracker.W001'],
+        )
+        with self.assertRaisesMessage(ImproperlyConfigured, 'octofit_tracker.E002'):
+            checks.verify_profile()
+        with override_settings(SETTINGS_PROFILE='development'):
+            self.assertEqual(checks.profile_issues(), [])
@@ -21,7 +21,7 @@ from rest_framework.response import Response
 from rest_framework.reverse import reverse
 from .views import (
     UserViewSet, TeamViewSet, ActivityViewSet,
-    LeaderBoardViewSet, WorkoutViewSet, CoachViewSet
+    LeaderBoardViewSet, WorkoutViewSet, CoachViewSet, cache_stats, rank_stats
 )
 
 
@@ -64,6 +64,8 @@ router.register(r'coaches', CoachViewSet, basename='coach')
 
 urlpatterns = [
     path('', api_root, name='api-root'),
+    path('api/cache-stats/', cache_stats, name='cache-stats'),
+    path('api/rank-stats/', rank_stats, name='rank-stats'),
     path('api/', include(router.urls)),
     path('admin/', admin.site.urls),
 ]
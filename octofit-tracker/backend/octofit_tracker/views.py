@@ -1,19 +1,64 @@
-from rest_framework import viewsets, filters
-from rest_framework.decorators import action
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework import viewsets, filters, serializers, status
+from rest_framework.decorators import action, api_view
+from rest_framework.parsers import JSONParser
 from rest_framework.response import Response
-from .models import User, Team, Activity, LeaderBoard, Workout, Coach
+from .models import User, Team, Activity, LeaderBoard, TeamStanding, Workout, Coach
+from . import caching, distribution, leaderboard, ranking, recommendations, search
+from .exports import CSVRenderer, NDJSONRenderer, export_response
+from .fastpath import FastListMixin
+from .fieldsets import SparseFieldsetMixin, resolve_expansions
+from .pagination import ActivityCursorPagination
+from .parsers import NDJSONParser
 from .serializers import (
     UserSerializer, TeamSerializer, ActivitySerializer,
-    LeaderBoardSerializer, WorkoutSerializer, CoachSerializer
+    LeaderBoardSerializer, TeamStandingSerializer, WorkoutSerializer, CoachSerializer
 )
 
 
-class UserViewSet(viewsets.ModelViewSet):
+def bounded_int(params, name, default, minimum, maximum):
+    """Return the integer query param ``name``, or None if it is not within the bounds"""
+    try:
+        value = int(params.get(name, default))
+    except ValueError:
+        return None
+    return value if minimum <= value <= maximum else None
+
+
+def query_date(params, name):
+    """Return the YYYY-MM-DD query param ``name`` as a date, or None if it is not a valid date"""
+    try:
+        return parse_date(params.get(name, ''))
+    except ValueError:
+        # Well formed but impossible, e.g. 2024-02-30
+        return None
+
+
+@api_view(['GET'])
+def cache_stats(request):
+    """Response cache hit and miss counts for this server process"""
+    return Response(caching.stats())
+
+
+@api_view(['GET'])
+def rank_stats(request):
+    """Staleness and last-run timing of leaderboard rank maintenance in this process"""
+    return Response(ranking.stats())
+
+
+class UserViewSet(caching.ConditionalGetMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     """
     API endpoint for users
     """
     queryset = User.objects.all()
     serializer_class = UserSerializer
+    change_namespaces = ('users',)
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['name', 'email', 'team']
     ordering_fields = ['created_at', 'name']
@@ -23,47 +68,155 @@ class UserViewSet(viewsets.ModelViewSet):
         """Get users by team"""
         team = request.query_params.get('team', None)
         if team:
-            users = User.objects.filter(team=team)
+            users = self.sparse_queryset(User.objects.filter(team=team))
             serializer = self.get_serializer(users, many=True)
             return Response(serializer.data)
         return Response({'error': 'Team parameter is required'}, status=400)
 
 
-class TeamViewSet(viewsets.ModelViewSet):
+class TeamViewSet(caching.ConditionalGetMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     """
     API endpoint for teams
     """
     queryset = Team.objects.all()
     serializer_class = TeamSerializer
+    change_namespaces = ('teams',)
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['name', 'description']
     ordering_fields = ['created_at', 'name']
+    expandable = ('members',)
+    
+    def initial(self, request, *args, **kwargs):
+        # ?expand=members embeds user names and leaderboard totals, so the
+        # response also changes with those
+        self.expand = ()
+        if request.method in ('GET', 'HEAD') and self.action in ('list', 'retrieve'):
+            self.expand = resolve_expansions(request.query_params, self.expandable)
+            if 'members' in self.expand:
+                self.change_namespaces = (*self.change_namespaces, 'users', 'leaderboard')
+        super().initial(request, *args, **kwargs)
+    
+    def get_serializer_context(self):
+        return {**super().get_serializer_context(), 'expand': getattr(self, 'expand', ())}
+    
+    def get_serializer_class(self):
+        if self.action == 'standings':
+            return TeamStandingSerializer
+        return super().get_serializer_class()
     
     @action(detail=True, methods=['get'])
     def members(self, request, pk=None):
         """Get team members"""
         team = self.get_object()
         return Response({'members': team.members})
+    
+    @action(detail=False, methods=['get'], change_namespaces=('teams', 'leaderboard'))
+    def standings(self, request):
+        """Get team totals, per-member averages and ranks"""
+        standings = self.sparse_queryset(TeamStanding.objects.order_by('rank', 'team'))
+        serializer = self.get_serializer(standings, many=True)
+        return Response(serializer.data)
 
 
-class ActivityViewSet(viewsets.ModelViewSet):
+class ActivityViewSet(caching.ConditionalGetMixin, SparseFieldsetMixin, FastListMixin, viewsets.ModelViewSet):
     """
     API endpoint for activities
     """
     queryset = Activity.objects.all()
     serializer_class = ActivitySerializer
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
-    search_fields = ['user_name', 'user_email', 'activity_type']
+    change_namespaces = ('activities',)
+    fast_list = True
+    pagination_class = ActivityCursorPagination
+    filter_backends = [search.IndexedSearchFilter, filters.OrderingFilter]
+    search_fields = list(search.INDEXED_FIELDS[Activity])
     ordering_fields = ['date', 'calories', 'duration']
+    ordering = ActivityCursorPagination.ordering
+    
+    # Leaderboard deltas are applied by signal handlers; run them in the
+    # same transaction as the activity write itself.
+    @transaction.atomic
+    def perform_create(self, serializer):
+        serializer.save()
+    
+    @transaction.atomic
+    def perform_update(self, serializer):
+        serializer.save()
+    
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        instance.delete()
+    
+    @action(detail=False, methods=['post'], parser_classes=[JSONParser, NDJSONParser])
+    def bulk(self, request):
+        """
+        Create many activities from a JSON array or an NDJSON body.
+        
+        Every item is validated; valid ones are inserted with batched
+        ``bulk_create`` and invalid ones are reported by index without
+        failing the rest. Leaderboard totals are updated once per user.
+        """
+        items = request.data
+        if not isinstance(items, list):
+            return Response({'error': 'Expected a list of activities'}, status=400)
+        max_items = settings.ACTIVITY_BULK_MAX_ITEMS
+        if len(items) > max_items:
+            return Response({'error': f'At most {max_items} activities per request'}, status=400)
+        
+        child = self.get_serializer()
+        activities, indexes, errors = [], [], []
+        for index, item in enumerate(items):
+            try:
+                activities.append(Activity(**child.run_validation(item)))
+                indexes.append(index)
+            except serializers.ValidationError as exc:
+                errors.append({'index': index, 'errors': exc.detail})
+        
+        if activities:
+            with transaction.atomic():
+                Activity.objects.bulk_create(activities, batch_size=500)
+                caching.invalidate('activities')
+                if leaderboard.tracking_enabled():
+                    search.index_objects(Activity, activities)
+                    contributions = [leaderboard.contribution(a) for a in activities]
+                    if leaderboard.apply_activity_changes(added=contributions):
+                        ranking.mark_dirty()
+        
+        return Response({
+            'created': [
+                {'index': index, 'id': activity.pk}
+                for index, activity in zip(indexes, activities)
+            ],
+            'errors': errors,
+        }, status=status.HTTP_201_CREATED if activities else status.HTTP_400_BAD_REQUEST)
+    
+    @action(detail=False, methods=['get'], renderer_classes=[CSVRenderer, NDJSONRenderer])
+    def export(self, request):
+        """
+        Stream activities as CSV or NDJSON (``?format=csv|ndjson``),
+        optionally filtered by ``email``, ``type`` and ``from``/``to`` dates.
+        """
+        params = request.query_params
+        activities = Activity.objects.order_by(*ActivityCursorPagination.ordering)
+        if params.get('email'):
+            activities = activities.filter(user_email=params['email'])
+        if params.get('type'):
+            activities = activities.filter(activity_type=params['type'])
+        for name, lookup, offset in (('from', 'date__gte', 0), ('to', 'date__lt', 1)):
+            if params.get(name):
+                day = query_date(params, name)
+                if day is None:
+                    return Response({'error': f'{name.capitalize()} must be a date (YYYY-MM-DD)'}, status=400)
+                activities = activities.filter(**{lookup: leaderboard.day_start(day + timedelta(days=offset))})
+        return export_response(
+            activities, ActivitySerializer.Meta.fields, request.accepted_renderer.format, 'activities'
+        )
     
     @action(detail=False, methods=['get'])
     def by_user(self, request):
         """Get activities by user email"""
         email = request.query_params.get('email', None)
         if email:
-            activities = Activity.objects.filter(user_email=email)
-            serializer = self.get_serializer(activities, many=True)
-            return Response(serializer.data)
+            return self.list_response(self.sparse_queryset(Activity.objects.filter(user_email=email)))
         return Response({'error': 'Email parameter is required'}, status=400)
     
     @action(detail=False, methods=['get'])
@@ -71,57 +224,225 @@ class ActivityViewSet(viewsets.ModelViewSet):
         """Get activities by type"""
         activity_type = request.query_params.get('type', None)
         if activity_type:
-            activities = Activity.objects.filter(activity_type=activity_type)
-            serializer = self.get_serializer(activities, many=True)
-            return Response(serializer.data)
+            return self.list_response(self.sparse_queryset(Activity.objects.filter(activity_type=activity_type)))
         return Response({'error': 'Type parameter is required'}, status=400)
 
 
-class LeaderBoardViewSet(viewsets.ModelViewSet):
+class LeaderBoardViewSet(caching.ConditionalGetMixin, SparseFieldsetMixin, FastListMixin, viewsets.ModelViewSet):
     """
     API endpoint for leaderboard
     """
     queryset = LeaderBoard.objects.all()
     serializer_class = LeaderBoardSerializer
+    change_namespaces = ('leaderboard',)
+    fast_list = True
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['user_name', 'user_email', 'team']
     ordering_fields = ['rank', 'total_calories', 'total_duration', 'total_activities']
+    # Fields of windowed standings rows (see leaderboard.window_standings)
+    window_fields = ['user_email', 'user_name', 'team', 'total_activities', 'total_calories',
+                     'total_duration', 'rank']
+    
+    def initial(self, request, *args, **kwargs):
+        # Windowed standings are read from the daily rollups, and ?window=
+        # moves with the date, so both are part of the validators
+        self.window = None
+        if request.method in ('GET', 'HEAD') and self.action == 'list':
+            self.window = self.resolve_window(request.query_params)
+            if isinstance(self.window, tuple):
+                self.change_namespaces = (*self.change_namespaces, 'rollups')
+        super().initial(request, *args, **kwargs)
+    
+    def get_validator_context(self):
+        return self.window if isinstance(self.window, tuple) else None
+    
+    def resolve_window(self, params):
+        """
+        Return the ``(start, end)`` dates of a windowed list request, an
+        error message for invalid ones, or None without window params
+        """
+        if not any(name in params for name in ('window', 'from', 'to')):
+            return None
+        if 'window' in params:
+            if 'from' in params or 'to' in params:
+                return 'Use either window or from/to, not both'
+            match = re.fullmatch(r'(\d+)d', params['window'])
+            if not match or int(match.group(1)) < 1:
+                return 'Window must look like 7d'
+            end = timezone.localdate()
+            start = end - timedelta(days=int(match.group(1)) - 1)
+        else:
+            start = query_date(params, 'from')
+            end = query_date(params, 'to')
+            if start is None or end is None:
+                return 'From and to must be dates (YYYY-MM-DD)'
+            if start > end:
+                return 'From must not be after to'
+        
+        max_days = settings.LEADERBOARD_MAX_WINDOW_DAYS
+        if (end - start).days + 1 > max_days:
+            return f'Windows are limited to {max_days} days'
+        return start, end
+    
+    def list(self, request, *args, **kwargs):
+        """
+        List the all-time leaderboard, or standings for a time window with
+        ``?window=7d`` (the last N days) or ``?from=YYYY-MM-DD&to=YYYY-MM-DD``.
+        """
+        if self.window is None:
+            return super().list(request, *args, **kwargs)
+        if isinstance(self.window, str):
+            return Response({'error': self.window}, status=400)
+        start, end = self.window
+        kept = None
+        if self.fieldset is not None:
+            # Windowed rows have no id or last_updated
+            kept = [name for name in self.fieldset if name in self.window_fields]
+            if not kept:
+                available = ', '.join(self.window_fields)
+                return Response({'error': f'Available fields in windowed standings: {available}'}, status=400)
+        results = leaderboard.window_standings(start, end)
+        if kept is not None:
+            results = [{name: row[name] for name in kept} for row in results]
+        return Response({
+            'from': start,
+            'to': end,
+            'results': results,
+        })
+    
+    @action(detail=False, methods=['get'], renderer_classes=[CSVRenderer, NDJSONRenderer])
+    def export(self, request):
+        """Stream the leaderboard by rank as CSV or NDJSON, optionally for one ``team``"""
+        entries = LeaderBoard.objects.order_by('rank', 'id')
+        team = request.query_params.get('team')
+        if team:
+            entries = entries.filter(team=team)
+        return export_response(
+            entries, LeaderBoardSerializer.Meta.fields, request.accepted_renderer.format, 'leaderboard'
+        )
     
     @action(detail=False, methods=['get'])
+    @caching.cached_response('leaderboard')
     def top(self, request):
         """Get top N users from leaderboard"""
-        limit = int(request.query_params.get('limit', 10))
-        top_users = LeaderBoard.objects.all().order_by('rank')[:limit]
-        serializer = self.get_serializer(top_users, many=True)
-        return Response(serializer.data)
+        max_limit = settings.LEADERBOARD_TOP_MAX_LIMIT
+        limit = bounded_int(request.query_params, 'limit', 10, 1, max_limit)
+        if limit is None:
+            return Response({'error': f'Limit must be between 1 and {max_limit}'}, status=400)
+        return self.list_response(self.sparse_queryset(LeaderBoard.objects.order_by('rank'))[:limit])
     
     @action(detail=False, methods=['get'])
+    def around(self, request):
+        """Get a user's entry with the ``radius`` entries ranked above and below it"""
+        email = request.query_params.get('email')
+        if not email:
+            return Response({'error': 'Email parameter is required'}, status=400)
+        max_radius = settings.LEADERBOARD_AROUND_MAX_RADIUS
+        radius = bounded_int(
+            request.query_params, 'radius', settings.LEADERBOARD_AROUND_DEFAULT_RADIUS, 0, max_radius
+        )
+        if radius is None:
+            return Response({'error': f'Radius must be between 0 and {max_radius}'}, status=400)
+        
+        compiled = self.get_compiled_serializer()
+        entries = LeaderBoard.objects.all()
+        if compiled is not None:
+            entries = entries.values(*dict.fromkeys(compiled.columns + ('rank', 'id')))
+        else:
+            # Keep the rank and id the lookup reads when ?fields= narrows the columns
+            entries = self.sparse_queryset(entries.order_by('rank', 'id'))
+        rows = leaderboard.around(entries, email, radius)
+        if rows is None:
+            return Response({'error': 'No ranked leaderboard entry for this email'}, status=404)
+        data = compiled.to_representation(rows) if compiled is not None else self.get_serializer(rows, many=True).data
+        return Response({'email': email, 'radius': radius, 'results': data})
+    
+    @action(detail=False, methods=['get'])
+    def percentile(self, request):
+        """Get where a user's calorie total falls among all users"""
+        email = request.query_params.get('email')
+        if not email:
+            return Response({'error': 'Email parameter is required'}, status=400)
+        result = distribution.percentile(email)
+        if result is None:
+            return Response({'error': 'No leaderboard entry for this email'}, status=404)
+        return Response(result)
+    
+    @action(detail=False, methods=['get'])
+    def histogram(self, request):
+        """Get the number of users per calorie range, in at most ``bins`` ranges"""
+        max_bins = settings.LEADERBOARD_HISTOGRAM_MAX_BINS
+        bins = bounded_int(request.query_params, 'bins', 10, 1, max_bins)
+        if bins is None:
+            return Response({'error': f'Bins must be between 1 and {max_bins}'}, status=400)
+        return Response({
+            'bucket_size': settings.LEADERBOARD_DISTRIBUTION_BUCKET,
+            'results': distribution.histogram(bins),
+        })
+    
+    @action(detail=False, methods=['get'])
+    @caching.cached_response('leaderboard')
     def by_team(self, request):
         """Get leaderboard by team"""
         team = request.query_params.get('team', None)
         if team:
-            leaderboard = LeaderBoard.objects.filter(team=team).order_by('rank')
-            serializer = self.get_serializer(leaderboard, many=True)
-            return Response(serializer.data)
+            return self.list_response(self.sparse_queryset(LeaderBoard.objects.filter(team=team).order_by('rank')))
         return Response({'error': 'Team parameter is required'}, status=400)
 
 
-class WorkoutViewSet(viewsets.ModelViewSet):
+class WorkoutViewSet(caching.ConditionalGetMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     """
     API endpoint for workouts
     """
     queryset = Workout.objects.all()
     serializer_class = WorkoutSerializer
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
-    search_fields = ['title', 'description', 'activity_type', 'difficulty']
+    change_namespaces = ('workouts',)
+    filter_backends = [search.IndexedSearchFilter, filters.OrderingFilter]
+    search_fields = list(search.INDEXED_FIELDS[Workout])
     ordering_fields = ['created_at', 'duration', 'calories_estimate']
     
+    @caching.cached_response('workouts')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+    
+    @action(
+        detail=False, methods=['get'],
+        change_namespaces=('activities', 'workouts', 'recommendations'),
+    )
+    def recommended(self, request):
+        """
+        Recommend workouts for ``email`` from their recent activity history
+        (``limit`` results, each with its ``score``).
+        """
+        if not recommendations.available():
+            return Response({'error': 'Recommendations need numpy, which is not installed'}, status=503)
+        email = request.query_params.get('email')
+        if not email:
+            return Response({'error': 'Email parameter is required'}, status=400)
+        max_limit = settings.RECOMMENDATION_MAX_LIMIT
+        limit = bounded_int(request.query_params, 'limit', settings.RECOMMENDATION_DEFAULT_LIMIT, 1, max_limit)
+        if limit is None:
+            return Response({'error': f'Limit must be between 1 and {max_limit}'}, status=400)
+        if not User.objects.filter(email=email).exists():
+            return Response({'error': 'Unknown user'}, status=404)
+        
+        computed_at, ranked = recommendations.recommend(email, limit)
+        fieldset = self.fieldset or list(WorkoutSerializer.Meta.fields)
+        return Response({
+            'email': email,
+            'computed_at': computed_at,
+            'results': [
+                {**{name: row[name] for name in fieldset}, 'score': round(score, 4)}
+                for row, score in ranked
+            ],
+        })
+    
     @action(detail=False, methods=['get'])
     def by_difficulty(self, request):
         """Get workouts by difficulty level"""
         difficulty = request.query_params.get('difficulty', None)
         if difficulty:
-            workouts = Workout.objects.filter(difficulty=difficulty)
+            workouts = self.sparse_queryset(Workout.objects.filter(difficulty=difficulty))
             serializer = self.get_serializer(workouts, many=True)
             return Response(serializer.data)
         return Response({'error': 'Difficulty parameter is required'}, status=400)
@@ -131,18 +452,19 @@ class WorkoutViewSet(viewsets.ModelViewSet):
         """Get workouts by activity type"""
         activity_type = request.query_params.get('type', None)
         if activity_type:
-            workouts = Workout.objects.filter(activity_type=activity_type)
+            workouts = self.sparse_queryset(Workout.objects.filter(activity_type=activity_type))
             serializer = self.get_serializer(workouts, many=True)
             return Response(serializer.data)
         return Response({'error': 'Type parameter is required'}, status=400)
 
 
-class CoachViewSet(viewsets.ModelViewSet):
+class CoachViewSet(caching.ConditionalGetMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     """
     API endpoint for coaches
     """
     queryset = Coach.objects.all()
     serializer_class = CoachSerializer
+    change_namespaces = ('coaches',)
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['name', 'email', 'specialization']
     ordering_fields = ['created_at', 'name', 'years_experience']
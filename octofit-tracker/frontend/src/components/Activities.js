@@ -4,6 +4,8 @@ function Activities() {
   const [activities, setActivities] = useState([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
+  const [nextUrl, setNextUrl] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   const API_URL = `https://${process.env.REACT_APP_CODESPACE_NAME}-8000.app.github.dev/api/activities/`;
 
@@ -23,6 +25,7 @@ function Activities() {
         const activitiesData = data.results || data;
         console.log('Processed activities data:', activitiesData);
         setActivities(Array.isArray(activitiesData) ? activitiesData : []);
+        setNextUrl(data.next || null);
         setLoading(false);
       })
       .catch(error => {
@@ -32,6 +35,28 @@ function Activities() {
       });
   }, [API_URL]);
 
+  // The API pages activities with opaque cursors; follow `next` on demand
+  const loadMore = () => {
+    setLoadingMore(true);
+    fetch(nextUrl)
+      .then(response => {
+        if (!response.ok) {
+          throw new Error(`HTTP error! status: ${response.status}`);
+        }
+        return response.json();
+      })
+      .then(data => {
+        setActivities(previous => previous.concat(data.results || []));
+        setNextUrl(data.next || null);
+        setLoadingMore(false);
+      })
+      .catch(error => {
+        console.error('Error fetching more activities:', error);
+        setError(error.message);
+        setLoadingMore(false);
+      });
+  };
+
   if (loading) return <div className="text-center"><div className="spinner-border" role="status"><span className="visually-hidden">Loading...</span></div></div>;
   if (error) return <div className="alert alert-danger">Error: {error}</div>;
 
@@ -74,6 +99,13 @@ function Activities() {
                     ))}
                   </tbody>
                 </table>
+                {nextUrl && (
+                  <div className="text-center">
+                    <button className="btn btn-outline-primary" onClick={loadMore} disabled={loadingMore}>
+                      {loadingMore ? 'Loading...' : 'Load more'}
+                    </button>
+                  </div>
+                )}
               </div>
             )}
           </div>
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useCallback } from 'react';
 
 function Leaderboard() {
   const [leaderboard, setLeaderboard] = useState([]);
@@ -7,7 +7,7 @@ function Leaderboard() {
 
   const API_URL = `https://${process.env.REACT_APP_CODESPACE_NAME}-8000.app.github.dev/api/leaderboard/`;
 
-  useEffect(() => {
+  const loadLeaderboard = useCallback(() => {
     console.log('Fetching leaderboard from:', API_URL);
     
     fetch(API_URL)
@@ -32,6 +32,34 @@ function Leaderboard() {
       });
   }, [API_URL]);
 
+  useEffect(() => {
+    loadLeaderboard();
+  }, [loadLeaderboard]);
+
+  // Apply rank changes pushed by the server (served under ASGI only; without
+  // it the stream fails to connect and the table stays as fetched)
+  useEffect(() => {
+    if (typeof EventSource === 'undefined') return undefined;
+    const stream = new EventSource(`${API_URL}stream/`);
+    stream.addEventListener('ranks', event => {
+      const changes = JSON.parse(event.data);
+      setLeaderboard(current => {
+        const byEmail = new Map(current.map(entry => [entry.user_email, entry]));
+        changes.forEach(change => {
+          const fields = { ...change };
+          delete fields.old_rank;
+          byEmail.set(change.user_email, { ...byEmail.get(change.user_email), ...fields });
+        });
+        return Array.from(byEmail.values()).sort(
+          (a, b) => (a.rank ?? Infinity) - (b.rank ?? Infinity)
+        );
+      });
+    });
+    // The server dropped changes this client was too slow to read
+    stream.addEventListener('resync', loadLeaderboard);
+    return () => stream.close();
+  }, [API_URL, loadLeaderboard]);
+
   if (loading) return <div className="text-center"><div className="spinner-border" role="status"><span className="visually-hidden">Loading...</span></div></div>;
   if (error) return <div className="alert alert-danger">Error: {error}</div>;
 